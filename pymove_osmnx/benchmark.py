@@ -0,0 +1,456 @@
+"""
+Offline benchmarks of the map matching engines.
+
+Synthetic road graphs and noisy trajectories driven on them are generated
+without network access, and each engine is measured on the same data. The
+results are written as JSON with the versions used, so runs of different
+versions can be compared to catch regressions.
+"""
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Text
+
+import numpy as np
+import pandas as pd
+from networkx import MultiDiGraph
+from pandas.core.frame import DataFrame
+from pymove.core.dataframe import MoveDataFrame
+from pymove.utils.constants import DATETIME, LATITUDE, LONGITUDE, TRAJ_ID
+from scipy.spatial import Delaunay
+
+from pymove_osmnx._version import __version__
+from pymove_osmnx.core.map_matcher import METERS_PER_DEGREE, MapMatcher
+from pymove_osmnx.core.map_matching_osmnx import map_matching_edge, map_matching_node
+
+ENGINES = {
+    'node': lambda move_data, matcher: map_matching_node(
+        move_data, inplace=False, matcher=matcher
+    ),
+    'nearest': lambda move_data, matcher: map_matching_edge(
+        move_data, inplace=False, matcher=matcher
+    ),
+    'hmm': lambda move_data, matcher: map_matching_edge(
+        move_data, inplace=False, matcher=matcher, method='hmm'
+    ),
+}
+
+METRICS = {
+    'points_per_second': 1,
+    'latency_mean': -1,
+    'latency_p95': -1,
+    'peak_memory': -1,
+}
+
+
+def _add_edges(G: MultiDiGraph, pairs: np.ndarray):
+    """Adds both directions of straight edges between pairs of nodes."""
+    x = np.array([G.nodes[n]['x'] for n in G.nodes])
+    y = np.array([G.nodes[n]['y'] for n in G.nodes])
+    u, v = pairs[:, 0], pairs[:, 1]
+    length = METERS_PER_DEGREE * np.hypot(
+        (x[v] - x[u]) * np.cos(np.radians((y[u] + y[v]) / 2)), y[v] - y[u]
+    )
+    for a, b, d in zip(u.tolist(), v.tolist(), length.tolist()):
+        G.add_edge(a, b, key=0, length=d)
+        G.add_edge(b, a, key=0, length=d)
+
+
+def grid_graph(
+    size: Optional[int] = 50,
+    spacing: Optional[float] = 0.001,
+    origin: Optional[tuple] = (-38.7, -3.8)
+) -> MultiDiGraph:
+    """
+    Generates a square grid of two way streets.
+
+    Parameters
+    ----------
+    size : int, optional
+        Number of nodes on each side, by default 50
+    spacing : float, optional
+        Distance between neighbouring nodes in degrees, by default 0.001
+    origin : tuple, optional
+        Longitude and latitude of the first node, by default (-38.7, -3.8)
+
+    Returns
+    -------
+    MultiDiGraph
+        The graph, with the size * size nodes numbered row by row
+
+    """
+    G = MultiDiGraph(crs='epsg:4326')
+    for i in range(size):
+        for j in range(size):
+            G.add_node(
+                i * size + j, x=origin[0] + j * spacing, y=origin[1] + i * spacing
+            )
+    ids = np.arange(size * size).reshape(size, size)
+    pairs = np.concatenate([
+        np.stack([ids[:, :-1].ravel(), ids[:, 1:].ravel()], axis=1),
+        np.stack([ids[:-1].ravel(), ids[1:].ravel()], axis=1),
+    ])
+    _add_edges(G, pairs)
+    return G
+
+
+def random_planar_graph(
+    n_nodes: Optional[int] = 2500,
+    extent: Optional[float] = 0.05,
+    origin: Optional[tuple] = (-38.7, -3.8),
+    seed: Optional[int] = 0
+) -> MultiDiGraph:
+    """
+    Generates the Delaunay triangulation of random nodes as two way streets.
+
+    Parameters
+    ----------
+    n_nodes : int, optional
+        Number of nodes, by default 2500
+    extent : float, optional
+        Side of the square holding the nodes in degrees, by default 0.05
+    origin : tuple, optional
+        Longitude and latitude of the corner of the square,
+        by default (-38.7, -3.8)
+    seed : int, optional
+        Seed of the random generator, by default 0
+
+    Returns
+    -------
+    MultiDiGraph
+        The planar graph
+
+    """
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(0, extent, size=(n_nodes, 2)) + origin
+    G = MultiDiGraph(crs='epsg:4326')
+    for n, (x, y) in enumerate(points.tolist()):
+        G.add_node(n, x=x, y=y)
+    simplices = Delaunay(points).simplices
+    pairs = np.concatenate(
+        [simplices[:, [0, 1]], simplices[:, [1, 2]], simplices[:, [2, 0]]]
+    )
+    _add_edges(G, np.unique(np.sort(pairs, axis=1), axis=0))
+    return G
+
+
+def random_trajectories(
+    G: MultiDiGraph,
+    n_trajectories: Optional[int] = 20,
+    n_points: Optional[int] = 200,
+    step: Optional[float] = 20.0,
+    noise: Optional[float] = 5.0,
+    interval: Optional[float] = 2.0,
+    seed: Optional[int] = 0
+) -> DataFrame:
+    """
+    Generates noisy trajectories of random walks on a graph.
+
+    Each walk starts at a random node and follows random edges without
+    turning back unless at a dead end. The points are sampled at regular
+    distances along the walk and moved by gaussian noise.
+
+    Parameters
+    ----------
+    G : MultiDiGraph
+        The road graph
+    n_trajectories : int, optional
+        Number of trajectories, by default 20
+    n_points : int, optional
+        Number of points of each trajectory, by default 200
+    step : float, optional
+        Distance in meters along the walk between points, by default 20.0
+    noise : float, optional
+        Standard deviation of the noise in meters, by default 5.0
+    interval : float, optional
+        Time in seconds between points, by default 2.0
+    seed : int, optional
+        Seed of the random generator, by default 0
+
+    Returns
+    -------
+    DataFrame
+        The trajectories, with the id, lat, lon and datetime columns
+
+    """
+    rng = np.random.default_rng(seed)
+    nodes = list(G.nodes)
+    frames = []
+    for traj in range(n_trajectories):
+        node, previous = nodes[rng.integers(len(nodes))], None
+        xs, ys, total = [G.nodes[node]['x']], [G.nodes[node]['y']], [0.0]
+        while total[-1] < step * (n_points - 1):
+            successors = list(G.successors(node))
+            forward = [v for v in successors if v != previous] or successors
+            if not forward:
+                break
+            previous, node = node, forward[rng.integers(len(forward))]
+            xs.append(G.nodes[node]['x'])
+            ys.append(G.nodes[node]['y'])
+            total.append(total[-1] + G[previous][node][0]['length'])
+
+        at = np.minimum(np.arange(n_points) * step, total[-1])
+        lat = np.interp(at, total, ys)
+        lon = np.interp(at, total, xs)
+        lat += rng.normal(0, noise / METERS_PER_DEGREE, n_points)
+        lon += rng.normal(0, noise / METERS_PER_DEGREE, n_points) / np.cos(
+            np.radians(lat)
+        )
+        frames.append(DataFrame({
+            TRAJ_ID: traj,
+            LATITUDE: lat,
+            LONGITUDE: lon,
+            DATETIME: pd.Timestamp('2021-01-01') + pd.to_timedelta(
+                np.arange(n_points) * interval + traj * n_points * interval, unit='s'
+            ),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _clear(matcher: MapMatcher):
+    """Empties the shortest path cache and the memos filled by matching."""
+    matcher.paths.clear()
+    for memo in (matcher.node_memo, matcher.edge_memo):
+        if memo is not None:
+            memo.clear()
+
+
+def measure(
+    engine: Callable,
+    move_data: DataFrame,
+    matcher: MapMatcher,
+    memory: Optional[bool] = True
+) -> Dict:
+    """
+    Measures an engine on a set of trajectories.
+
+    The throughput is measured on all trajectories at once, the latency on
+    each trajectory alone and the peak memory, traced with tracemalloc, in a
+    separate run so tracing does not slow down the timed runs. The shortest
+    path cache and the memos of the matcher are emptied before every run,
+    so no run, or engine sharing the matcher, reuses the work of another.
+
+    Parameters
+    ----------
+    engine : callable
+        Receives a MoveDataFrame and the matcher and matches the points
+    move_data : DataFrame
+        The trajectories
+    matcher : MapMatcher
+        The matcher of the graph, with its indexes built
+    memory : bool, optional
+        Whether to measure the peak memory, by default True
+
+    Returns
+    -------
+    dict
+        The number of points and trajectories, the seconds and points per
+        second of the run on all trajectories, the mean and 95th percentile
+        latency per trajectory in seconds and the peak memory in bytes
+
+    """
+    trajectories = [
+        MoveDataFrame(data=df.reset_index(drop=True))
+        for _, df in move_data.groupby(TRAJ_ID, sort=False)
+    ]
+    everything = MoveDataFrame(data=move_data)
+
+    _clear(matcher)
+    start = time.perf_counter()
+    engine(everything, matcher)
+    seconds = time.perf_counter() - start
+
+    latencies = []
+    for trajectory in trajectories:
+        _clear(matcher)
+        start = time.perf_counter()
+        engine(trajectory, matcher)
+        latencies.append(time.perf_counter() - start)
+
+    peak = np.nan
+    if memory:
+        _clear(matcher)
+        tracemalloc.start()
+        try:
+            engine(everything, matcher)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'n_points': len(move_data),
+        'n_trajectories': len(trajectories),
+        'seconds': seconds,
+        'points_per_second': len(move_data) / seconds,
+        'latency_mean': float(np.mean(latencies)),
+        'latency_p95': float(np.percentile(latencies, 95)),
+        'peak_memory': peak,
+    }
+
+
+def run_benchmarks(
+    graphs: Optional[Dict[Text, MultiDiGraph]] = None,
+    engines: Optional[Dict[Text, Callable]] = None,
+    n_trajectories: Optional[int] = 20,
+    n_points: Optional[int] = 200,
+    memory: Optional[bool] = True,
+    seed: Optional[int] = 0,
+    output_path: Optional[Text] = None
+) -> DataFrame:
+    """
+    Measures every engine on trajectories generated on every graph.
+
+    Parameters
+    ----------
+    graphs : dict, optional
+        The graphs by name, by default None, a 50 * 50 grid and a random
+        planar graph of 2500 nodes
+    engines : dict, optional
+        Callables receiving a MoveDataFrame and a MapMatcher by name,
+        by default None, ENGINES
+    n_trajectories : int, optional
+        Number of trajectories per graph, by default 20
+    n_points : int, optional
+        Number of points per trajectory, by default 200
+    memory : bool, optional
+        Whether to measure the peak memory, by default True
+    seed : int, optional
+        Seed of the random trajectories, by default 0
+    output_path : str, optional
+        Path of the JSON results file, by default None
+
+    Returns
+    -------
+    DataFrame
+        A row per graph and engine, with the build time of the matcher and
+        the measures of the engine
+
+    """
+    if graphs is None:
+        graphs = {'grid': grid_graph(), 'planar': random_planar_graph(seed=seed)}
+    if engines is None:
+        engines = ENGINES
+
+    results = []
+    for graph_name, G in graphs.items():
+        move_data = random_trajectories(G, n_trajectories, n_points, seed=seed)
+        start = time.perf_counter()
+        matcher = MapMatcher(G)
+        matcher.build_indexes()
+        build = time.perf_counter() - start
+        for engine_name, engine in engines.items():
+            result = {'graph': graph_name, 'engine': engine_name, 'build': build}
+            result.update(measure(engine, move_data, matcher, memory))
+            results.append(result)
+    results = DataFrame(results)
+
+    if output_path is not None:
+        with open(output_path, 'w') as f:
+            json.dump({
+                'version': __version__,
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'date': pd.Timestamp.now().isoformat(),
+                'results': results.to_dict(orient='records'),
+            }, f, indent=2)
+    return results
+
+
+def compare(
+    baseline_path: Text,
+    current_path: Text,
+    tolerance: Optional[float] = 0.2
+) -> DataFrame:
+    """
+    Compares two results files.
+
+    Parameters
+    ----------
+    baseline_path : str
+        Path of the results of the reference version
+    current_path : str
+        Path of the results of the version checked
+    tolerance : float, optional
+        Relative worsening of a metric tolerated, by default 0.2
+
+    Returns
+    -------
+    DataFrame
+        A row per graph and engine in both files, with the ratio of the
+        current to the baseline value of each metric and whether any metric
+        worsened beyond the tolerance
+
+    """
+    frames = []
+    for path in [baseline_path, current_path]:
+        with open(path) as f:
+            frames.append(DataFrame(json.load(f)['results']))
+    merged = frames[0].merge(
+        frames[1], on=['graph', 'engine'], suffixes=('_baseline', '_current')
+    )
+
+    comparison = merged[['graph', 'engine']].copy()
+    comparison['regression'] = False
+    for metric, direction in METRICS.items():
+        ratio = merged[metric + '_current'] / merged[metric + '_baseline']
+        comparison[metric] = ratio
+        if direction > 0:
+            comparison['regression'] |= ratio < 1 - tolerance
+        else:
+            comparison['regression'] |= ratio > 1 + tolerance
+    return comparison
+
+
+def main(argv: Optional[List[Text]] = None):
+    """
+    Runs the pymove-osmnx-benchmark command.
+
+    Exits with status 1 when a baseline is given and a metric worsened
+    beyond the tolerance.
+
+    Parameters
+    ----------
+    argv : list, optional
+        The command line arguments, by default None, uses sys.argv
+
+    """
+    parser = argparse.ArgumentParser(
+        prog='pymove-osmnx-benchmark',
+        description='Benchmarks the map matching engines on synthetic graphs.'
+    )
+    parser.add_argument('output', help='JSON results file')
+    parser.add_argument(
+        '--baseline', help='JSON results file of a previous version to compare to'
+    )
+    parser.add_argument(
+        '--tolerance', type=float, default=0.2,
+        help='relative worsening of a metric tolerated'
+    )
+    parser.add_argument(
+        '--trajectories', type=int, default=20,
+        help='number of trajectories per graph'
+    )
+    parser.add_argument(
+        '--points', type=int, default=200, help='number of points per trajectory'
+    )
+    parser.add_argument(
+        '--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES),
+        help='engines measured'
+    )
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        engines={name: ENGINES[name] for name in args.engines},
+        n_trajectories=args.trajectories,
+        n_points=args.points,
+        output_path=args.output
+    )
+    print(results.to_string(index=False))
+    if args.baseline is not None:
+        comparison = compare(args.baseline, args.output, args.tolerance)
+        print(comparison.to_string(index=False))
+        if comparison['regression'].any():
+            raise SystemExit(1)
@@ -0,0 +1,357 @@
+"""
+Command line entry point for matching large trajectory files.
+
+The input is read in chunks that never split a trajectory, every chunk is
+matched on the same local graph and the results are appended to the output
+as soon as they are ready.
+"""
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Text
+
+import numpy as np
+import pandas as pd
+from pandas.core.frame import DataFrame
+from pymove.utils.constants import DATETIME, TRAJ_ID
+
+from pymove_osmnx.core import parallel
+from pymove_osmnx.core.graph_cache import graph_from_file
+from pymove_osmnx.core.map_matcher import MapMatcher
+
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+
+def _is_parquet(filepath: Text) -> bool:
+    """Checks whether a file is parquet by its extension."""
+    return filepath.lower().endswith(PARQUET_EXTENSIONS)
+
+
+def _file_chunks(filepath: Text, chunksize: int) -> Iterator[DataFrame]:
+    """Reads a csv or parquet file in chunks of at most chunksize rows."""
+    if not _is_parquet(filepath):
+        yield from pd.read_csv(filepath, chunksize=chunksize)
+        return
+    import pyarrow.parquet as pq
+    for batch in pq.ParquetFile(filepath).iter_batches(batch_size=chunksize):
+        yield batch.to_pandas()
+
+
+def read_chunks(
+    filepath: Text,
+    chunksize: Optional[int] = 100000,
+    id_column: Optional[Text] = TRAJ_ID
+) -> Iterator[DataFrame]:
+    """
+    Reads trajectories in chunks without splitting any trajectory.
+
+    The rows of each trajectory must be contiguous in the file. The rows of
+    the last trajectory of a chunk are carried to the next one, so a chunk
+    may exceed chunksize by the length of a trajectory.
+
+    Parameters
+    ----------
+    filepath : str
+        Path of a csv or parquet file
+    chunksize : int, optional
+        Number of rows read at a time, by default 100000
+    id_column : str, optional
+        The column identifying the trajectories, by default TRAJ_ID
+
+    Returns
+    -------
+    iterator
+        The chunks of trajectories
+
+    """
+    rest = None
+    for chunk in _file_chunks(filepath, chunksize):
+        if rest is not None:
+            chunk = pd.concat([rest, chunk], ignore_index=True)
+        ids = chunk[id_column].values
+        change = np.nonzero(ids != ids[-1])[0]
+        if len(change) == 0:
+            rest = chunk
+            continue
+        start = change[-1] + 1
+        rest = chunk.iloc[start:].reset_index(drop=True)
+        yield chunk.iloc[:start]
+    if rest is not None and len(rest) > 0:
+        yield rest
+
+
+def match_chunk(
+    matcher: MapMatcher,
+    chunk: DataFrame,
+    method: Optional[Text] = 'nearest',
+    kwargs: Optional[Dict] = None,
+    compact: Optional[bool] = False,
+    id_column: Optional[Text] = None
+) -> DataFrame:
+    """
+    Matches a chunk and converts the results to flat columns.
+
+    The geometries are written as WKT and the matched edges as the edge_u and
+    edge_v columns. With compact, only the integer identifiers of the nodes
+    or edges are written, without geometries.
+
+    Parameters
+    ----------
+    matcher : MapMatcher
+        The matcher holding the graph and its indexes
+    chunk : DataFrame
+        The trajectories
+    method : str, optional
+        'node' for the nearest nodes, 'nearest' for the nearest edges or
+        'hmm' for the hidden markov model, by default 'nearest'
+    kwargs : dict, optional
+        Parameters of the edge matching methods, by default None
+    compact : bool, optional
+        Whether to write the node or u, v and key columns instead of the
+        geometries, by default False
+    id_column : str, optional
+        The column identifying the trajectories, by default None, the tid
+        column or else the id column
+
+    Returns
+    -------
+    DataFrame
+        The matched trajectories
+
+    """
+    if DATETIME in chunk:
+        chunk[DATETIME] = pd.to_datetime(chunk[DATETIME])
+    if method == 'node':
+        result = matcher.match_nodes(
+            chunk, inplace=False, compact=compact, traj_column=id_column
+        )
+    else:
+        result = matcher.match_edges(
+            chunk, inplace=False, method=method, compact=compact,
+            traj_column=id_column, **(kwargs or {})
+        )
+    if compact:
+        return result
+
+    result['geometry'] = [None if g is None else g.wkt for g in result['geometry']]
+    if 'edge' in result:
+        edge = result.pop('edge')
+        result['edge_u'] = pd.array(
+            [None if e is None else e[0] for e in edge], dtype='Int64'
+        )
+        result['edge_v'] = pd.array(
+            [None if e is None else e[1] for e in edge], dtype='Int64'
+        )
+    return result
+
+
+def _match_worker(args) -> DataFrame:
+    """Matches a chunk with the matcher of the worker process."""
+    return match_chunk(parallel._matcher, *args)
+
+
+class _Writer:
+    """Appends chunks to a csv or parquet file."""
+
+    def __init__(self, filepath: Text):
+        self.filepath = filepath
+        self.rows = 0
+        self._parquet = None
+
+    def write(self, df: DataFrame):
+        if _is_parquet(self.filepath):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self._parquet is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                self._parquet = pq.ParquetWriter(self.filepath, table.schema)
+            else:
+                table = pa.Table.from_pandas(
+                    df, schema=self._parquet.schema, preserve_index=False
+                )
+            self._parquet.write_table(table)
+        else:
+            df.to_csv(
+                self.filepath,
+                mode='w' if self.rows == 0 else 'a',
+                header=self.rows == 0,
+                index=False
+            )
+        self.rows += len(df)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def match_file(
+    input_path: Text,
+    output_path: Text,
+    graph_path: Text,
+    method: Optional[Text] = 'nearest',
+    chunksize: Optional[int] = 100000,
+    id_column: Optional[Text] = TRAJ_ID,
+    n_jobs: Optional[int] = 1,
+    kwargs: Optional[Dict] = None,
+    compact: Optional[bool] = False
+) -> int:
+    """
+    Matches a trajectory file chunk by chunk.
+
+    The graph is loaded once. With more than one job, the matcher is sent
+    once to each worker process, or only its path when it is a saved
+    matcher, and at most 2 * n_jobs chunks are in memory at a time. The
+    chunks are written in the order they were read.
+
+    Parameters
+    ----------
+    input_path : str
+        Path of the csv or parquet trajectories file
+    output_path : str
+        Path of the csv or parquet output file
+    graph_path : str
+        Path of the local .graphml or .osm graph file, or folder of a matcher
+        saved with MapMatcher.save
+    method : str, optional
+        'node' for the nearest nodes, 'nearest' for the nearest edges or
+        'hmm' for the hidden markov model, by default 'nearest'
+    chunksize : int, optional
+        Number of rows read at a time, by default 100000
+    id_column : str, optional
+        The column identifying the trajectories, by default TRAJ_ID
+    n_jobs : int, optional
+        Number of worker processes, by default 1
+    kwargs : dict, optional
+        Parameters of the edge matching methods, by default None
+    compact : bool, optional
+        Whether to write the node or u, v and key columns instead of the
+        geometries, by default False
+
+    Returns
+    -------
+    int
+        Number of rows written
+
+    """
+    if os.path.isdir(graph_path):
+        matcher = MapMatcher.load(graph_path)
+    else:
+        matcher = MapMatcher(graph_from_file(graph_path))
+        matcher.build_indexes()
+    chunks = read_chunks(input_path, chunksize, id_column)
+    writer = _Writer(output_path)
+
+    try:
+        if n_jobs is None or n_jobs <= 1:
+            for chunk in chunks:
+                writer.write(
+                    match_chunk(matcher, chunk, method, kwargs, compact, id_column)
+                )
+            return writer.rows
+
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=parallel._init_worker,
+            initargs=(matcher,)
+        ) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(
+                    executor.submit(
+                        _match_worker, (chunk, method, kwargs, compact, id_column)
+                    )
+                )
+                if len(pending) >= 2 * n_jobs:
+                    writer.write(pending.popleft().result())
+            while pending:
+                writer.write(pending.popleft().result())
+        return writer.rows
+    finally:
+        writer.close()
+
+
+def main(argv: Optional[List[Text]] = None):
+    """
+    Runs the pymove-osmnx-match command.
+
+    Parameters
+    ----------
+    argv : list, optional
+        The command line arguments, by default None, uses sys.argv
+
+    """
+    parser = argparse.ArgumentParser(
+        prog='pymove-osmnx-match',
+        description='Map matches a csv or parquet trajectories file in chunks.',
+        epilog='Parquet files require pyarrow, installed with '
+        '"pip install pymove-osmnx[parquet]".'
+    )
+    parser.add_argument('input', help='csv or parquet trajectories file')
+    parser.add_argument('output', help='csv or parquet output file')
+    parser.add_argument(
+        '--graph', required=True,
+        help='local .graphml or .osm graph file, or saved matcher folder'
+    )
+    parser.add_argument(
+        '--method', default='nearest', choices=['node', 'nearest', 'hmm'],
+        help='match to the nearest nodes, the nearest edges or with the hmm'
+    )
+    parser.add_argument(
+        '--chunksize', type=int, default=100000,
+        help='number of rows read at a time'
+    )
+    parser.add_argument(
+        '--id-column', default=TRAJ_ID,
+        help='column identifying the trajectories'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=1, help='number of worker processes'
+    )
+    parser.add_argument(
+        '--compact', action='store_true',
+        help='write integer node or edge identifiers instead of geometries'
+    )
+    hmm = parser.add_argument_group(
+        'hmm', 'parameters of --method hmm, by default those of MapMatcher.match_edges'
+    )
+    hmm.add_argument(
+        '--k', type=int, help='maximum number of candidate edges per point'
+    )
+    hmm.add_argument(
+        '--radius', type=float,
+        help='maximum distance in meters between a point and its candidates'
+    )
+    hmm.add_argument(
+        '--sigma', type=float,
+        help='standard deviation of the GPS noise in meters'
+    )
+    hmm.add_argument(
+        '--beta', type=float,
+        help='scale of the transition distribution in meters'
+    )
+    hmm.add_argument(
+        '--max-speed', type=float, help='maximum speed in meters per second'
+    )
+    args = parser.parse_args(argv)
+
+    kwargs = None
+    if args.method == 'hmm':
+        kwargs = {
+            name: getattr(args, name)
+            for name in ['k', 'radius', 'sigma', 'beta', 'max_speed']
+            if getattr(args, name) is not None
+        }
+
+    rows = match_file(
+        args.input,
+        args.output,
+        args.graph,
+        method=args.method,
+        chunksize=args.chunksize,
+        id_column=args.id_column,
+        n_jobs=args.workers,
+        kwargs=kwargs,
+        compact=args.compact
+    )
+    print('%s rows written to %s' % (rows, args.output))
@@ -0,0 +1,504 @@
+import hashlib
+import heapq
+import os
+from typing import Dict, List, Optional, Text
+
+import numpy as np
+from networkx import MultiDiGraph
+from shapely.geometry import LineString, Point
+
+
+class CompactGraph:
+    """
+    Road graph stored in numpy arrays, in compressed sparse row layout.
+
+    The nodes keep the order of the MultiDiGraph they were built from and
+    the edges are grouped by their start node, the edges of the node at
+    position i being those from indptr[i] to indptr[i + 1]. The vertices
+    of the geometries of all edges are stacked in a single array. No Python
+    object is kept per node or edge, so a graph takes a small fraction of the
+    memory of the MultiDiGraph and its GeoDataFrames.
+
+    Parameters
+    ----------
+    node_ids : array
+        The identifier of each node
+    node_x : array
+        The longitude of each node
+    node_y : array
+        The latitude of each node
+    indptr : array
+        The position where the edges of each node start, with one extra
+        final position
+    edge_target : array
+        The position of the end node of each edge
+    edge_key : array
+        The key of each edge
+    edge_length : array
+        The length in meters of each edge
+    vertices : array
+        The (n, 2) array of the vertices of the edge geometries
+    vertex_ptr : array
+        The position where the vertices of each edge start, with one extra
+        final position
+
+    """
+
+    ARRAYS = (
+        'node_ids', 'node_x', 'node_y', 'indptr', 'edge_target',
+        'edge_key', 'edge_length', 'vertices', 'vertex_ptr'
+    )
+
+    def __init__(
+        self,
+        node_ids: np.ndarray,
+        node_x: np.ndarray,
+        node_y: np.ndarray,
+        indptr: np.ndarray,
+        edge_target: np.ndarray,
+        edge_key: np.ndarray,
+        edge_length: np.ndarray,
+        vertices: np.ndarray,
+        vertex_ptr: np.ndarray
+    ):
+        self.node_ids = node_ids
+        self.node_x = node_x
+        self.node_y = node_y
+        self.indptr = indptr
+        self.edge_target = edge_target
+        self.edge_key = edge_key
+        self.edge_length = edge_length
+        self.vertices = vertices
+        self.vertex_ptr = vertex_ptr
+        self._node_sorter = None
+        self._edge_sorter = None
+        self._edge_codes = None
+        self._edge_source = None
+        self._digest = None
+
+    @classmethod
+    def from_graph(cls, G: MultiDiGraph) -> 'CompactGraph':
+        """
+        Builds the arrays of a road graph.
+
+        Edges without a geometry get the straight line between their nodes,
+        as in ox.graph_to_gdfs.
+
+        Parameters
+        ----------
+        G : MultiDiGraph
+            The road graph, its edges must have a length
+
+        Returns
+        -------
+        CompactGraph
+            The compact graph
+
+        """
+        n_nodes = G.number_of_nodes()
+        node_ids = np.fromiter(G.nodes, dtype=np.int64, count=n_nodes)
+        node_x = np.fromiter(
+            (d['x'] for _, d in G.nodes(data=True)), dtype=np.float64, count=n_nodes
+        )
+        node_y = np.fromiter(
+            (d['y'] for _, d in G.nodes(data=True)), dtype=np.float64, count=n_nodes
+        )
+        position = dict(zip(node_ids.tolist(), range(n_nodes)))
+
+        source, target, key, length, coords = [], [], [], [], []
+        for u, v, k, data in G.edges(keys=True, data=True):
+            source.append(position[u])
+            target.append(position[v])
+            key.append(k)
+            length.append(data['length'])
+            geometry = data.get('geometry')
+            coords.append(None if geometry is None else np.asarray(geometry.coords))
+        n_edges = len(source)
+        edge_source = np.array(source, dtype=np.int64)
+        edge_target = np.array(target, dtype=np.int32)
+        edge_key = np.array(key, dtype=np.int64)
+        edge_length = np.array(length, dtype=np.float64)
+
+        indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(edge_source, minlength=n_nodes))
+        vertex_ptr = np.zeros(n_edges + 1, dtype=np.int64)
+        vertex_ptr[1:] = np.cumsum([2 if c is None else len(c) for c in coords])
+        vertices = np.empty((vertex_ptr[-1], 2), dtype=np.float64)
+        straight = np.array([c is None for c in coords], dtype=bool)
+        start = vertex_ptr[:-1][straight]
+        vertices[start, 0] = node_x[edge_source[straight]]
+        vertices[start, 1] = node_y[edge_source[straight]]
+        vertices[start + 1, 0] = node_x[edge_target[straight]]
+        vertices[start + 1, 1] = node_y[edge_target[straight]]
+        for i in np.nonzero(~straight)[0]:
+            vertices[vertex_ptr[i]:vertex_ptr[i + 1]] = coords[i]
+        return cls(
+            node_ids, node_x, node_y, indptr, edge_target,
+            edge_key, edge_length, vertices, vertex_ptr
+        )
+
+    @classmethod
+    def _from_edges(
+        cls,
+        node_ids: np.ndarray,
+        node_x: np.ndarray,
+        node_y: np.ndarray,
+        source: np.ndarray,
+        target: np.ndarray,
+        key: np.ndarray,
+        length: np.ndarray,
+        vertices: np.ndarray,
+        vertex_start: np.ndarray,
+        vertex_count: np.ndarray
+    ) -> 'CompactGraph':
+        """Builds a graph from edges in any order and the slices of their vertices."""
+        order = np.argsort(source, kind='stable')
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(source, minlength=len(node_ids)))
+        count = vertex_count[order]
+        vertex_ptr = np.zeros(len(order) + 1, dtype=np.int64)
+        vertex_ptr[1:] = np.cumsum(count)
+        gather = np.repeat(vertex_start[order] - vertex_ptr[:-1], count)
+        gather += np.arange(vertex_ptr[-1])
+        return cls(
+            node_ids, node_x, node_y, indptr,
+            target[order].astype(np.int32), key[order], length[order],
+            vertices[gather], vertex_ptr
+        )
+
+    def subgraph(
+        self, edges: np.ndarray, nodes: Optional[np.ndarray] = None
+    ) -> 'CompactGraph':
+        """
+        Builds the graph of some edges.
+
+        Parameters
+        ----------
+        edges : array
+            The positions of the edges
+        nodes : array, optional
+            The positions of nodes kept besides the nodes of the edges,
+            by default None
+
+        Returns
+        -------
+        CompactGraph
+            The graph of the edges and their nodes
+
+        """
+        edges = np.asarray(edges, dtype=np.int64)
+        source = self.edge_source[edges]
+        target = self.edge_target[edges].astype(np.int64)
+        keep = [source, target]
+        if nodes is not None:
+            keep.append(np.asarray(nodes, dtype=np.int64))
+        keep = np.unique(np.concatenate(keep))
+        return self._from_edges(
+            self.node_ids[keep],
+            self.node_x[keep],
+            self.node_y[keep],
+            np.searchsorted(keep, source),
+            np.searchsorted(keep, target),
+            self.edge_key[edges],
+            self.edge_length[edges],
+            self.vertices,
+            self.vertex_ptr[edges],
+            np.diff(self.vertex_ptr)[edges]
+        )
+
+    @classmethod
+    def concat(cls, graphs: List['CompactGraph']) -> 'CompactGraph':
+        """
+        Stitches graphs that may share nodes and edges.
+
+        Nodes with the same identifier and edges with the same start node, end
+        node and key are kept once.
+
+        Parameters
+        ----------
+        graphs : list
+            The graphs, at least one
+
+        Returns
+        -------
+        CompactGraph
+            The union of the graphs, with its nodes sorted by identifier
+
+        """
+        ids, first = np.unique(
+            np.concatenate([g.node_ids for g in graphs]), return_index=True
+        )
+        edge_u = np.concatenate([g.edge_u for g in graphs])
+        edge_v = np.concatenate([g.edge_v for g in graphs])
+        edge_key = np.concatenate([g.edge_key for g in graphs])
+        _, edges = np.unique(
+            np.stack([edge_u, edge_v, edge_key], axis=1), axis=0, return_index=True
+        )
+        edges.sort()
+
+        offsets = np.cumsum([0] + [len(g.vertices) for g in graphs[:-1]])
+        vertex_start = np.concatenate(
+            [g.vertex_ptr[:-1] + o for g, o in zip(graphs, offsets)]
+        )
+        vertex_count = np.concatenate([np.diff(g.vertex_ptr) for g in graphs])
+        return cls._from_edges(
+            ids,
+            np.concatenate([g.node_x for g in graphs])[first],
+            np.concatenate([g.node_y for g in graphs])[first],
+            np.searchsorted(ids, edge_u[edges]),
+            np.searchsorted(ids, edge_v[edges]),
+            edge_key[edges],
+            np.concatenate([g.edge_length for g in graphs])[edges],
+            np.concatenate([g.vertices for g in graphs]),
+            vertex_start[edges],
+            vertex_count[edges]
+        )
+
+    def save(self, path: Text):
+        """
+        Saves the arrays of the graph as .npy files in a folder.
+
+        Parameters
+        ----------
+        path : str
+            The folder, created if it does not exist
+
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(path, name + '.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, path: Text, mmap: Optional[bool] = True) -> 'CompactGraph':
+        """
+        Loads a graph saved with CompactGraph.save.
+
+        With mmap, the arrays are read only memory maps of the files, so
+        opening the graph does not read it and the processes of a host that
+        load the same folder share its pages.
+
+        Parameters
+        ----------
+        path : str
+            The folder of the graph
+        mmap : bool, optional
+            Whether to map the files instead of reading them, by default True
+
+        Returns
+        -------
+        CompactGraph
+            The compact graph
+
+        """
+        mmap_mode = 'r' if mmap else None
+        return cls(*[
+            np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+            for name in cls.ARRAYS
+        ])
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.edge_target)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the arrays of the graph."""
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS)
+
+    @property
+    def digest(self) -> Text:
+        """Hexadecimal hash of the contents of the arrays, computed on first use."""
+        if self._digest is None:
+            h = hashlib.sha1()
+            for name in self.ARRAYS:
+                array = np.ascontiguousarray(getattr(self, name))
+                h.update(repr((name, array.dtype.str, array.shape)).encode('utf-8'))
+                h.update(array.data)
+            self._digest = h.hexdigest()
+        return self._digest
+
+    @property
+    def edge_source(self) -> np.ndarray:
+        """Position of the start node of each edge, built on first use."""
+        if self._edge_source is None:
+            self._edge_source = np.repeat(
+                np.arange(self.n_nodes), np.diff(self.indptr)
+            )
+        return self._edge_source
+
+    @property
+    def edge_u(self) -> np.ndarray:
+        """Identifier of the start node of each edge."""
+        return self.node_ids[self.edge_source]
+
+    @property
+    def edge_v(self) -> np.ndarray:
+        """Identifier of the end node of each edge."""
+        return self.node_ids[self.edge_target]
+
+    def node_positions(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Finds the position of each node identifier.
+
+        Parameters
+        ----------
+        ids : array
+            The node identifiers
+
+        Returns
+        -------
+        array
+            The positions of the nodes, -1 for unknown identifiers
+
+        """
+        if self._node_sorter is None:
+            self._node_sorter = np.argsort(self.node_ids, kind='stable')
+        ids = np.asarray(ids, dtype=np.int64)
+        if self.n_nodes == 0:
+            return np.full(len(ids), -1, dtype=np.int64)
+        sorted_ids = self.node_ids[self._node_sorter]
+        found = np.minimum(np.searchsorted(sorted_ids, ids), self.n_nodes - 1)
+        return np.where(
+            sorted_ids[found] == ids, self._node_sorter[found], -1
+        )
+
+    def edge_positions(
+        self,
+        u: np.ndarray,
+        v: np.ndarray,
+        key: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Finds the edge linking each pair of nodes.
+
+        Parameters
+        ----------
+        u : array
+            The identifiers of the start nodes
+        v : array
+            The identifiers of the end nodes
+        key : array, optional
+            The keys of the edges, by default None, finds the edge with the
+            lowest key
+
+        Returns
+        -------
+        array
+            The positions of the edges, -1 where there is no such edge
+
+        """
+        u_pos = self.node_positions(u)
+        v_pos = self.node_positions(v)
+        if self.n_edges == 0:
+            return np.full(len(u_pos), -1, dtype=np.int64)
+
+        n_keys = int(self.edge_key.max()) + 1
+        if self._edge_sorter is None:
+            code = (self.edge_source * self.n_nodes + self.edge_target) * n_keys
+            code += self.edge_key
+            self._edge_sorter = np.argsort(code, kind='stable')
+            self._edge_codes = code[self._edge_sorter]
+        sorted_code = self._edge_codes
+
+        query = (u_pos * self.n_nodes + v_pos) * n_keys
+        if key is not None:
+            query += np.asarray(key, dtype=np.int64)
+        found = np.minimum(np.searchsorted(sorted_code, query), self.n_edges - 1)
+        if key is None:
+            same = sorted_code[found] // n_keys == query // n_keys
+        else:
+            same = sorted_code[found] == query
+        valid = (u_pos >= 0) & (v_pos >= 0) & same
+        return np.where(valid, self._edge_sorter[found], -1)
+
+    def node_geometries(self, idx: np.ndarray) -> np.ndarray:
+        """
+        Creates the points of some nodes.
+
+        Parameters
+        ----------
+        idx : array
+            The positions of the nodes
+
+        Returns
+        -------
+        array
+            The object array of points
+
+        """
+        unique, inverse = np.unique(idx, return_inverse=True)
+        points = np.empty(len(unique), dtype=object)
+        points[:] = [Point(self.node_x[i], self.node_y[i]) for i in unique]
+        return points[inverse]
+
+    def edge_geometries(self, idx: np.ndarray) -> np.ndarray:
+        """
+        Creates the line strings of some edges, once per distinct edge.
+
+        Parameters
+        ----------
+        idx : array
+            The positions of the edges
+
+        Returns
+        -------
+        array
+            The object array of line strings
+
+        """
+        unique, inverse = np.unique(idx, return_inverse=True)
+        lines = np.empty(len(unique), dtype=object)
+        lines[:] = [
+            LineString(self.vertices[self.vertex_ptr[i]:self.vertex_ptr[i + 1]])
+            for i in unique
+        ]
+        return lines[inverse]
+
+    def shortest_path_lengths(
+        self, source: int, cutoff: Optional[float] = None
+    ) -> Dict:
+        """
+        Lengths of the shortest paths from a node, with Dijkstra's algorithm.
+
+        Parameters
+        ----------
+        source : int
+            The identifier of the source node
+        cutoff : float, optional
+            The maximum length of the paths, by default None
+
+        Returns
+        -------
+        dict
+            The length of the shortest path to each node reached within the
+            cutoff, by node identifier
+
+        """
+        start = int(self.node_positions([source])[0])
+        if start < 0:
+            raise KeyError(source)
+        if cutoff is None:
+            cutoff = np.inf
+
+        lengths = {}
+        heap = [(0.0, start)]
+        while heap:
+            length, node = heapq.heappop(heap)
+            if node in lengths:
+                continue
+            lengths[node] = length
+            first, last = self.indptr[node], self.indptr[node + 1]
+            for target, edge_length in zip(
+                self.edge_target[first:last].tolist(),
+                self.edge_length[first:last].tolist()
+            ):
+                total = length + edge_length
+                if target not in lengths and total <= cutoff:
+                    heapq.heappush(heap, (total, target))
+
+        reached = np.fromiter(lengths, dtype=np.int64, count=len(lengths))
+        return dict(zip(self.node_ids[reached].tolist(), lengths.values()))
@@ -0,0 +1,167 @@
+from typing import Dict, Optional, Text, Tuple, Union
+
+import dask
+import numpy as np
+import pandas as pd
+from dask.dataframe import DataFrame as DaskDataFrame
+from pandas.core.frame import DataFrame
+from pymove.core.dask import DaskMoveDataFrame
+from pymove.utils.constants import LATITUDE, LONGITUDE
+
+
+def is_dask(move_data) -> bool:
+    """
+    Checks whether the data is a DaskMoveDataFrame or a dask DataFrame.
+
+    Parameters
+    ----------
+    move_data : MoveDataFrame or DataFrame
+        The input trajectories data
+
+    Returns
+    -------
+    bool
+        True if the data is backed by dask
+
+    """
+    return isinstance(move_data, (DaskMoveDataFrame, DaskDataFrame))
+
+
+def _dask_frame(move_data: Union[DaskMoveDataFrame, DaskDataFrame]) -> DaskDataFrame:
+    """Returns the dask DataFrame holding the data."""
+    if isinstance(move_data, DaskMoveDataFrame):
+        return move_data._data
+    return move_data
+
+
+def get_bbox(
+    move_data: Union[DaskMoveDataFrame, DaskDataFrame]
+) -> Tuple[float, float, float, float]:
+    """
+    Computes the bounding box of dask data with reductions only.
+
+    Parameters
+    ----------
+    move_data : DaskMoveDataFrame or dask DataFrame
+        The input trajectories data
+
+    Returns
+    -------
+    tuple
+        The bounding box, in the same order as MoveDataFrame.get_bbox
+
+    """
+    ddf = _dask_frame(move_data)
+    return dask.compute(
+        ddf[LATITUDE].min(),
+        ddf[LONGITUDE].min(),
+        ddf[LATITUDE].max(),
+        ddf[LONGITUDE].max()
+    )
+
+
+def get_tiles(
+    move_data: Union[DaskMoveDataFrame, DaskDataFrame],
+    tiles
+) -> np.ndarray:
+    """
+    Finds the tiles of a store near the points of dask data, by partition.
+
+    Parameters
+    ----------
+    move_data : DaskMoveDataFrame or dask DataFrame
+        The input trajectories data
+    tiles : TileStore
+        The store of the road graph tiles
+
+    Returns
+    -------
+    array
+        The sorted packed codes of the tiles
+
+    """
+    ddf = _dask_frame(move_data)
+    codes = ddf.map_partitions(
+        lambda df: pd.Series(tiles.tiles(df[LONGITUDE], df[LATITUDE])),
+        meta=pd.Series(dtype='int64')
+    )
+    return np.unique(codes.compute().values)
+
+
+def _match_partition(
+    df: DataFrame,
+    matcher,
+    method: Text,
+    kwargs: Dict
+) -> DataFrame:
+    """Matches one pandas partition."""
+    if method == 'node':
+        return matcher.match_nodes(df, inplace=False, **kwargs)
+    return matcher.match_edges(df, inplace=False, method=method, **kwargs)
+
+
+def match_dask(
+    matcher,
+    move_data: Union[DaskMoveDataFrame, DaskDataFrame],
+    method: Text,
+    inplace: Optional[bool] = True,
+    kwargs: Optional[Dict] = None
+) -> Optional[Union[DaskMoveDataFrame, DaskDataFrame]]:
+    """
+    Lazily map matches each partition of dask data.
+
+    The matcher is added once to the task graph and shared by the tasks of
+    all partitions. With method 'hmm', each trajectory must be contained in
+    a single partition.
+
+    Parameters
+    ----------
+    matcher : MapMatcher
+        The matcher holding the graph and its indexes
+    move_data : DaskMoveDataFrame or dask DataFrame
+        The input trajectories data
+    method : str
+        'node' for the nearest nodes, 'nearest' for the nearest edges or
+        'hmm' for the hidden markov model
+    inplace : bool, optional
+        if set to true the data of the DaskMoveDataFrame will be replaced,
+        otherwise a new one is returned. A dask DataFrame is always returned,
+        by default True
+    kwargs : dict, optional
+        Parameters of the matching methods, by default None
+
+    Returns
+    -------
+    DaskMoveDataFrame or dask DataFrame
+        The lazily matched data or None
+
+    """
+    kwargs = kwargs or {}
+    ddf = _dask_frame(move_data)
+    meta = ddf._meta.copy()
+    if kwargs.get('compact'):
+        columns = ['node'] if method == 'node' else ['u', 'v', 'key']
+        for column in columns:
+            meta[column] = pd.Series(dtype='int64')
+    else:
+        if method != 'node':
+            meta['edge'] = pd.Series(dtype=object)
+        meta['geometry'] = pd.Series(dtype=object)
+    if method != 'node':
+        for column in ['snapped_lat', 'snapped_lon', 'match_distance', 'edge_offset']:
+            meta[column] = pd.Series(dtype=float)
+
+    matcher.build_indexes()
+    result = ddf.map_partitions(
+        _match_partition, dask.delayed(matcher), method, kwargs, meta=meta
+    )
+
+    if not isinstance(move_data, DaskMoveDataFrame):
+        return result
+    if inplace:
+        move_data._data = result
+        return None
+    new_move_data = DaskMoveDataFrame.__new__(DaskMoveDataFrame)
+    new_move_data.__dict__.update(move_data.__dict__)
+    new_move_data._data = result
+    return new_move_data
@@ -0,0 +1,253 @@
+import hashlib
+import os
+import pickle
+from typing import Dict, List, Optional, Text, Tuple
+
+import osmnx as ox
+from geopandas import GeoDataFrame
+from networkx import MultiDiGraph
+from requests.exceptions import RequestException
+
+OVERPASS = 'overpass'
+
+
+class GraphCache:
+    """
+    Persistent on-disk cache of road graphs.
+
+    Each entry stores the graph built for a bounding box together with
+    its node and edge tables, serialized with pickle, keyed by
+    (bbox, network_type, source). The source is either the Overpass API
+    or the path of a local OSM XML/GraphML file. The network_type only
+    filters downloaded graphs, a local file is loaded with all its ways,
+    whatever the network_type of the key.
+
+    Parameters
+    ----------
+    cache_folder : str, optional
+        The folder where entries are stored, by default '.pymove_osmnx_cache'
+    max_size : int, optional
+        Maximum total size of the cache in bytes. When exceeded, the least
+        recently used entries are evicted, by default None (unbounded)
+    filepath : str, optional
+        Local OSM XML or GraphML file used when the graph cannot be
+        downloaded, by default None. The graph built from it is stored only
+        under the key of the file, so later calls for the same bbox try the
+        download again and fall back to the cached file graph
+    precision : int, optional
+        Number of decimals of the bbox used to build the key, by default 6
+
+    """
+
+    def __init__(
+        self,
+        cache_folder: Optional[Text] = '.pymove_osmnx_cache',
+        max_size: Optional[int] = None,
+        filepath: Optional[Text] = None,
+        precision: Optional[int] = 6
+    ):
+        self.cache_folder = cache_folder
+        self.max_size = max_size
+        self.filepath = filepath
+        self.precision = precision
+        os.makedirs(cache_folder, exist_ok=True)
+
+    def key(
+        self,
+        bbox: Tuple[float, float, float, float],
+        network_type: Optional[Text] = 'all_private',
+        source: Optional[Text] = OVERPASS
+    ) -> Text:
+        """
+        Builds the key of an entry.
+
+        Parameters
+        ----------
+        bbox : tuple
+            The bounding box as (north, east, south, west)
+        network_type : str, optional
+            The OSMnx network type, by default 'all_private'
+        source : str, optional
+            'overpass' or the path of a local file, by default 'overpass'
+
+        Returns
+        -------
+        str
+            The hexadecimal digest identifying the entry
+
+        """
+        bbox = tuple(round(float(b), self.precision) for b in bbox)
+        if source != OVERPASS:
+            source = os.path.abspath(source)
+        raw = repr((bbox, network_type, source)).encode('utf-8')
+        return hashlib.sha1(raw).hexdigest()
+
+    def _path(self, key: Text) -> Text:
+        return os.path.join(self.cache_folder, '%s.pkl' % key)
+
+    def _build(
+        self,
+        bbox: Tuple[float, float, float, float],
+        network_type: Text,
+        source: Text
+    ) -> MultiDiGraph:
+        if source == OVERPASS:
+            return ox.graph_from_bbox(
+                bbox[0], bbox[2], bbox[1], bbox[3], network_type=network_type
+            )
+        return graph_from_file(source, bbox)
+
+    def _load(
+        self,
+        bbox: Tuple[float, float, float, float],
+        network_type: Text,
+        filepath: Optional[Text]
+    ) -> Dict:
+        source = OVERPASS if filepath is None else filepath
+        path = self._path(self.key(bbox, network_type, source))
+        if os.path.exists(path):
+            os.utime(path)
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+
+        try:
+            G = self._build(bbox, network_type, source)
+        except RequestException:
+            if source != OVERPASS or self.filepath is None:
+                raise
+            return self._load(bbox, network_type, self.filepath)
+
+        gdf_nodes, gdf_edges = ox.graph_to_gdfs(G)
+        entry = {'graph': G, 'nodes': gdf_nodes, 'edges': gdf_edges}
+        self._save(path, entry)
+        return entry
+
+    def _save(self, path: Text, entry: Dict):
+        with open(path, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.evict()
+
+    def get(
+        self,
+        bbox: Tuple[float, float, float, float],
+        network_type: Optional[Text] = 'all_private',
+        filepath: Optional[Text] = None
+    ) -> MultiDiGraph:
+        """
+        Returns the graph of the bounding box, building it if not cached.
+
+        Parameters
+        ----------
+        bbox : tuple
+            The bounding box as (north, east, south, west)
+        network_type : str, optional
+            The OSMnx network type, by default 'all_private'
+        filepath : str, optional
+            Local OSM XML or GraphML file to build the graph from,
+            by default None, downloads from the Overpass API
+
+        Returns
+        -------
+        MultiDiGraph
+            The road graph
+
+        """
+        return self._load(bbox, network_type, filepath)['graph']
+
+    def get_gdfs(
+        self,
+        bbox: Tuple[float, float, float, float],
+        network_type: Optional[Text] = 'all_private',
+        filepath: Optional[Text] = None
+    ) -> Tuple[GeoDataFrame, GeoDataFrame]:
+        """
+        Returns the node and edge tables of the bounding box graph.
+
+        Parameters
+        ----------
+        bbox : tuple
+            The bounding box as (north, east, south, west)
+        network_type : str, optional
+            The OSMnx network type, by default 'all_private'
+        filepath : str, optional
+            Local OSM XML or GraphML file to build the graph from,
+            by default None, downloads from the Overpass API
+
+        Returns
+        -------
+        tuple
+            The nodes and edges GeoDataFrames, as in ox.graph_to_gdfs
+
+        """
+        entry = self._load(bbox, network_type, filepath)
+        return entry['nodes'], entry['edges']
+
+    def entries(self) -> List[Text]:
+        """
+        Lists the entry files, from least to most recently used.
+
+        Returns
+        -------
+        list
+            The paths of the entry files
+
+        """
+        paths = [
+            os.path.join(self.cache_folder, f)
+            for f in os.listdir(self.cache_folder) if f.endswith('.pkl')
+        ]
+        return sorted(paths, key=os.path.getmtime)
+
+    @property
+    def size(self) -> int:
+        """Total size of the cache in bytes."""
+        return sum(os.path.getsize(p) for p in self.entries())
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits max_size."""
+        if self.max_size is None:
+            return
+        paths = self.entries()
+        size = sum(os.path.getsize(p) for p in paths)
+        # the most recent entry is always kept
+        for path in paths[:-1]:
+            if size <= self.max_size:
+                break
+            size -= os.path.getsize(path)
+            os.remove(path)
+
+    def clear(self):
+        """Removes all entries."""
+        for path in self.entries():
+            os.remove(path)
+
+
+def graph_from_file(
+    filepath: Text,
+    bbox: Optional[Tuple[float, float, float, float]] = None
+) -> MultiDiGraph:
+    """
+    Loads a graph from a local OSM XML or GraphML file.
+
+    Parameters
+    ----------
+    filepath : str
+        Path of the file, GraphML files must have the .graphml extension
+    bbox : tuple, optional
+        The bounding box as (north, east, south, west) used to truncate the
+        graph, by default None
+
+    Returns
+    -------
+    MultiDiGraph
+        The road graph
+
+    """
+    if filepath.endswith('.graphml'):
+        G = ox.load_graphml(filepath)
+    else:
+        G = ox.graph_from_xml(filepath)
+
+    if bbox is not None:
+        G = ox.truncate.truncate_graph_bbox(G, bbox[0], bbox[2], bbox[1], bbox[3])
+    return G
@@ -0,0 +1,339 @@
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from pymove.utils.distances import haversine
+
+from pymove_osmnx.core.shortest_path import ShortestPathCache
+
+# mean earth radius in kilometers, as in osmnx
+EARTH_RADIUS = 6371.009
+
+
+def great_circle(
+    lat1: Union[float, np.ndarray],
+    lon1: Union[float, np.ndarray],
+    lat2: Union[float, np.ndarray],
+    lon2: Union[float, np.ndarray]
+) -> Union[float, np.ndarray]:
+    """Great circle distance in meters between points, vectorized."""
+    return haversine(lat1, lon1, lat2, lon2, earth_radius=EARTH_RADIUS)
+
+
+def emission_log_prob(
+    distance: np.ndarray,
+    sigma: Optional[float] = 4.07
+) -> np.ndarray:
+    """
+    Log probability of observing a point given its candidate edge.
+
+    Zero-mean gaussian on the distance between the point and the edge,
+    as in Newson and Krumm, Hidden Markov Map Matching Through Noise and
+    Sparseness, 2009.
+
+    Parameters
+    ----------
+    distance : array
+        The distances in meters between the points and the candidates
+    sigma : float, optional
+        The standard deviation of the GPS noise in meters, by default 4.07
+
+    Returns
+    -------
+    array
+        The log probabilities
+
+    """
+    return -0.5 * (distance / sigma) ** 2 - np.log(np.sqrt(2 * np.pi) * sigma)
+
+
+def transition_log_prob(
+    great_circle: float,
+    route: np.ndarray,
+    beta: Optional[float] = 3.0
+) -> np.ndarray:
+    """
+    Log probability of moving between two candidates.
+
+    Exponential on the difference between the great circle distance of the
+    points and the route distance of the candidates, as in Newson and Krumm.
+
+    Parameters
+    ----------
+    great_circle : float
+        The great circle distance in meters between the two points
+    route : array
+        The route distances in meters between the candidates
+    beta : float, optional
+        The scale of the exponential distribution in meters, by default 3.0
+
+    Returns
+    -------
+    array
+        The log probabilities, -inf where there is no route
+
+    """
+    return -np.abs(great_circle - route) / beta - np.log(beta)
+
+
+def transition_cutoff(
+    distance: Union[float, np.ndarray],
+    radius: float,
+    delta_time: Optional[Union[float, np.ndarray]] = None,
+    max_speed: Optional[float] = 30
+) -> Union[float, np.ndarray]:
+    """
+    Maximum route length between the candidates of two consecutive points.
+
+    Parameters
+    ----------
+    distance : float or array
+        The great circle distance in meters between the points
+    radius : float
+        Maximum distance in meters between a point and its candidates
+    delta_time : float or array, optional
+        The time in seconds between the points, by default None. Only
+        positive times bound the route, so duplicated or unsorted times
+        do not break the trajectory
+    max_speed : float, optional
+        The maximum speed in meters per second, by default 30
+
+    Returns
+    -------
+    float or array
+        The cutoff in meters
+
+    """
+    cutoff = 2 * np.asarray(distance, dtype=np.float64) + 2 * radius
+    if delta_time is not None:
+        delta_time = np.asarray(delta_time, dtype=np.float64)
+        travelled = ShortestPathCache.max_distance(delta_time, max_speed)
+        cutoff = np.where(delta_time > 0, np.minimum(cutoff, travelled), cutoff)
+    return cutoff
+
+
+def _route_pairs(
+    matcher,
+    prev_edge: np.ndarray,
+    prev_offset: np.ndarray,
+    edge: np.ndarray,
+    offset: np.ndarray,
+    cutoff: Union[float, np.ndarray]
+) -> np.ndarray:
+    """Route distances between the candidates of each pair."""
+    path = matcher.paths.distances(
+        matcher.edge_v[prev_edge], matcher.edge_u[edge], cutoff
+    )
+    route = matcher.edge_length[prev_edge] - prev_offset + path + offset
+    forward = offset - prev_offset
+    same = (prev_edge == edge) & (forward >= 0)
+    return np.where(same, forward, route)
+
+
+def route_distances(
+    matcher,
+    prev_edge: np.ndarray,
+    prev_offset: np.ndarray,
+    edge: np.ndarray,
+    offset: np.ndarray,
+    cutoff: float
+) -> np.ndarray:
+    """
+    Route distances between two sets of candidates.
+
+    Parameters
+    ----------
+    matcher : MapMatcher
+        The matcher that generated the candidates
+    prev_edge : array
+        The edge positions of the candidates of the previous point
+    prev_offset : array
+        The offsets in meters of the candidates of the previous point
+    edge : array
+        The edge positions of the candidates of the current point
+    offset : array
+        The offsets in meters of the candidates of the current point
+    cutoff : float
+        The maximum length in meters of the paths between the edges
+
+    Returns
+    -------
+    array
+        The (len(prev_edge), len(edge)) matrix of route distances in meters,
+        np.inf where there is no route within the cutoff
+
+    """
+    rows, cols = np.meshgrid(
+        np.arange(len(prev_edge)), np.arange(len(edge)), indexing='ij'
+    )
+    rows, cols = rows.ravel(), cols.ravel()
+    return _route_pairs(
+        matcher, prev_edge[rows], prev_offset[rows], edge[cols], offset[cols], cutoff
+    ).reshape(len(prev_edge), len(edge))
+
+
+def _ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Concatenates the ranges of counts integers beginning at starts."""
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(counts.sum())
+
+
+def _segment_argmax(values: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Position of the first maximum of each contiguous, non empty segment."""
+    segment = np.repeat(np.arange(len(counts)), counts)
+    best = np.maximum.reduceat(values, np.cumsum(counts) - counts)
+    candidates = np.flatnonzero(values == best[segment])
+    first = np.r_[True, segment[candidates][1:] != segment[candidates][:-1]]
+    return candidates[first]
+
+
+def viterbi(
+    matcher,
+    X: np.ndarray,
+    Y: np.ndarray,
+    traj: Optional[np.ndarray] = None,
+    k: Optional[int] = 8,
+    radius: Optional[float] = 50,
+    sigma: Optional[float] = 4.07,
+    beta: Optional[float] = 3.0,
+    times: Optional[np.ndarray] = None,
+    max_speed: Optional[float] = 30
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Matches the points to the most likely sequence of edges of each trajectory.
+
+    Candidates and emission probabilities are computed for all points at
+    once. The Viterbi algorithm advances all trajectories together, one
+    point of each per step, with the points of each trajectory in the order
+    they are given, so the steps are as many as the points of the longest
+    trajectory. When no candidate of a point can be reached from the
+    previous one, the trajectory is split and matching restarts at that
+    point.
+
+    Parameters
+    ----------
+    matcher : MapMatcher
+        The matcher holding the graph and its indexes
+    X : array
+        The longitudes of the points
+    Y : array
+        The latitudes of the points
+    traj : array, optional
+        The trajectory identifier of each point, by default None, all
+        points are a single trajectory
+    k : int, optional
+        Maximum number of candidates per point, by default 8
+    radius : float, optional
+        Maximum distance in meters between a point and its candidates,
+        by default 50
+    sigma : float, optional
+        The standard deviation of the GPS noise in meters, by default 4.07
+    beta : float, optional
+        The scale of the transition distribution in meters, by default 3.0
+    times : array, optional
+        The time of each point in seconds, when given the route between two
+        points is also bounded by the distance travelled at max_speed,
+        by default None
+    max_speed : float, optional
+        The maximum speed in meters per second, by default 30
+
+    Returns
+    -------
+    tuple
+        The position in the graph of the edge matched to each point, -1 for
+        points without candidates, and the position of the chosen
+        candidate in the arrays returned by matcher.candidates
+
+    """
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    n = len(X)
+    traj = np.zeros(n, dtype=np.int64) if traj is None else np.asarray(traj)
+    if times is not None:
+        times = np.asarray(times, dtype=np.float64)
+
+    point_idx, cand_edge, cand_dist, cand_offset = matcher.candidates(
+        X, Y, k=k, radius=radius
+    )
+    cand_ptr = np.searchsorted(point_idx, np.arange(n + 1))
+    count = np.diff(cand_ptr)
+    emission = emission_log_prob(cand_dist, sigma)
+    score = np.full(len(point_idx), -np.inf)
+    back = np.full(len(point_idx), -1)
+
+    # points with candidates, grouped by trajectory in their given order
+    points = np.argsort(traj, kind='stable')
+    points = points[count[points] > 0]
+    m = len(points)
+    if m == 0:
+        return np.full(n, -1), np.full(n, -1)
+    first = np.r_[True, traj[points][1:] != traj[points][:-1]]
+    last = np.r_[first[1:], True]
+    rank = np.arange(m) - np.maximum.accumulate(np.where(first, np.arange(m), 0))
+
+    prev = points[np.maximum(np.arange(m) - 1, 0)]
+    distance = great_circle(Y[prev], X[prev], Y[points], X[points])
+    cutoff = transition_cutoff(
+        distance, radius,
+        None if times is None else times[points] - times[prev], max_speed
+    )
+
+    by_rank = np.argsort(rank, kind='stable')
+    rank_ptr = np.searchsorted(rank[by_rank], np.arange(rank.max(initial=0) + 2))
+    ends = []
+
+    for r in range(len(rank_ptr) - 1):
+        step = by_rank[rank_ptr[r]:rank_ptr[r + 1]]
+        cur = points[step]
+        rows = _ranges(cand_ptr[cur], count[cur])
+        if r == 0:
+            score[rows] = emission[rows]
+            continue
+        prv = points[step - 1]
+        # pairs ordered by current candidate, then previous candidate
+        pairs = count[prv] * count[cur]
+        pair_step = np.repeat(np.arange(len(step)), pairs)
+        within = np.arange(pairs.sum()) - np.repeat(np.cumsum(pairs) - pairs, pairs)
+        prev_rows = cand_ptr[prv][pair_step] + within % count[prv][pair_step]
+        cur_rows = cand_ptr[cur][pair_step] + within // count[prv][pair_step]
+
+        route = _route_pairs(
+            matcher,
+            cand_edge[prev_rows],
+            cand_offset[prev_rows],
+            cand_edge[cur_rows],
+            cand_offset[cur_rows],
+            cutoff[step][pair_step]
+        )
+        total = score[prev_rows] + transition_log_prob(
+            distance[step][pair_step], route, beta
+        )
+        best = _segment_argmax(total, np.repeat(count[prv], count[cur]))
+        best_score = total[best]
+
+        broken = np.logical_and.reduceat(
+            np.isneginf(best_score), np.cumsum(count[cur]) - count[cur]
+        )
+        if broken.any():
+            prev_broken = prv[broken]
+            prev_rows_broken = _ranges(cand_ptr[prev_broken], count[prev_broken])
+            ends.append(prev_rows_broken[
+                _segment_argmax(score[prev_rows_broken], count[prev_broken])
+            ])
+        kept = ~np.repeat(broken, count[cur])
+        score[rows] = np.where(kept, best_score, 0) + emission[rows]
+        back[rows[kept]] = prev_rows[best[kept]]
+
+    final = points[last]
+    final_rows = _ranges(cand_ptr[final], count[final])
+    ends.append(final_rows[_segment_argmax(score[final_rows], count[final])])
+
+    chosen = np.full(n, -1)
+    row = np.concatenate(ends).astype(np.int64)
+    while len(row):
+        chosen[point_idx[row]] = row
+        row = back[row]
+        row = row[row >= 0]
+
+    edge = np.full(n, -1)
+    edge[chosen >= 0] = cand_edge[chosen[chosen >= 0]]
+    return edge, chosen
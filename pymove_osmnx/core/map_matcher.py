@@ -0,0 +1,769 @@
+import json
+import os
+import pickle
+from typing import Dict, Optional, Text, Tuple, Union
+
+import numpy as np
+from networkx import MultiDiGraph
+from pandas.core.frame import DataFrame
+from pymove import PandasMoveDataFrame
+from pymove.core.dask import DaskMoveDataFrame
+from pymove.core.pandas_discrete import PandasDiscreteMoveDataFrame
+from pymove.utils.constants import DATETIME, TID, TRAJ_ID
+from scipy.spatial import cKDTree
+
+from pymove_osmnx.core.compact_graph import CompactGraph
+from pymove_osmnx.core.dask_matching import is_dask, match_dask
+from pymove_osmnx.core.match_cache import MatchCache
+from pymove_osmnx.core.memo import QuantizedMemo
+from pymove_osmnx.core.parallel import match_positions
+from pymove_osmnx.core.shortest_path import ShortestPathCache
+from pymove_osmnx.utils.instrumentation import instrument, stage
+
+METERS_PER_DEGREE = 111195.08
+
+
+def _trajectories(
+    move_data: Union[PandasMoveDataFrame, DaskMoveDataFrame, PandasDiscreteMoveDataFrame],
+    traj_column: Optional[Text] = None
+) -> Optional[np.ndarray]:
+    """Returns the given column, else the tid column, else the id column."""
+    if traj_column is not None:
+        return move_data[traj_column].values
+    if TID in move_data:
+        return move_data[TID].values
+    if TRAJ_ID in move_data:
+        return move_data[TRAJ_ID].values
+    return None
+
+
+class MapMatcher:
+    """
+    Map matcher built once from a graph, reused across MoveDataFrames.
+
+    Holds the graph as a CompactGraph and the KD-trees used to find the
+    nearest node and the nearest edge of each point, so repeated matching
+    against the same graph does not rebuild them. Nodes and edges are
+    referred to by their positions in the arrays of the CompactGraph.
+    Shortest path lengths computed while matching are kept in a
+    ShortestPathCache shared by all calls. With a MatchCache, the matched
+    positions of each trajectory are kept too, and trajectories matched
+    again are not.
+
+    A matcher saved with MapMatcher.save and opened with MapMatcher.load
+    memory maps its arrays, and is pickled as the path of its folder, so the
+    worker processes it is sent to map the same files instead of receiving
+    a copy of the graph.
+
+    Parameters
+    ----------
+    G : MultiDiGraph or CompactGraph
+        The road graph, a MultiDiGraph is converted to a CompactGraph
+    dist : float, optional
+        Spacing of the points created along the edges to build the edge
+        index, in the units of the graph, by default 0.0001
+    precision : float, optional
+        When given, nearest_nodes and nearest_edges snap the points to a grid
+        with cells of this size in degrees and query the indexes once per
+        cell, memoizing the results across calls, by default None
+    memo_size : int, optional
+        Maximum number of cells memoized by each query, by default 1000000
+    results : MatchCache, optional
+        Cache of the matching results of the trajectories, not sent to
+        worker processes, by default None
+
+    """
+
+    def __init__(
+        self,
+        G: Union[MultiDiGraph, CompactGraph],
+        dist: Optional[float] = 0.0001,
+        precision: Optional[float] = None,
+        memo_size: Optional[int] = 1000000,
+        results: Optional[MatchCache] = None
+    ):
+        if not isinstance(G, CompactGraph):
+            with stage('compact_graph'):
+                G = CompactGraph.from_graph(G)
+        self.graph = G
+        self.dist = dist
+        self.node_ids = G.node_ids
+        self.edge_u = G.edge_u
+        self.edge_v = G.edge_v
+        self.paths = ShortestPathCache(G)
+        self.results = results
+        self.path = None
+        self.node_memo = None
+        self.edge_memo = None
+        if precision is not None:
+            self.node_memo = QuantizedMemo(precision, memo_size)
+            self.edge_memo = QuantizedMemo(precision, memo_size)
+        self._node_tree = None
+        self._edge_tree = None
+        self._node_points = None
+        self._edge_points = None
+        self._edge_points_idx = None
+        self._vertex_offset = None
+
+    @property
+    def node_tree(self) -> cKDTree:
+        """KD-tree over the node coordinates, built on first use."""
+        if self._node_tree is None:
+            with stage('node_index', self.graph.n_nodes):
+                self._node_tree = self._saved_tree('node_tree')
+                if self._node_tree is None:
+                    if self._node_points is None:
+                        self._node_points = np.column_stack(
+                            [self.graph.node_x, self.graph.node_y]
+                        )
+                    self._node_tree = cKDTree(
+                        self._node_points, compact_nodes=True, balanced_tree=True
+                    )
+        return self._node_tree
+
+    @property
+    def edge_tree(self) -> cKDTree:
+        """KD-tree over points spaced along the edges, built on first use."""
+        if self._edge_tree is None:
+            with stage('edge_index', self.graph.n_edges):
+                self._edge_tree = self._saved_tree('edge_tree')
+                if self._edge_tree is None:
+                    if self._edge_points is None:
+                        points, idx = self._redistribute_vertices()
+                        self._edge_points, self._edge_points_idx = points, idx
+                    self._edge_tree = cKDTree(
+                        self._edge_points, compact_nodes=True, balanced_tree=True
+                    )
+        return self._edge_tree
+
+    def _saved_tree(self, name: Text) -> Optional[cKDTree]:
+        """Reads a KD-tree saved with the matcher mapped from path, if any."""
+        if self.path is None:
+            return None
+        filepath = os.path.join(self.path, name + '.pickle')
+        if not os.path.exists(filepath):
+            return None
+        with open(filepath, 'rb') as f:
+            return pickle.load(f)
+
+    def build_indexes(self):
+        """Builds all lazy indexes, before sharing the matcher with other processes."""
+        self.node_tree
+        self.edge_tree
+        self.vertex_offset
+
+    def save(self, path: Text):
+        """
+        Saves the graph and the index arrays as .npy files in a folder.
+
+        The KD-trees are pickled along, as reading them is an order of
+        magnitude faster than building them again: for 4 million edge
+        points, about 0.15 seconds instead of 2.7. They cannot be memory
+        mapped, so each process reading them holds its own copy.
+
+        Parameters
+        ----------
+        path : str
+            The folder, created if it does not exist
+
+        """
+        self.build_indexes()
+        self.graph.save(path)
+        arrays = {
+            'node_points': self._node_points,
+            'edge_points': self._edge_points,
+            'edge_points_idx': self._edge_points_idx,
+            'vertex_offset': self._vertex_offset,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(path, name + '.npy'), array)
+        trees = {'node_tree': self._node_tree, 'edge_tree': self._edge_tree}
+        for name, tree in trees.items():
+            with open(os.path.join(path, name + '.pickle'), 'wb') as f:
+                pickle.dump(tree, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(os.path.join(path, 'matcher.json'), 'w') as f:
+            json.dump({'dist': self.dist}, f)
+
+    @classmethod
+    def load(cls, path: Text, mmap: Optional[bool] = True) -> 'MapMatcher':
+        """
+        Loads a matcher saved with MapMatcher.save.
+
+        With mmap, the KD-trees are read on first use, and matchers sent to
+        worker processes are loaded again from the folder in each worker.
+        Otherwise they are read at once. Folders saved without the trees
+        build them from the saved points.
+
+        Parameters
+        ----------
+        path : str
+            The folder of the matcher
+        mmap : bool, optional
+            Whether to map the files instead of reading them, by default True
+
+        Returns
+        -------
+        MapMatcher
+            The matcher
+
+        """
+        with open(os.path.join(path, 'matcher.json')) as f:
+            meta = json.load(f)
+        matcher = cls(CompactGraph.load(path, mmap=mmap), dist=meta['dist'])
+        mmap_mode = 'r' if mmap else None
+        for name in ['node_points', 'edge_points', 'edge_points_idx', 'vertex_offset']:
+            setattr(matcher, '_' + name, np.load(
+                os.path.join(path, name + '.npy'), mmap_mode=mmap_mode
+            ))
+        matcher.path = path
+        if not mmap:
+            matcher.build_indexes()
+            matcher.path = None
+        return matcher
+
+    def __getstate__(self) -> Dict:
+        if self.path is None:
+            return dict(self.__dict__, results=None)
+        return {
+            'path': self.path,
+            'node_memo': self.node_memo,
+            'edge_memo': self.edge_memo
+        }
+
+    def __setstate__(self, state: Dict):
+        if 'graph' not in state:
+            memos = state
+            state = MapMatcher.load(memos['path']).__dict__
+            state['node_memo'] = memos['node_memo']
+            state['edge_memo'] = memos['edge_memo']
+        self.__dict__.update(state)
+
+    def _edge_vertices(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the stacked vertices of all edge geometries.
+
+        Returns
+        -------
+        tuple
+            The (n, 2) array of vertices and the array of offsets where the
+            vertices of each edge start, with one extra final offset
+
+        """
+        return self.graph.vertices, self.graph.vertex_ptr
+
+    @property
+    def vertex_offset(self) -> np.ndarray:
+        """Distance in meters from the start of its edge to each vertex."""
+        if self._vertex_offset is None:
+            vertices, ptr = self._edge_vertices()
+            lat = np.radians((vertices[:-1, 1] + vertices[1:, 1]) / 2)
+            delta = np.diff(vertices, axis=0) * METERS_PER_DEGREE
+            seg_len = np.hypot(delta[:, 0] * np.cos(lat), delta[:, 1])
+            seg_len[ptr[1:-1] - 1] = 0
+            cum = np.concatenate([[0], np.cumsum(seg_len)])
+            self._vertex_offset = cum - np.repeat(cum[ptr[:-1]], np.diff(ptr))
+        return self._vertex_offset
+
+    @property
+    def edge_length(self) -> np.ndarray:
+        """Length in meters of the geometry of each edge."""
+        _, ptr = self._edge_vertices()
+        return self.vertex_offset[ptr[1:] - 1]
+
+    def _redistribute_vertices(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Creates points evenly spaced by dist along every edge.
+
+        Vectorized equivalent of ox.utils_geo.redistribute_vertices
+        applied to all edges.
+
+        Returns
+        -------
+        tuple
+            The (n, 2) array of points and the position of the edge of each point
+
+        """
+        vertices, ptr = self._edge_vertices()
+        n_edges = len(ptr) - 1
+
+        seg_len = np.hypot(*np.diff(vertices, axis=0).T)
+        seg_len[ptr[1:-1] - 1] = 0
+        cum = np.concatenate([[0], np.cumsum(seg_len)])
+        edge_len = cum[ptr[1:] - 1] - cum[ptr[:-1]]
+
+        num_vert = np.maximum(np.rint(edge_len / self.dist).astype(np.int64), 1)
+        counts = num_vert + 1
+        edge_idx = np.repeat(np.arange(n_edges), counts)
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        frac = (np.arange(counts.sum()) - starts) / num_vert[edge_idx]
+
+        target = cum[ptr[:-1]][edge_idx] + frac * edge_len[edge_idx]
+        seg = np.searchsorted(cum, target, side='right') - 1
+        seg = np.clip(seg, ptr[:-1][edge_idx], ptr[1:][edge_idx] - 2)
+        length = np.where(seg_len[seg] > 0, seg_len[seg], 1)
+        t = np.clip((target - cum[seg]) / length, 0, 1)[:, None]
+        points = vertices[seg] + t * (vertices[seg + 1] - vertices[seg])
+        return points, edge_idx
+
+    def nearest_nodes(self, X: np.ndarray, Y: np.ndarray) -> np.ndarray:
+        """
+        Finds the position in the graph of the nearest node of each point.
+
+        Parameters
+        ----------
+        X : array
+            The longitudes of the points
+        Y : array
+            The latitudes of the points
+
+        Returns
+        -------
+        array
+            The positions of the nearest nodes
+
+        """
+        if self.node_memo is not None:
+            return self.node_memo.get(X, Y, self._nearest_nodes)
+        return self._nearest_nodes(X, Y)
+
+    def _nearest_nodes(self, X: np.ndarray, Y: np.ndarray) -> np.ndarray:
+        """Queries the node index, without the memo."""
+        _, idx = self.node_tree.query(np.column_stack([X, Y]), k=1)
+        return idx
+
+    def nearest_edges(self, X: np.ndarray, Y: np.ndarray) -> np.ndarray:
+        """
+        Finds the position in the graph of the nearest edge of each point.
+
+        Parameters
+        ----------
+        X : array
+            The longitudes of the points
+        Y : array
+            The latitudes of the points
+
+        Returns
+        -------
+        array
+            The positions of the nearest edges
+
+        """
+        if self.edge_memo is not None:
+            return self.edge_memo.get(X, Y, self._nearest_edges)
+        return self._nearest_edges(X, Y)
+
+    def _nearest_edges(self, X: np.ndarray, Y: np.ndarray) -> np.ndarray:
+        """Queries the edge index, without the memo."""
+        _, idx = self.edge_tree.query(np.column_stack([X, Y]), k=1)
+        return self._edge_points_idx[idx]
+
+    def project(
+        self,
+        point_idx: np.ndarray,
+        edge_idx: np.ndarray,
+        X: np.ndarray,
+        Y: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Projects points onto edges, for all (point, edge) pairs at once.
+
+        Distances are computed in meters with a local equirectangular
+        projection around each point.
+
+        Parameters
+        ----------
+        point_idx : array
+            The position of the point of each pair
+        edge_idx : array
+            The position in the graph of the edge of each pair
+        X : array
+            The longitudes of the points
+        Y : array
+            The latitudes of the points
+
+        Returns
+        -------
+        tuple
+            The distance in meters from each point to its edge, the offset in
+            meters of the projection from the start of the edge and the
+            longitude and latitude of the projection
+
+        """
+        vertices, ptr = self._edge_vertices()
+        X = np.asarray(X, dtype=np.float64)[point_idx]
+        Y = np.asarray(Y, dtype=np.float64)[point_idx]
+
+        counts = ptr[edge_idx + 1] - ptr[edge_idx] - 1
+        pair = np.repeat(np.arange(len(edge_idx)), counts)
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        seg = np.repeat(ptr[edge_idx], counts) + np.arange(counts.sum()) - starts
+
+        kx = METERS_PER_DEGREE * np.cos(np.radians(Y[pair]))
+        ax = (vertices[seg + 1, 0] - vertices[seg, 0]) * kx
+        ay = (vertices[seg + 1, 1] - vertices[seg, 1]) * METERS_PER_DEGREE
+        bx = (X[pair] - vertices[seg, 0]) * kx
+        by = (Y[pair] - vertices[seg, 1]) * METERS_PER_DEGREE
+        sq_len = ax * ax + ay * ay
+        t = np.clip((ax * bx + ay * by) / np.where(sq_len > 0, sq_len, 1), 0, 1)
+        dist = np.hypot(bx - t * ax, by - t * ay)
+
+        order = np.lexsort((dist, pair))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = pair[order][1:] != pair[order][:-1]
+        best = order[first]
+        seg, t = seg[best], t[best]
+
+        offset = self.vertex_offset[seg] + t * (
+            self.vertex_offset[seg + 1] - self.vertex_offset[seg]
+        )
+        snapped = vertices[seg] + t[:, None] * (vertices[seg + 1] - vertices[seg])
+        return dist[best], offset, snapped[:, 0], snapped[:, 1]
+
+    def _projection(self, idx: np.ndarray, X: np.ndarray, Y: np.ndarray) -> np.ndarray:
+        """
+        Returns the snapped latitude and longitude, the distance in meters
+        and the fraction of the edge at the projection of each point onto
+        its matched edge, NaN where the point is unmatched.
+        """
+        points = np.nonzero(idx >= 0)[0]
+        dist, offset, snapped_x, snapped_y = self.project(points, idx[points], X, Y)
+        projection = np.full((4, len(idx)), np.nan)
+        projection[0, points] = snapped_y
+        projection[1, points] = snapped_x
+        projection[2, points] = dist
+        length = self.edge_length[idx[points]]
+        projection[3, points] = np.divide(
+            offset, length, out=np.zeros_like(offset), where=length > 0
+        )
+        return projection
+
+    def candidates(
+        self,
+        X: np.ndarray,
+        Y: np.ndarray,
+        k: Optional[int] = 8,
+        radius: Optional[float] = 50,
+        batch_size: Optional[int] = 10000
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Finds up to k candidate edges within radius of each point.
+
+        The points are processed in batches, with one KD-tree query per batch,
+        to bound the memory used by the neighbours of the points.
+
+        Parameters
+        ----------
+        X : array
+            The longitudes of the points
+        Y : array
+            The latitudes of the points
+        k : int, optional
+            Maximum number of candidates per point, by default 8
+        radius : float, optional
+            Maximum distance in meters between a point and its candidates,
+            by default 50
+        batch_size : int, optional
+            Number of points queried at a time, by default 10000
+
+        Returns
+        -------
+        tuple
+            Flat arrays with the position of the point, the position in
+            the graph of the edge, the distance in meters and the offset in
+            meters along the edge of each candidate, sorted by point and
+            distance
+
+        """
+        X = np.asarray(X, dtype=np.float64)
+        Y = np.asarray(Y, dtype=np.float64)
+        batches = [
+            self._candidates(X[i:i + batch_size], Y[i:i + batch_size], k, radius)
+            for i in range(0, max(len(X), 1), batch_size)
+        ]
+        for i, batch in enumerate(batches):
+            batch[0] += i * batch_size
+        return tuple(np.concatenate(arrays) for arrays in zip(*batches))
+
+    def _candidates(
+        self,
+        X: np.ndarray,
+        Y: np.ndarray,
+        k: int,
+        radius: float
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Finds the candidates of a batch of points."""
+        n_edges = self.graph.n_edges
+        tree = self.edge_tree
+
+        max_lat = np.radians(np.abs(Y).max()) if len(Y) else 0
+        radius_deg = radius / (METERS_PER_DEGREE * np.cos(max_lat)) + self.dist
+        # an edge has up to this many sample points within the radius
+        per_edge = int(np.ceil(2 * radius_deg / self.dist)) + 1
+        n_neighbours = max(min(k * per_edge, tree.n), 1)
+        _, idx = tree.query(
+            np.column_stack([X, Y]),
+            k=n_neighbours,
+            distance_upper_bound=radius_deg
+        )
+        idx = idx.reshape(len(X), n_neighbours)
+        valid = idx < tree.n
+
+        pairs = np.unique(
+            np.nonzero(valid)[0] * n_edges + self._edge_points_idx[idx[valid]]
+        )
+        point_idx, edge_idx = pairs // n_edges, pairs % n_edges
+        dist, offset, _, _ = self.project(point_idx, edge_idx, X, Y)
+
+        order = np.lexsort((dist, point_idx))
+        order = order[dist[order] <= radius]
+        point_idx = point_idx[order]
+        rank = np.arange(len(point_idx)) - np.searchsorted(point_idx, point_idx)
+        order = order[rank < k]
+        return [point_idx[rank < k], edge_idx[order], dist[order], offset[order]]
+
+    def _match_positions(self, *args, **kwargs) -> np.ndarray:
+        """Calls match_positions through the results cache, when there is one."""
+        if self.results is None:
+            return match_positions(self, *args, **kwargs)
+        return self.results.match(self, *args, **kwargs)
+
+    @instrument()
+    def match_nodes(
+        self,
+        move_data: Union[
+            PandasMoveDataFrame, DaskMoveDataFrame, PandasDiscreteMoveDataFrame
+        ],
+        inplace: Optional[bool] = True,
+        n_jobs: Optional[int] = 1,
+        compact: Optional[bool] = False,
+        traj_column: Optional[Text] = None
+    ) -> Optional[DataFrame]:
+        """
+        Generate Map matching using the graph nodes
+
+        Parameters
+        ----------
+        move_data : MoveDataFrame
+           The input trajectories data
+        inplace: bool, optional
+            if set to true the original dataframe will be altered,
+            otherwise the alteration will be made in a copy, that will be returned,
+            by default True
+        n_jobs : int, optional
+            Number of processes matching the trajectories, -1 uses all cpus,
+            ignored for dask data, which is matched lazily partition by
+            partition, by default 1
+        compact : bool, optional
+            if set to true the points get the integer node column instead of
+            the geometry column, see MapMatcher.geometries, by default False
+        traj_column : str, optional
+            The column identifying the trajectories, by default None, the
+            tid column or else the id column
+
+        Returns
+        -------
+        move_data : MoveDataFrame
+            A copy of the original dataframe or None
+
+        """
+        if is_dask(move_data):
+            return match_dask(
+                self, move_data, 'node', inplace=inplace,
+                kwargs=dict(compact=compact, traj_column=traj_column)
+            )
+
+        if not inplace:
+            move_data = move_data.copy()
+
+        with stage('query', len(move_data)):
+            idx = self._match_positions(
+                'node', move_data['lon'], move_data['lat'],
+                traj=_trajectories(move_data, traj_column), n_jobs=n_jobs
+            )
+        with stage('assign', len(move_data)):
+            move_data['lat'] = self.graph.node_y[idx]
+            move_data['lon'] = self.graph.node_x[idx]
+            if compact:
+                move_data['node'] = self.node_ids[idx]
+            else:
+                move_data['geometry'] = self.graph.node_geometries(idx)
+
+        if not inplace:
+            return move_data
+
+    @instrument()
+    def match_edges(
+        self,
+        move_data: Union[
+            PandasMoveDataFrame, DaskMoveDataFrame, PandasDiscreteMoveDataFrame
+        ],
+        inplace: Optional[bool] = True,
+        method: Optional[Text] = 'nearest',
+        k: Optional[int] = 8,
+        radius: Optional[float] = 50,
+        sigma: Optional[float] = 4.07,
+        beta: Optional[float] = 3.0,
+        max_speed: Optional[float] = 30,
+        n_jobs: Optional[int] = 1,
+        compact: Optional[bool] = False,
+        traj_column: Optional[Text] = None
+    ) -> Optional[DataFrame]:
+        """
+        Generate Map matching using the graph edges
+
+        Parameters
+        ----------
+        move_data : MoveDataFrame
+           The input trajectories data
+        inplace: bool, optional
+            if set to true the original dataframe will be altered,
+            otherwise the alteration will be made in a copy, that will be returned,
+            by default True
+        method : str, optional
+            'nearest' matches each point to its nearest edge, 'hmm' matches the
+            points of each trajectory to the most likely sequence of edges with
+            a hidden markov model, by default 'nearest'
+        k : int, optional
+            Maximum number of candidate edges per point with method 'hmm',
+            by default 8
+        radius : float, optional
+            Maximum distance in meters between a point and its candidate
+            edges with method 'hmm', by default 50
+        sigma : float, optional
+            The standard deviation of the GPS noise in meters with method 'hmm',
+            by default 4.07
+        beta : float, optional
+            The scale of the transition distribution in meters with method
+            'hmm', by default 3.0
+        max_speed : float, optional
+            The maximum speed in meters per second, bounds the route between
+            consecutive points with method 'hmm', by default 30
+        n_jobs : int, optional
+            Number of processes matching the trajectories, -1 uses all cpus,
+            ignored for dask data, which is matched lazily partition by
+            partition, by default 1
+        compact : bool, optional
+            if set to true the points get the integer u, v and key columns of
+            the edge, -1 when unmatched, instead of the edge and geometry
+            columns, see MapMatcher.geometries, by default False
+        traj_column : str, optional
+            The column identifying the trajectories, by default None, the
+            tid column or else the id column
+
+        Returns
+        -------
+        move_data : MoveDataFrame
+            A copy of the original dataframe or None
+
+        Raises
+        ------
+        ValueError
+            if the method is not valid
+
+        Notes
+        -----
+        Besides the edge and its geometry, each matched point gets the
+        snapped_lat and snapped_lon of its projection onto the edge, the
+        match_distance in meters between the point and the edge and the
+        edge_offset, the fraction of the edge from its start to the projection.
+        Unmatched points get NaN.
+
+        """
+        if method not in ['nearest', 'hmm']:
+            raise ValueError('method must be one of nearest, hmm')
+
+        if is_dask(move_data):
+            return match_dask(
+                self, move_data, method, inplace=inplace,
+                kwargs=dict(k=k, radius=radius, sigma=sigma, beta=beta,
+                            max_speed=max_speed, compact=compact,
+                            traj_column=traj_column)
+            )
+
+        if not inplace:
+            move_data = move_data.copy()
+
+        times = None
+        if method == 'hmm' and DATETIME in move_data:
+            times = move_data[DATETIME].values.astype('datetime64[ns]')
+            times = times.astype(np.int64) / 1e9
+        with stage('query', len(move_data)):
+            idx = self._match_positions(
+                method, move_data['lon'], move_data['lat'],
+                traj=_trajectories(move_data, traj_column), times=times,
+                n_jobs=n_jobs,
+                kwargs=dict(k=k, radius=radius, sigma=sigma, beta=beta,
+                            max_speed=max_speed)
+            )
+        with stage('project', len(move_data)):
+            projection = self._projection(idx, move_data['lon'], move_data['lat'])
+
+        with stage('assign', len(move_data)):
+            matched = idx >= 0
+            if compact:
+                move_data['u'] = np.where(matched, self.edge_u[idx], -1)
+                move_data['v'] = np.where(matched, self.edge_v[idx], -1)
+                move_data['key'] = np.where(matched, self.graph.edge_key[idx], -1)
+            else:
+                geometries = np.full(len(idx), None, dtype=object)
+                geometries[matched] = self.graph.edge_geometries(idx[matched])
+                move_data['edge'] = [
+                    (u, v) if m else None
+                    for u, v, m in zip(self.edge_u[idx], self.edge_v[idx], matched)
+                ]
+                move_data['geometry'] = geometries
+            move_data['snapped_lat'] = projection[0]
+            move_data['snapped_lon'] = projection[1]
+            move_data['match_distance'] = projection[2]
+            move_data['edge_offset'] = projection[3]
+
+        if not inplace:
+            return move_data
+
+    def geometries(
+        self,
+        move_data: Union[
+            PandasMoveDataFrame, PandasDiscreteMoveDataFrame, DataFrame
+        ]
+    ) -> np.ndarray:
+        """
+        Creates the geometries of the results of a compact matching.
+
+        The compact results only hold the integer identifiers of the nodes or
+        edges, the coordinates of their geometries being kept once in the
+        arrays of the graph. The geometries are created on request, once per
+        distinct node or edge.
+
+        Parameters
+        ----------
+        move_data : MoveDataFrame or DataFrame
+            Data matched with compact set to true
+
+        Returns
+        -------
+        array
+            The object array of the points of the nodes, or of the line
+            strings of the edges, None where the point is unmatched
+
+        Raises
+        ------
+        ValueError
+            if the data has neither the node column nor the u, v and key
+            columns
+
+        """
+        if 'node' in move_data:
+            idx = self.graph.node_positions(move_data['node'].values)
+            build = self.graph.node_geometries
+        elif all(c in move_data for c in ['u', 'v', 'key']):
+            idx = self.graph.edge_positions(
+                move_data['u'].values, move_data['v'].values, move_data['key'].values
+            )
+            build = self.graph.edge_geometries
+        else:
+            raise ValueError('move_data must have the node or the u, v, key columns')
+
+        matched = idx >= 0
+        geometries = np.full(len(idx), None, dtype=object)
+        geometries[matched] = build(idx[matched])
+        return geometries
@@ -1,5 +1,6 @@
 from typing import Optional, Text, Tuple, Union
 
+import numpy as np
 import osmnx as ox
 from networkx import MultiDiGraph
 from pandas.core.frame import DataFrame
@@ -7,13 +8,83 @@ from pymove import PandasMoveDataFrame
 from pymove.core.dask import DaskMoveDataFrame
 from pymove.core.pandas_discrete import PandasDiscreteMoveDataFrame
 
+from pymove_osmnx.core.compact_graph import CompactGraph
+from pymove_osmnx.core.dask_matching import get_bbox, get_tiles, is_dask
+from pymove_osmnx.core.graph_cache import GraphCache
+from pymove_osmnx.core.map_matcher import MapMatcher
+from pymove_osmnx.core.tile_store import TileStore
+from pymove_osmnx.utils.instrumentation import instrument
 
+
+@instrument('graph')
+def _get_graph(
+    move_data: Union[PandasMoveDataFrame, DaskMoveDataFrame, PandasDiscreteMoveDataFrame],
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    place: Optional[Text] = None,
+    G: Optional[Union[MultiDiGraph, CompactGraph]] = None,
+    cache: Optional[GraphCache] = None,
+    tiles: Optional[TileStore] = None
+) -> Union[MultiDiGraph, CompactGraph]:
+    """
+    Returns the graph used in map matching
+
+    Parameters
+    ----------
+    move_data : MoveDataFrame
+       The input trajectories data
+    bbox : tuple, optional
+        The bounding box as (north, east, south, west), by default None
+    place : string, optional
+        The query to geocode to get place boundary polygon, by default None
+    G : MultiDiGraph or CompactGraph, optional
+        The input graph, by default None
+    cache : GraphCache, optional
+        The cache used to store and load the graph when G is None,
+        by default None
+    tiles : TileStore, optional
+        The store whose tiles near the points are stitched when G is None,
+        by default None
+
+    Returns
+    -------
+    MultiDiGraph or CompactGraph
+        The road graph
+
+    """
+    if(G is None and tiles is not None):
+        if(is_dask(move_data)):
+            G = tiles.stitch(get_tiles(move_data, tiles))
+        else:
+            G = tiles.graph(move_data['lon'], move_data['lat'])
+    elif(G is None):
+        if(bbox is None and is_dask(move_data)):
+            bbox = get_bbox(move_data)
+        elif(bbox is None):
+            bbox = move_data.get_bbox()
+        if(cache is not None):
+            G = cache.get(bbox, network_type='all_private')
+        else:
+            G = ox.graph_from_bbox(
+                bbox[0], bbox[2], bbox[1], bbox[3], network_type='all_private'
+            )
+    elif(place is not None):
+        G = ox.footprints_from_place(query=place, tags={'network_type': 'all_private'})
+    return G
+
+
+@instrument()
 def map_matching_node(
     move_data: Union[PandasMoveDataFrame, DaskMoveDataFrame, PandasDiscreteMoveDataFrame],
     inplace: Optional[bool] = True,
     bbox: Optional[Tuple[float, float, float, float]] = None,
     place: Optional[Text] = None,
-    G: Optional[MultiDiGraph] = None
+    G: Optional[Union[MultiDiGraph, CompactGraph]] = None,
+    cache: Optional[GraphCache] = None,
+    matcher: Optional[MapMatcher] = None,
+    n_jobs: Optional[int] = 1,
+    graph_path: Optional[Text] = None,
+    compact: Optional[bool] = False,
+    tiles: Optional[TileStore] = None
 ) -> Optional[DataFrame]:
     """
     Generate Map matching using the graph nodes
@@ -30,8 +101,27 @@ def map_matching_node(
         The bounding box as (north, east, south, west), by default None
     place : string, optional
         The query to geocode to get place boundary polygon, by default None
-    G : MultiDiGraph, optional
+    G : MultiDiGraph or CompactGraph, optional
         The input graph, by default None
+    cache : GraphCache, optional
+        The cache used to store and load the graph when G is None,
+        by default None
+    matcher : MapMatcher, optional
+        A matcher built beforehand, reused instead of building the graph
+        indexes, by default None
+    n_jobs : int, optional
+        Number of processes matching the trajectories, -1 uses all cpus,
+        by default 1
+    graph_path : str, optional
+        Folder of a matcher saved with MapMatcher.save, memory mapped
+        instead of building the graph and its indexes, by default None
+    compact : bool, optional
+        if set to true the points get the integer node column instead of the
+        geometry column, see MapMatcher.geometries, by default False
+    tiles : TileStore, optional
+        The store whose tiles near the points are stitched when G is None,
+        loading only the part of a large graph the points need,
+        by default None
 
     Returns
     -------
@@ -39,39 +129,30 @@ def map_matching_node(
         A copy of the original dataframe or None
 
     """
-    if(G is None):
-        if(bbox is None):
-            bbox = move_data.get_bbox()
-        G = ox.graph_from_bbox(
-            bbox[0], bbox[2], bbox[1], bbox[3], network_type='all_private'
-        )
-    elif(place is not None):
-        G = ox.footprints_from_place(query=place, tags={'network_type': 'all_private'})
-
-    if not inplace:
-        move_data = move_data[:]
+    if matcher is None and graph_path is not None:
+        matcher = MapMatcher.load(graph_path)
+    elif matcher is None:
+        matcher = MapMatcher(_get_graph(move_data, bbox, place, G, cache, tiles))
 
-    nodes = ox.get_nearest_nodes(
-        G, X=move_data['lon'], Y=move_data['lat'], method='kdtree'
+    return matcher.match_nodes(
+        move_data, inplace=inplace, n_jobs=n_jobs, compact=compact
     )
 
-    gdf_nodes = ox.graph_to_gdfs(G, edges=False)
-    df_nodes = gdf_nodes.loc[nodes]
-
-    move_data['lat'] = list(df_nodes.y)
-    move_data['lon'] = list(df_nodes.x)
-    move_data['geometry'] = list(df_nodes.geometry)
-
-    if not inplace:
-        return move_data
-
 
+@instrument()
 def map_matching_edge(
     move_data: Union[PandasMoveDataFrame, DaskMoveDataFrame, PandasDiscreteMoveDataFrame],
     inplace: Optional[bool] = True,
     bbox: Optional[Tuple[float, float, float, float]] = None,
     place: Optional[Text] = None,
-    G: Optional[MultiDiGraph] = None
+    G: Optional[Union[MultiDiGraph, CompactGraph]] = None,
+    cache: Optional[GraphCache] = None,
+    matcher: Optional[MapMatcher] = None,
+    method: Optional[Text] = 'nearest',
+    n_jobs: Optional[int] = 1,
+    graph_path: Optional[Text] = None,
+    compact: Optional[bool] = False,
+    tiles: Optional[TileStore] = None
 ) -> Optional[DataFrame]:
     """
     Generate Map matching using the graph edges
@@ -88,8 +169,32 @@ def map_matching_edge(
         The bounding box as (north, east, south, west), by default None
     place : string, optional
         The query to geocode to get place boundary polygon, by default None
-    G : MultiDiGraph, optional
+    G : MultiDiGraph or CompactGraph, optional
         The input graph, by default None
+    cache : GraphCache, optional
+        The cache used to store and load the graph when G is None,
+        by default None
+    matcher : MapMatcher, optional
+        A matcher built beforehand, reused instead of building the graph
+        indexes, by default None
+    method : str, optional
+        'nearest' matches each point to its nearest edge, 'hmm' matches the
+        points of each trajectory to the most likely sequence of edges with
+        a hidden markov model, by default 'nearest'
+    n_jobs : int, optional
+        Number of processes matching the trajectories, -1 uses all cpus,
+        by default 1
+    graph_path : str, optional
+        Folder of a matcher saved with MapMatcher.save, memory mapped
+        instead of building the graph and its indexes, by default None
+    compact : bool, optional
+        if set to true the points get the integer u, v and key columns of the
+        edge instead of the edge and geometry columns, see
+        MapMatcher.geometries, by default False
+    tiles : TileStore, optional
+        The store whose tiles near the points are stitched when G is None,
+        loading only the part of a large graph the points need,
+        by default None
 
     Returns
     -------
@@ -97,33 +202,81 @@ def map_matching_edge(
         A copy of the original dataframe or None
 
     """
-    if(G is None):
-        if(bbox is None):
-            bbox = move_data.get_bbox()
-        G = ox.graph_from_bbox(
-            bbox[0], bbox[2], bbox[1], bbox[3], network_type='all_private'
-        )
-    elif(place is not None):
-        G = ox.footprints_from_place(query=place, tags={'network_type': 'all_private'})
-
-    if not inplace:
-        move_data = move_data[:]
+    if matcher is None and graph_path is not None:
+        matcher = MapMatcher.load(graph_path)
+    elif matcher is None:
+        matcher = MapMatcher(_get_graph(move_data, bbox, place, G, cache, tiles))
 
-    edges = ox.get_nearest_edges(
-        G, X=move_data['lon'], Y=move_data['lat'], method='kdtree'
+    return matcher.match_edges(
+        move_data, inplace=inplace, method=method, n_jobs=n_jobs, compact=compact
     )
-    gdf_edges = ox.graph_to_gdfs(G, nodes=False)
 
-    geometries = []
-    for e in edges:
-        df_edges = gdf_edges[
-            (gdf_edges.index.get_level_values('u') == e[0])
-            & (gdf_edges.index.get_level_values('v') == e[1])
-        ]
-        geometries.append(df_edges['geometry'])
 
-    move_data['edge'] = [*map(lambda x: tuple([x[0], x[1]]), edges)]
-    move_data['geometry'] = geometries
+@instrument()
+def candidate_edges(
+    move_data: Union[PandasMoveDataFrame, DaskMoveDataFrame, PandasDiscreteMoveDataFrame],
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    place: Optional[Text] = None,
+    G: Optional[Union[MultiDiGraph, CompactGraph]] = None,
+    cache: Optional[GraphCache] = None,
+    matcher: Optional[MapMatcher] = None,
+    k: Optional[int] = 8,
+    radius: Optional[float] = 50,
+    graph_path: Optional[Text] = None,
+    tiles: Optional[TileStore] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds up to k candidate edges within a radius of each point
+
+    Parameters
+    ----------
+    move_data : MoveDataFrame
+       The input trajectories data
+    bbox : tuple, optional
+        The bounding box as (north, east, south, west), by default None
+    place : string, optional
+        The query to geocode to get place boundary polygon, by default None
+    G : MultiDiGraph or CompactGraph, optional
+        The input graph, by default None
+    cache : GraphCache, optional
+        The cache used to store and load the graph when G is None,
+        by default None
+    matcher : MapMatcher, optional
+        A matcher built beforehand, reused instead of building the graph
+        indexes, by default None
+    k : int, optional
+        Maximum number of candidates per point, by default 8
+    radius : float, optional
+        Maximum distance in meters between a point and its candidates,
+        by default 50
+    graph_path : str, optional
+        Folder of a matcher saved with MapMatcher.save, memory mapped
+        instead of building the graph and its indexes, by default None
+    tiles : TileStore, optional
+        The store whose tiles near the points are stitched when G is None,
+        loading only the part of a large graph the points need,
+        by default None
+
+    Returns
+    -------
+    tuple
+        Flat arrays with, for each candidate, the position of its point in
+        move_data, the u, v and key of its edge and its distance in meters
+        to the point, sorted by point and distance
+
+    """
+    if matcher is None and graph_path is not None:
+        matcher = MapMatcher.load(graph_path)
+    elif matcher is None:
+        matcher = MapMatcher(_get_graph(move_data, bbox, place, G, cache, tiles))
 
-    if not inplace:
-        return move_data
+    point_idx, edge_idx, dist, _ = matcher.candidates(
+        move_data['lon'], move_data['lat'], k=k, radius=radius
+    )
+    return (
+        point_idx,
+        matcher.edge_u[edge_idx],
+        matcher.edge_v[edge_idx],
+        matcher.graph.edge_key[edge_idx],
+        dist
+    )
@@ -0,0 +1,298 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Text
+
+import numpy as np
+import pandas as pd
+
+from pymove_osmnx.core.parallel import match_positions
+from pymove_osmnx.utils.instrumentation import stage
+
+
+class MatchCache:
+    """
+    LRU cache of the map matching results of trajectories.
+
+    Each entry holds the matched positions of the points of one trajectory,
+    keyed by a hash of its coordinates, its times when the method uses them,
+    the contents of the graph, the parameters of the matcher and the method
+    with its parameters. Unchanged trajectories matched again against the
+    same graph, even by another matcher or another process, get the stored
+    positions instead of being matched. The entries are kept in memory and,
+    with a cache folder, also saved as .npy files, so later runs reuse them.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        Maximum number of trajectories kept in memory, by default 100000
+    max_bytes : int, optional
+        Maximum approximate memory used by the entries, by default None
+    cache_folder : str, optional
+        Folder of the on-disk entries, created if it does not exist,
+        by default None, entries are only kept in memory
+    max_size : int, optional
+        Maximum size in bytes of the on-disk entries, the least recently
+        used are removed after each call to match, by default None
+
+    Examples
+    --------
+    >>> matcher = MapMatcher(G, results=MatchCache(cache_folder='matches'))
+    >>> map_matching_edge(move_df, matcher=matcher)
+
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = 100000,
+        max_bytes: Optional[int] = None,
+        cache_folder: Optional[Text] = None,
+        max_size: Optional[int] = None
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_folder = cache_folder
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        if cache_folder is not None:
+            os.makedirs(cache_folder, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _prefix(matcher, method: Text, kwargs: Optional[Dict] = None):
+        """Hashes the graph, the matcher and the method, the start of every key."""
+        precision = None
+        if matcher.edge_memo is not None:
+            precision = matcher.edge_memo.precision
+        raw = repr((
+            matcher.graph.digest,
+            matcher.dist,
+            precision,
+            method,
+            sorted((kwargs or {}).items()) if method == 'hmm' else None
+        ))
+        return hashlib.sha1(raw.encode('utf-8'))
+
+    def _path(self, key: Text) -> Text:
+        return os.path.join(self.cache_folder, '%s.npy' % key)
+
+    def get(self, key: Text) -> Optional[np.ndarray]:
+        """
+        Returns the positions of an entry, looking up the disk after memory.
+
+        Parameters
+        ----------
+        key : str
+            The hexadecimal digest identifying the entry
+
+        Returns
+        -------
+        array
+            The positions, or None when not cached
+
+        """
+        idx = self._entries.get(key)
+        if idx is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return idx
+        if self.cache_folder is not None:
+            path = self._path(key)
+            if os.path.exists(path):
+                os.utime(path)
+                idx = np.load(path)
+                self.hits += 1
+                self._store(key, idx)
+                return idx
+        self.misses += 1
+        return None
+
+    def put(self, key: Text, idx: np.ndarray):
+        """
+        Stores the positions of a trajectory.
+
+        Parameters
+        ----------
+        key : str
+            The hexadecimal digest identifying the entry
+        idx : array
+            The positions of the points
+
+        """
+        self._store(key, idx)
+        if self.cache_folder is not None:
+            np.save(self._path(key), idx)
+
+    def _store(self, key: Text, idx: np.ndarray):
+        """Keeps an entry in memory, evicting the least recently used."""
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.nbytes -= previous.nbytes
+        self._entries[key] = idx
+        self.nbytes += idx.nbytes
+        while len(self._entries) > 1 and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries)
+            or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def match(
+        self,
+        matcher,
+        method: Text,
+        X: np.ndarray,
+        Y: np.ndarray,
+        traj: Optional[np.ndarray] = None,
+        times: Optional[np.ndarray] = None,
+        n_jobs: Optional[int] = 1,
+        kwargs: Optional[Dict] = None
+    ) -> np.ndarray:
+        """
+        Matches the points, reusing the cached results of their trajectories.
+
+        Only the trajectories without an entry are matched, with
+        match_positions, in a single call.
+
+        Parameters
+        ----------
+        matcher : MapMatcher
+            The matcher holding the graph and its indexes
+        method : str
+            'node' for the nearest nodes, 'nearest' for the nearest edges or
+            'hmm' for the hidden markov model
+        X : array
+            The longitudes of the points
+        Y : array
+            The latitudes of the points
+        traj : array, optional
+            The trajectory identifier of each point, by default None,
+            all points are a single entry
+        times : array, optional
+            The time of each point in seconds, used by 'hmm', by default None
+        n_jobs : int, optional
+            Number of processes matching the missing trajectories, -1 uses
+            all cpus, by default 1
+        kwargs : dict, optional
+            Parameters of the 'hmm' method, by default None
+
+        Returns
+        -------
+        array
+            The positions in the graph of the matched node or edge of
+            each point, -1 for unmatched points
+
+        """
+        n = len(X)
+        if traj is None:
+            order = np.arange(n)
+            bounds = [0, n]
+        else:
+            traj = np.asarray(traj)
+            codes = pd.factorize(traj)[0]
+            # the points without a trajectory are matched together
+            codes[codes < 0] = codes.max() + 1
+            order = np.argsort(codes, kind='stable')
+            traj = traj[order]
+            bounds = np.searchsorted(codes[order], np.arange(codes.max() + 2)).tolist()
+        # the points of each trajectory are contiguous after sorting
+        X = np.asarray(X, dtype=np.float64)[order]
+        Y = np.asarray(Y, dtype=np.float64)[order]
+        if times is not None:
+            times = np.asarray(times, dtype=np.float64)[order]
+        result = np.full(n, -1, dtype=np.int64)
+        if n == 0:
+            return result
+
+        with stage('cache_lookup', n):
+            prefix = self._prefix(matcher, method, kwargs)
+            missing = OrderedDict()
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                h = prefix.copy()
+                h.update(X[start:end].data)
+                h.update(Y[start:end].data)
+                if times is not None:
+                    h.update(times[start:end].data)
+                key = h.hexdigest()
+                if key in missing:
+                    missing[key].append(start)
+                    continue
+                idx = self.get(key)
+                if idx is None:
+                    missing[key] = [start, end]
+                else:
+                    result[start:end] = idx
+
+        if missing:
+            rows = np.concatenate([
+                np.arange(span[0], span[1]) for span in missing.values()
+            ])
+            idx = match_positions(
+                matcher, method, X[rows], Y[rows],
+                traj=None if traj is None else traj[rows],
+                times=None if times is None else times[rows],
+                n_jobs=n_jobs, kwargs=kwargs
+            )
+            with stage('cache_store', len(rows)):
+                offset = 0
+                for key, (start, end, *same) in missing.items():
+                    matched = idx[offset:offset + end - start]
+                    self.put(key, matched.copy())
+                    for s in [start] + same:
+                        result[s:s + end - start] = matched
+                    offset += end - start
+                self.evict()
+
+        unsorted = np.empty_like(result)
+        unsorted[order] = result
+        return unsorted
+
+    def entries(self) -> List[Text]:
+        """
+        Lists the on-disk entry files, from least to most recently used.
+
+        Returns
+        -------
+        list
+            The paths of the entry files
+
+        """
+        if self.cache_folder is None:
+            return []
+        paths = [
+            os.path.join(self.cache_folder, f)
+            for f in os.listdir(self.cache_folder) if f.endswith('.npy')
+        ]
+        return sorted(paths, key=os.path.getmtime)
+
+    @property
+    def size(self) -> int:
+        """Total size of the on-disk entries in bytes."""
+        return sum(os.path.getsize(p) for p in self.entries())
+
+    def evict(self):
+        """Removes least recently used on-disk entries until they fit max_size."""
+        if self.max_size is None:
+            return
+        paths = self.entries()
+        size = sum(os.path.getsize(p) for p in paths)
+        # the most recent entry is always kept
+        for path in paths[:-1]:
+            if size <= self.max_size:
+                break
+            size -= os.path.getsize(path)
+            os.remove(path)
+
+    def clear(self):
+        """Removes all entries, in memory and on disk, and resets the counters."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        for path in self.entries():
+            os.remove(path)
@@ -0,0 +1,121 @@
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+OFFSET = 2 ** 31
+
+
+class QuantizedMemo:
+    """
+    Bounded memo of point query results by cell of a coordinate grid.
+
+    Points are snapped to the center of their cell of a regular grid in
+    degrees and the query runs once per distinct cell. A point counts as a
+    hit when it did not cause a query, and each queried cell as a miss. The
+    results are kept in sorted arrays, so lookups are vectorized, and the
+    least recently used cells are dropped when the memo grows beyond
+    max_size.
+
+    Parameters
+    ----------
+    precision : float, optional
+        The size of the cells in degrees, by default 1e-5
+    max_size : int, optional
+        Maximum number of cells kept, by default 1000000
+
+    """
+
+    def __init__(
+        self,
+        precision: Optional[float] = 1e-5,
+        max_size: Optional[int] = 1000000
+    ):
+        self.precision = precision
+        self.max_size = max_size
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _cells(self, X: np.ndarray, Y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the grid coordinates of the cell of each point."""
+        qx = np.rint(np.asarray(X, dtype=np.float64) / self.precision).astype(np.int64)
+        qy = np.rint(np.asarray(Y, dtype=np.float64) / self.precision).astype(np.int64)
+        return qx, qy
+
+    def get(
+        self,
+        X: np.ndarray,
+        Y: np.ndarray,
+        query: Callable[[np.ndarray, np.ndarray], np.ndarray]
+    ) -> np.ndarray:
+        """
+        Returns the result of the query for each point.
+
+        Parameters
+        ----------
+        X : array
+            The longitudes of the points
+        Y : array
+            The latitudes of the points
+        query : callable
+            Receives the longitudes and latitudes of the centers of the cells
+            not in the memo and returns an integer per cell
+
+        Returns
+        -------
+        array
+            The result of the query on the cell of each point
+
+        """
+        qx, qy = self._cells(X, Y)
+        keys = ((qx + OFFSET) << 32) | (qy + OFFSET)
+        unique, first, inverse = np.unique(
+            keys, return_index=True, return_inverse=True
+        )
+
+        self._clock += 1
+        pos = np.searchsorted(self._keys, unique)
+        found = np.zeros(len(unique), dtype=bool)
+        if len(self._keys):
+            pos = np.minimum(pos, len(self._keys) - 1)
+            found = self._keys[pos] == unique
+        values = np.empty(len(unique), dtype=np.int64)
+        values[found] = self._values[pos[found]]
+        self._stamps[pos[found]] = self._clock
+
+        missing = ~found
+        if missing.any():
+            cells = first[missing]
+            values[missing] = query(
+                qx[cells] * self.precision, qy[cells] * self.precision
+            )
+            self._insert(unique[missing], values[missing])
+
+        self.misses += int(missing.sum())
+        self.hits += len(keys) - int(missing.sum())
+        return values[inverse]
+
+    def _insert(self, keys: np.ndarray, values: np.ndarray):
+        """Adds new cells and drops the least recently used beyond max_size."""
+        all_keys = np.concatenate([self._keys, keys])
+        all_values = np.concatenate([self._values, values])
+        stamps = np.concatenate(
+            [self._stamps, np.full(len(keys), self._clock, dtype=np.int64)]
+        )
+        if self.max_size is not None and len(all_keys) > self.max_size:
+            keep = np.argpartition(-stamps, self.max_size - 1)[:self.max_size]
+            all_keys, all_values, stamps = all_keys[keep], all_values[keep], stamps[keep]
+        order = np.argsort(all_keys, kind='stable')
+        self._keys = all_keys[order]
+        self._values = all_values[order]
+        self._stamps = stamps[order]
+
+    def clear(self):
+        """Removes all cells and resets the counters."""
+        self.hits = 0
+        self.misses = 0
+        self._keys = np.empty(0, dtype=np.int64)
+        self._values = np.empty(0, dtype=np.int64)
+        self._stamps = np.empty(0, dtype=np.int64)
+        self._clock = 0
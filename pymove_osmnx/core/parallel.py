@@ -0,0 +1,159 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Text
+
+import numpy as np
+import pandas as pd
+
+from pymove_osmnx.core.hmm import viterbi
+
+_matcher = None
+
+
+def _init_worker(matcher):
+    """Stores the matcher received once by each worker process, with its indexes."""
+    global _matcher
+    matcher.build_indexes()
+    _matcher = matcher
+
+
+def _positions(
+    matcher,
+    method: Text,
+    X: np.ndarray,
+    Y: np.ndarray,
+    traj: Optional[np.ndarray] = None,
+    times: Optional[np.ndarray] = None,
+    kwargs: Optional[Dict] = None
+) -> np.ndarray:
+    """
+    Matches the points with the given method.
+
+    Parameters
+    ----------
+    matcher : MapMatcher
+        The matcher holding the graph and its indexes
+    method : str
+        'node' for the nearest nodes, 'nearest' for the nearest edges or
+        'hmm' for the hidden markov model
+    X : array
+        The longitudes of the points
+    Y : array
+        The latitudes of the points
+    traj : array, optional
+        The trajectory identifier of each point, required by 'hmm',
+        by default None
+    times : array, optional
+        The time of each point in seconds, used by 'hmm', by default None
+    kwargs : dict, optional
+        Parameters of the 'hmm' method, by default None
+
+    Returns
+    -------
+    array
+        The positions in the graph of the matched node or edge of
+        each point, -1 for unmatched points
+
+    """
+    if method == 'node':
+        return matcher.nearest_nodes(X, Y)
+    if method == 'nearest':
+        return matcher.nearest_edges(X, Y)
+    idx, _ = viterbi(matcher, X, Y, traj, times=times, **(kwargs or {}))
+    return idx
+
+
+def _match_partition(args) -> np.ndarray:
+    """Matches one partition in a worker process."""
+    return _positions(_matcher, *args)
+
+
+def match_positions(
+    matcher,
+    method: Text,
+    X: np.ndarray,
+    Y: np.ndarray,
+    traj: Optional[np.ndarray] = None,
+    times: Optional[np.ndarray] = None,
+    n_jobs: Optional[int] = 1,
+    kwargs: Optional[Dict] = None
+) -> np.ndarray:
+    """
+    Matches the points, splitting the trajectories across processes.
+
+    The points are partitioned by trajectory, so no trajectory is split
+    between workers. The matcher is sent to each worker once, when its process
+    starts, and the partitions only carry the coordinates. The results are
+    returned in the original order of the points.
+
+    Parameters
+    ----------
+    matcher : MapMatcher
+        The matcher holding the graph and its indexes
+    method : str
+        'node' for the nearest nodes, 'nearest' for the nearest edges or
+        'hmm' for the hidden markov model
+    X : array
+        The longitudes of the points
+    Y : array
+        The latitudes of the points
+    traj : array, optional
+        The trajectory identifier of each point, by default None,
+        every point is its own partition unit, or with 'hmm' all points
+        are one trajectory matched in this process
+    times : array, optional
+        The time of each point in seconds, used by 'hmm', by default None
+    n_jobs : int, optional
+        Number of processes, -1 uses all cpus, by default 1
+    kwargs : dict, optional
+        Parameters of the 'hmm' method, by default None
+
+    Returns
+    -------
+    array
+        The positions in the graph of the matched node or edge of
+        each point, -1 for unmatched points
+
+    """
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    if traj is not None:
+        traj = np.asarray(traj)
+    if n_jobs is not None and n_jobs < 0:
+        n_jobs = os.cpu_count()
+    # without trajectories, 'hmm' decodes all points as a single one
+    serial = traj is None and method == 'hmm'
+    if n_jobs is None or n_jobs <= 1 or len(X) == 0 or serial:
+        return _positions(matcher, method, X, Y, traj, times, kwargs)
+
+    matcher.build_indexes()
+
+    if traj is None:
+        codes = np.arange(len(X))
+    else:
+        codes = pd.factorize(traj)[0]
+        # points without a trajectory identifier get their own code
+        codes[codes < 0] = codes.max() + 1
+    n_partitions = min(4 * n_jobs, codes.max() + 1)
+    partition = codes % n_partitions
+    rows = [np.nonzero(partition == p)[0] for p in range(n_partitions)]
+
+    tasks = [
+        (
+            method,
+            X[r],
+            Y[r],
+            None if traj is None else traj[r],
+            None if times is None else times[r],
+            kwargs
+        )
+        for r in rows
+    ]
+
+    result = np.full(len(X), -1, dtype=np.int64)
+    with ProcessPoolExecutor(
+        max_workers=n_jobs, initializer=_init_worker, initargs=(matcher,)
+    ) as executor:
+        for r, idx in zip(rows, executor.map(_match_partition, tasks)):
+            result[r] = idx
+    return result
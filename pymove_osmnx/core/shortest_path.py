@@ -0,0 +1,227 @@
+import sys
+from collections import OrderedDict
+from typing import Dict, Optional, Text, Union
+
+import numpy as np
+from networkx import MultiDiGraph, single_source_dijkstra_path_length
+
+from pymove_osmnx.core.compact_graph import CompactGraph
+
+
+class ShortestPathCache:
+    """
+    LRU cache of bounded shortest path lengths on a road graph.
+
+    Each entry holds the lengths of the shortest paths from a source node to
+    every node reached by a Dijkstra search that stops expanding beyond a
+    cutoff distance. An entry answers any later query from the same source
+    with a cutoff up to the one it was computed with.
+
+    Parameters
+    ----------
+    G : MultiDiGraph or CompactGraph
+        The road graph
+    max_entries : int, optional
+        Maximum number of sources kept, by default 10000
+    max_bytes : int, optional
+        Maximum approximate memory used by the entries, by default None
+    weight : str, optional
+        The edge attribute minimized by the paths, by default 'length',
+        a CompactGraph only has the length
+
+    """
+
+    def __init__(
+        self,
+        G: Union[MultiDiGraph, CompactGraph],
+        max_entries: Optional[int] = 10000,
+        max_bytes: Optional[int] = None,
+        weight: Optional[Text] = 'length'
+    ):
+        self.G = G
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.weight = weight
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._arrays = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def max_distance(
+        delta_time: float,
+        max_speed: Optional[float] = 30
+    ) -> float:
+        """
+        Maximum distance that can be travelled in a time gap.
+
+        Parameters
+        ----------
+        delta_time : float
+            The time gap in seconds
+        max_speed : float, optional
+            The maximum speed in meters per second, by default 30
+
+        Returns
+        -------
+        float
+            The distance in meters
+
+        """
+        return delta_time * max_speed
+
+    def lengths(self, source: int, cutoff: float) -> Dict:
+        """
+        Lengths of the shortest paths from source up to cutoff.
+
+        Parameters
+        ----------
+        source : int
+            The source node
+        cutoff : float
+            The maximum length of the paths
+
+        Returns
+        -------
+        dict
+            The length of the shortest path to each reached node, may contain
+            nodes further than the cutoff
+
+        """
+        entry = self._entries.get(source)
+        if entry is not None and entry[0] >= cutoff:
+            self.hits += 1
+            self._entries.move_to_end(source)
+            return entry[1]
+
+        self.misses += 1
+        if isinstance(self.G, CompactGraph):
+            lengths = self.G.shortest_path_lengths(source, cutoff)
+        else:
+            lengths = single_source_dijkstra_path_length(
+                self.G, source, cutoff, weight=self.weight
+            )
+        if entry is not None:
+            self.nbytes -= entry[2]
+            self._drop_arrays(source)
+        size = sys.getsizeof(lengths) + 64 * len(lengths)
+        self._entries[source] = (cutoff, lengths, size)
+        self._entries.move_to_end(source)
+        self.nbytes += size
+        self._evict()
+        return lengths
+
+    def distance(self, source: int, target: int, cutoff: float) -> float:
+        """
+        Length of the shortest path between two nodes.
+
+        Parameters
+        ----------
+        source : int
+            The source node
+        target : int
+            The target node
+        cutoff : float
+            The maximum length of the path
+
+        Returns
+        -------
+        float
+            The length of the path, np.inf if longer than the cutoff
+
+        """
+        length = self.lengths(source, cutoff).get(target, np.inf)
+        return length if length <= cutoff else np.inf
+
+    def distances(
+        self,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        cutoff: Union[float, np.ndarray]
+    ) -> np.ndarray:
+        """
+        Lengths of the shortest paths between pairs of nodes.
+
+        Runs one search per distinct source, with the largest cutoff of its
+        pairs, and looks up the targets of each source in sorted arrays of
+        the reached nodes, kept along with the entry.
+
+        Parameters
+        ----------
+        sources : array
+            The source node of each pair
+        targets : array
+            The target node of each pair
+        cutoff : float or array
+            The maximum length of the path of each pair
+
+        Returns
+        -------
+        array
+            The length of the path of each pair, np.inf if longer than
+            its cutoff
+
+        """
+        sources = np.asarray(sources)
+        targets = np.asarray(targets)
+        cutoff = np.broadcast_to(np.asarray(cutoff, dtype=np.float64), sources.shape)
+        result = np.full(len(sources), np.inf)
+        if len(sources) == 0:
+            return result
+
+        unique, inverse = np.unique(sources, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(unique) + 1))
+        for i, source in enumerate(unique.tolist()):
+            pairs = order[bounds[i]:bounds[i + 1]]
+            nodes, values = self._sorted_lengths(source, cutoff[pairs].max())
+            if len(nodes) == 0:
+                continue
+            position = np.minimum(np.searchsorted(nodes, targets[pairs]), len(nodes) - 1)
+            found = nodes[position] == targets[pairs]
+            result[pairs[found]] = values[position[found]]
+        result[result > cutoff] = np.inf
+        return result
+
+    def _sorted_lengths(self, source: int, cutoff: float):
+        """Returns the nodes reached from source, sorted, and their lengths."""
+        lengths = self.lengths(source, cutoff)
+        arrays = self._arrays.get(source)
+        if arrays is None or arrays[0] is not lengths:
+            self._drop_arrays(source)
+            nodes = np.array(list(lengths))
+            values = np.fromiter(lengths.values(), dtype=np.float64, count=len(lengths))
+            order = np.argsort(nodes, kind='stable')
+            arrays = (lengths, nodes[order], values[order])
+            self._arrays[source] = arrays
+            self.nbytes += nodes.nbytes + values.nbytes
+            # source is the most recently used entry, evicted last
+            self._evict()
+        return arrays[1], arrays[2]
+
+    def _drop_arrays(self, source: int):
+        arrays = self._arrays.pop(source, None)
+        if arrays is not None:
+            self.nbytes -= arrays[1].nbytes + arrays[2].nbytes
+
+    def _evict(self):
+        """Removes least recently used entries until the budgets are met."""
+        while len(self._entries) > 1 and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries)
+            or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+        ):
+            source, (_, _, size) = self._entries.popitem(last=False)
+            self.nbytes -= size
+            self._drop_arrays(source)
+
+    def clear(self):
+        """Removes all entries and resets the counters."""
+        self._entries.clear()
+        self._arrays.clear()
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
@@ -0,0 +1,405 @@
+import heapq
+import json
+import os
+from typing import Optional, Text, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.core.frame import DataFrame
+
+from pymove_osmnx.utils.instrumentation import instrument, stage
+from pymove_osmnx.utils.similarity import MatchedTrajectories, lcss_length
+
+UNMATCHED = -1
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """Mixes the bits of unsigned 64 bit integers, the splitmix64 finalizer."""
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def edge_keys(edges: np.ndarray) -> np.ndarray:
+    """
+    Hashes the u and v node identifiers of edges to stable integer keys.
+
+    The keys do not depend on the other edges, so trajectories matched in
+    different batches get the same key for the same edge.
+
+    Parameters
+    ----------
+    edges : array
+        The u and v node identifiers of the edges
+
+    Returns
+    -------
+    array
+        The non negative int64 key of each edge
+
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2).view(np.uint64)
+    keys = _mix(_mix(edges[:, 0]) ^ edges[:, 1]) >> np.uint64(1)
+    return keys.astype(np.int64)
+
+
+class SimilarityIndex:
+    """
+    Index of trajectories answering top-k LCSS similarity queries.
+
+    Each trajectory is stored as the sequence of the keys of its matched
+    edges. The MinHash signature of its set of edges is split in bands, and
+    trajectories sharing the hash of a band are candidates of each other,
+    so only trajectories likely to share many edges are compared with the
+    exact LCSS, the most colliding first. The hashes of each band are kept
+    sorted. Inserts go to side segments, each at least twice as large as
+    the next, merged when a new one reaches the size of the previous and
+    into the index when they reach its size, so each trajectory is copied
+    O(log N) times instead of the whole index on every insert.
+    SimilarityIndex.save writes the arrays as .npy files, memory mapped by
+    SimilarityIndex.load.
+
+    Parameters
+    ----------
+    n_hashes : int, optional
+        Number of MinHash functions, by default 128
+    n_bands : int, optional
+        Number of bands, dividing n_hashes, by default 32. More bands find
+        trajectories sharing fewer edges, at the cost of more candidates
+    seed : int, optional
+        The seed of the hash functions, by default 0
+
+    """
+
+    ARRAYS = ('ids', 'ptr', 'sequences', 'band_keys', 'band_order')
+
+    def __init__(
+        self,
+        n_hashes: Optional[int] = 128,
+        n_bands: Optional[int] = 32,
+        seed: Optional[int] = 0
+    ):
+        if n_hashes % n_bands:
+            raise ValueError('n_hashes must be a multiple of n_bands')
+        self.n_hashes = n_hashes
+        self.n_bands = n_bands
+        self.seed = seed
+        self.ids = np.empty(0, dtype=np.int64)
+        self.ptr = np.zeros(1, dtype=np.int64)
+        self.sequences = np.empty(0, dtype=np.int64)
+        self.band_keys = np.empty((n_bands, 0), dtype=np.uint64)
+        self.band_order = np.empty((n_bands, 0), dtype=np.int64)
+        self._segments = []
+
+    def __len__(self) -> int:
+        return len(self.ids) + sum(len(segment) for segment in self._segments)
+
+    def _parts(self):
+        """Yields the first position of the index arrays and of each segment."""
+        offset = 0
+        for part in [self] + self._segments:
+            yield offset, part
+            offset += len(part.ids)
+
+    def _locate(self, i: int) -> Tuple['SimilarityIndex', int]:
+        """Returns the index or segment holding position i and its position there."""
+        for offset, part in self._parts():
+            if i < offset + len(part.ids):
+                return part, i - offset
+        raise IndexError('position %s out of range' % i)
+
+    @property
+    def salts(self) -> np.ndarray:
+        """The salt of each hash function."""
+        return _mix(np.arange(self.n_hashes, dtype=np.uint64) + np.uint64(self.seed))
+
+    def _sequences(
+        self, trajectories: MatchedTrajectories
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the offsets and the edge keys of the points of trajectories."""
+        keys = edge_keys(trajectories.edges)
+        ptr = np.concatenate([[0], np.cumsum(trajectories.lengths)]).astype(np.int64)
+        codes = np.concatenate(trajectories.codes) if trajectories.n else []
+        codes = np.asarray(codes, dtype=np.int64)
+        sequences = np.where(codes >= 0, keys[np.maximum(codes, 0)], UNMATCHED)
+        return ptr, sequences
+
+    def _band_keys(self, ptr: np.ndarray, sequences: np.ndarray) -> np.ndarray:
+        """
+        Hashes the bands of the MinHash signatures of some trajectories.
+
+        The points of each trajectory are contiguous, so the minimum of each
+        hash function is reduced over them without deduplicating the edges.
+        Trajectories without matched points get the hash 0 in every band,
+        which is never looked up.
+
+        Returns
+        -------
+        array
+            The (n_bands, n_trajectories) hashes
+
+        """
+        n = len(ptr) - 1
+        found = sequences != UNMATCHED
+        traj = np.repeat(np.arange(n), np.diff(ptr))[found]
+        matched = np.zeros(n, dtype=bool)
+        matched[traj] = True
+        starts = np.searchsorted(traj, np.flatnonzero(matched))
+        keys = sequences[found].astype(np.uint64)
+
+        rows = self.n_hashes // self.n_bands
+        band_keys = np.zeros((self.n_bands, n), dtype=np.uint64)
+        for band in range(self.n_bands):
+            value = np.zeros(len(starts), dtype=np.uint64)
+            for salt in self.salts[band * rows:(band + 1) * rows]:
+                if len(keys):
+                    hashes = (keys ^ salt) * (salt | np.uint64(1))
+                    value = _mix(value ^ np.minimum.reduceat(hashes, starts))
+            band_keys[band, matched] = value | np.uint64(1)
+        return band_keys
+
+    def _merge(self, other: 'SimilarityIndex'):
+        """Appends the trajectories of an index without segments to the arrays."""
+        n = len(self.ids)
+        size = n + len(other.ids)
+        merged_keys = np.empty((self.n_bands, size), dtype=np.uint64)
+        merged_order = np.empty((self.n_bands, size), dtype=np.int64)
+        for band in range(self.n_bands):
+            keys = other.band_keys[band]
+            at = np.searchsorted(self.band_keys[band], keys, side='right')
+            merged_keys[band] = np.insert(self.band_keys[band], at, keys)
+            merged_order[band] = np.insert(
+                self.band_order[band], at, other.band_order[band] + n
+            )
+        self.band_keys = merged_keys
+        self.band_order = merged_order
+
+        if n:
+            self.ids = np.concatenate([self.ids, other.ids])
+        else:
+            self.ids = np.asarray(other.ids).copy()
+        self.ptr = np.concatenate([self.ptr, other.ptr[1:] + self.ptr[-1]])
+        self.sequences = np.concatenate([self.sequences, other.sequences])
+
+    def flush(self):
+        """Merges the segments of the inserted trajectories into the index."""
+        for segment in self._segments:
+            self._merge(segment)
+        self._segments = []
+
+    @instrument()
+    def insert(self, trajectories: MatchedTrajectories):
+        """
+        Adds matched trajectories to the index.
+
+        Parameters
+        ----------
+        trajectories : MatchedTrajectories
+            The trajectories
+
+        """
+        if not trajectories.n:
+            return
+        ptr, sequences = self._sequences(trajectories)
+        band_keys = self._band_keys(ptr, sequences)
+        order = np.argsort(band_keys, axis=1, kind='stable')
+
+        segment = SimilarityIndex(self.n_hashes, self.n_bands, self.seed)
+        segment.ids = np.asarray(trajectories.ids).copy()
+        segment.ptr = ptr
+        segment.sequences = sequences
+        segment.band_keys = np.take_along_axis(band_keys, order, axis=1)
+        segment.band_order = order
+
+        segments = self._segments
+        segments.append(segment)
+        while len(segments) > 1 and len(segments[-2]) < 2 * len(segments[-1]):
+            last = segments.pop()
+            segments[-1]._merge(last)
+        if len(segments[0]) >= len(self.ids):
+            self.flush()
+
+    def sequence(self, i: int) -> np.ndarray:
+        """Returns the edge keys of the points of the trajectory at position i."""
+        part, i = self._locate(i)
+        return part.sequences[part.ptr[i]:part.ptr[i + 1]]
+
+    def _id(self, i: int):
+        """Returns the id of the trajectory at position i."""
+        part, i = self._locate(i)
+        return part.ids[i]
+
+    def candidates(self, band_keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the trajectories sharing a band with a signature.
+
+        Parameters
+        ----------
+        band_keys : array
+            The hashes of the bands of the signature
+
+        Returns
+        -------
+        tuple
+            The positions of the candidates and the number of bands each
+            shares, the most shared first
+
+        """
+        if not band_keys.any():
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        found = []
+        for offset, part in self._parts():
+            for band in range(self.n_bands):
+                first, last = (
+                    np.searchsorted(part.band_keys[band], band_keys[band], side=side)
+                    for side in ('left', 'right')
+                )
+                found.append(part.band_order[band][first:last] + offset)
+        positions, counts = np.unique(np.concatenate(found), return_counts=True)
+        order = np.argsort(-counts, kind='stable')
+        return positions[order], counts[order]
+
+    @instrument()
+    def query(
+        self,
+        trajectories: MatchedTrajectories,
+        k: Optional[int] = 20,
+        band: Optional[int] = None,
+        exclude_self: Optional[bool] = True
+    ) -> DataFrame:
+        """
+        Finds the k indexed trajectories most similar to each trajectory.
+
+        The similarity is the LCSS of the edges of the points divided by
+        the number of points of the shorter trajectory, as in
+        similarity_matrix, without time tolerance. Candidates are verified
+        while they may still beat the k-th best similarity found.
+
+        Parameters
+        ----------
+        trajectories : MatchedTrajectories
+            The query trajectories
+        k : int, optional
+            Number of similar trajectories of each query, by default 20
+        band : int, optional
+            Maximum distance in points from the diagonal of the matched
+            points, by default None
+        exclude_self : bool, optional
+            Whether to skip indexed trajectories with the id of the query,
+            by default True
+
+        Returns
+        -------
+        DataFrame
+            The ida, idb and similarity columns, sorted by the position of
+            the query and decreasing similarity
+
+        """
+        ptr, sequences = self._sequences(trajectories)
+        with stage('band_keys', trajectories.n):
+            band_keys = self._band_keys(ptr, sequences)
+
+        ida, idb, similarity = [], [], []
+        with stage('verify', trajectories.n):
+            for q in range(trajectories.n):
+                query = sequences[ptr[q]:ptr[q + 1]]
+                matched = int((query != UNMATCHED).sum())
+                best = []
+                for i in self.candidates(band_keys[:, q])[0].tolist():
+                    if exclude_self and self._id(i) == trajectories.ids[q]:
+                        continue
+                    stored = self.sequence(i)
+                    shorter = min(len(query), len(stored))
+                    needed = 1
+                    if len(best) == k:
+                        needed = int(np.floor(best[0][0] * shorter)) + 1
+                    if min(matched, shorter) < needed:
+                        continue
+                    length = lcss_length(query, stored, band=band, minimum=needed)
+                    if length < needed:
+                        continue
+                    item = (length / shorter, -i)
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    else:
+                        heapq.heapreplace(best, item)
+                for value, i in sorted(best, reverse=True):
+                    ida.append(trajectories.ids[q])
+                    idb.append(self._id(-i))
+                    similarity.append(value)
+
+        return pd.DataFrame({
+            'ida': pd.Series(ida, dtype=trajectories.ids.dtype),
+            'idb': pd.Series(idb, dtype=self.ids.dtype),
+            'similarity': pd.Series(similarity, dtype=np.float64),
+        })
+
+    def save(self, path: Text):
+        """
+        Saves the index as .npy files in a folder.
+
+        The segments are merged first. Ids that are not numbers, such as
+        strings, are saved as integer codes into an ids.json table, so every
+        array can be memory mapped.
+
+        Parameters
+        ----------
+        path : str
+            The folder, created if it does not exist
+
+        """
+        self.flush()
+        os.makedirs(path, exist_ok=True)
+        table = os.path.join(path, 'ids.json')
+        for name in self.ARRAYS:
+            array = getattr(self, name)
+            if name == 'ids' and array.dtype == object:
+                array, uniques = pd.factorize(array)
+                with open(table, 'w') as f:
+                    json.dump(uniques.tolist(), f)
+            elif name == 'ids' and os.path.exists(table):
+                os.remove(table)
+            np.save(os.path.join(path, name + '.npy'), array)
+        with open(os.path.join(path, 'index.json'), 'w') as f:
+            json.dump(
+                {'n_hashes': self.n_hashes, 'n_bands': self.n_bands, 'seed': self.seed},
+                f
+            )
+
+    @classmethod
+    def load(cls, path: Text, mmap: Optional[bool] = True) -> 'SimilarityIndex':
+        """
+        Loads an index saved with SimilarityIndex.save.
+
+        With mmap, the arrays are read only memory maps of the files, so
+        opening even a large index does not read it. Inserts go to segments
+        in memory, and the arrays are copied when the segments reach their
+        size. Ids saved as codes are read from their table.
+
+        Parameters
+        ----------
+        path : str
+            The folder of the index
+        mmap : bool, optional
+            Whether to map the files instead of reading them, by default True
+
+        Returns
+        -------
+        SimilarityIndex
+            The index
+
+        """
+        with open(os.path.join(path, 'index.json')) as f:
+            index = cls(**json.load(f))
+        mmap_mode = 'r' if mmap else None
+        for name in cls.ARRAYS:
+            setattr(
+                index, name,
+                np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+            )
+        table = os.path.join(path, 'ids.json')
+        if os.path.exists(table):
+            with open(table) as f:
+                index.ids = np.array(json.load(f), dtype=object)[index.ids]
+        return index
@@ -0,0 +1,311 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from pymove_osmnx.core.hmm import (
+    emission_log_prob,
+    great_circle,
+    route_distances,
+    transition_cutoff,
+    transition_log_prob,
+)
+
+
+class _VehicleState:
+    """Sliding window of the online Viterbi of one vehicle."""
+
+    __slots__ = ('seq', 'lat', 'lon', 'time', 'steps', 'score')
+
+    def __init__(self):
+        self.seq = 0
+        self.lat = None
+        self.lon = None
+        self.time = None
+        # (seq, time, edges, offsets, back) of each step in the window
+        self.steps = []
+        self.score = None
+
+
+class StreamingMatcher:
+    """
+    Online map matcher for live GPS feeds.
+
+    Points are added one at a time or in small batches per vehicle. Each
+    vehicle keeps a bounded window of the Viterbi lattice of the hidden
+    markov model used by MapMatcher.match_edges with method 'hmm'. A point is
+    emitted as soon as all the paths of its vehicle go through the same
+    candidate, when it leaves the window, or when a later point of its
+    vehicle has no candidate, so the points of a vehicle are emitted in
+    order.
+
+    Parameters
+    ----------
+    matcher : MapMatcher
+        The matcher holding the graph and its indexes
+    window : int, optional
+        Maximum number of points kept per vehicle, by default 30
+    k : int, optional
+        Maximum number of candidate edges per point, by default 8
+    radius : float, optional
+        Maximum distance in meters between a point and its candidates,
+        by default 50
+    sigma : float, optional
+        The standard deviation of the GPS noise in meters, by default 4.07
+    beta : float, optional
+        The scale of the transition distribution in meters, by default 3.0
+    max_speed : float, optional
+        The maximum speed in meters per second, by default 30
+
+    """
+
+    def __init__(
+        self,
+        matcher,
+        window: Optional[int] = 30,
+        k: Optional[int] = 8,
+        radius: Optional[float] = 50,
+        sigma: Optional[float] = 4.07,
+        beta: Optional[float] = 3.0,
+        max_speed: Optional[float] = 30
+    ):
+        self.matcher = matcher
+        self.window = window
+        self.k = k
+        self.radius = radius
+        self.sigma = sigma
+        self.beta = beta
+        self.max_speed = max_speed
+        self.vehicles = {}
+
+    def __len__(self) -> int:
+        return len(self.vehicles)
+
+    def add(
+        self, id_: Any, lat: float, lon: float, time: float
+    ) -> List[Tuple[Any, int, float, Optional[Tuple[int, int]]]]:
+        """
+        Adds one point of a vehicle.
+
+        Parameters
+        ----------
+        id_ : any
+            The vehicle identifier
+        lat : float
+            The latitude of the point
+        lon : float
+            The longitude of the point
+        time : float
+            The time of the point in seconds
+
+        Returns
+        -------
+        list
+            The points finalized by this call, as tuples of vehicle
+            identifier, sequence number of the point in its vehicle, time and
+            matched edge (u, v), None when the point has no candidate
+
+        """
+        return self.add_batch([id_], [lat], [lon], [time])
+
+    def add_batch(
+        self,
+        ids: List,
+        lats: List[float],
+        lons: List[float],
+        times: List[float]
+    ) -> List[Tuple[Any, int, float, Optional[Tuple[int, int]]]]:
+        """
+        Adds points of one or more vehicles, in the order they are given.
+
+        The candidates of all points are found with a single query.
+
+        Parameters
+        ----------
+        ids : list
+            The vehicle identifier of each point
+        lats : list
+            The latitudes of the points
+        lons : list
+            The longitudes of the points
+        times : list
+            The times of the points in seconds
+
+        Returns
+        -------
+        list
+            The points finalized by this call, as tuples of vehicle
+            identifier, sequence number of the point in its vehicle, time and
+            matched edge (u, v), None when the point has no candidate
+
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        point_idx, edges, dists, offsets = self.matcher.candidates(
+            lons, lats, k=self.k, radius=self.radius
+        )
+        ptr = np.searchsorted(point_idx, np.arange(len(lats) + 1))
+        emissions = emission_log_prob(dists, self.sigma)
+
+        output = []
+        for i, id_ in enumerate(ids):
+            rows = slice(ptr[i], ptr[i + 1])
+            self._step(
+                id_, lats[i], lons[i], float(times[i]),
+                edges[rows].astype(np.int32),
+                offsets[rows].astype(np.float32),
+                emissions[rows],
+                output
+            )
+        return output
+
+    def _step(
+        self,
+        id_: Any,
+        lat: float,
+        lon: float,
+        time: float,
+        edges: np.ndarray,
+        offsets: np.ndarray,
+        emission: np.ndarray,
+        output: List
+    ):
+        """Advances the lattice of a vehicle by one point."""
+        state = self.vehicles.get(id_)
+        if state is None:
+            state = self.vehicles[id_] = _VehicleState()
+        seq = state.seq
+        state.seq += 1
+
+        if len(edges) == 0:
+            # the track is broken, its pending points are emitted first
+            if state.steps:
+                self._finalize(id_, state, len(state.steps) - 1, None, output)
+            output.append((id_, seq, time, None))
+            return
+
+        back = np.full(len(edges), -1, dtype=np.int16)
+        if not state.steps:
+            score = emission
+        else:
+            distance = great_circle(state.lat, state.lon, lat, lon)
+            cutoff = float(transition_cutoff(
+                distance, self.radius, time - state.time, self.max_speed
+            ))
+            _, _, prev_edges, prev_offsets, _ = state.steps[-1]
+            route = route_distances(
+                self.matcher,
+                prev_edges.astype(np.int64),
+                prev_offsets.astype(np.float64),
+                edges.astype(np.int64),
+                offsets.astype(np.float64),
+                cutoff
+            )
+            total = state.score[:, None] + transition_log_prob(
+                distance, route, self.beta
+            )
+            best = np.argmax(total, axis=0)
+            score = total[best, np.arange(len(edges))]
+            if np.isneginf(score).all():
+                self._finalize(id_, state, len(state.steps) - 1, None, output)
+                score = emission
+            else:
+                score = score + emission
+                back = best.astype(np.int16)
+
+        state.steps.append((seq, time, edges, offsets, back))
+        state.score = score
+        state.lat, state.lon, state.time = lat, lon, time
+
+        converged = self._convergence(state)
+        if converged is not None:
+            self._finalize(id_, state, *converged, output)
+        if self.window is not None and len(state.steps) > self.window:
+            self._finalize(id_, state, 0, None, output)
+
+    def _convergence(self, state: _VehicleState) -> Optional[Tuple[int, int]]:
+        """
+        Finds the latest step where all the paths of the window meet.
+
+        Returns
+        -------
+        tuple
+            The step and the candidate where the paths meet, or None
+
+        """
+        alive = np.arange(len(state.score))
+        for j in range(len(state.steps) - 1, 0, -1):
+            alive = np.unique(state.steps[j][4][alive])
+            if len(alive) == 1:
+                return j - 1, alive[0]
+        return None
+
+    def _finalize(
+        self,
+        id_: Any,
+        state: _VehicleState,
+        step: int,
+        candidate: Optional[int],
+        output: List
+    ):
+        """Emits the points of the window up to step and removes them."""
+        if candidate is None:
+            candidate = self._best_candidate(state, step)
+
+        chosen = []
+        for j in range(step, -1, -1):
+            seq, time, edges, _, back = state.steps[j]
+            e = edges[candidate]
+            chosen.append(
+                (id_, seq, time, (self.matcher.edge_u[e], self.matcher.edge_v[e]))
+            )
+            candidate = back[candidate]
+        output.extend(reversed(chosen))
+
+        del state.steps[:step + 1]
+        if state.steps:
+            seq, time, edges, offsets, back = state.steps[0]
+            state.steps[0] = (seq, time, edges, offsets, np.full_like(back, -1))
+
+    def _best_candidate(self, state: _VehicleState, step: int) -> int:
+        """Candidate of a step on the most likely path of the window."""
+        candidate = int(np.argmax(state.score))
+        for j in range(len(state.steps) - 1, step, -1):
+            candidate = state.steps[j][4][candidate]
+        return candidate
+
+    def flush(
+        self, id_: Optional[Any] = None
+    ) -> List[Tuple[Any, int, float, Optional[Tuple[int, int]]]]:
+        """
+        Emits all pending points and forgets the vehicles.
+
+        Parameters
+        ----------
+        id_ : any, optional
+            The vehicle to flush, by default None, flushes every vehicle
+
+        Returns
+        -------
+        list
+            The finalized points, as returned by add
+
+        """
+        ids = list(self.vehicles) if id_ is None else [id_]
+        output = []
+        for i in ids:
+            state = self.vehicles.pop(i, None)
+            if state is not None and state.steps:
+                self._finalize(i, state, len(state.steps) - 1, None, output)
+        return output
+
+    def pending(self) -> Dict[Any, int]:
+        """
+        Number of points not yet emitted, by vehicle.
+
+        Returns
+        -------
+        dict
+            The size of the window of each vehicle
+
+        """
+        return {i: len(s.steps) for i, s in self.vehicles.items()}
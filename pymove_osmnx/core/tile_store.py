@@ -0,0 +1,273 @@
+import json
+import os
+from collections import OrderedDict
+from typing import Optional, Text, Tuple, Union
+
+import numpy as np
+from networkx import MultiDiGraph
+
+from pymove_osmnx.core.compact_graph import CompactGraph
+
+OFFSET = 2 ** 31
+
+
+def _pack(i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Packs the column and row of tiles in a single integer."""
+    return ((i + OFFSET) << 32) | (j + OFFSET)
+
+
+def _unpack(code: int) -> Tuple[int, int]:
+    """Returns the column and row of a packed tile."""
+    return (code >> 32) - OFFSET, (code & 0xFFFFFFFF) - OFFSET
+
+
+def _box_tiles(
+    i0: np.ndarray, i1: np.ndarray, j0: np.ndarray, j1: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lists the tiles of boxes of tiles.
+
+    Returns the position of the box and the packed tile of every tile from
+    column i0 to i1 and row j0 to j1 of each box.
+    """
+    rows = j1 - j0 + 1
+    count = (i1 - i0 + 1) * rows
+    box = np.repeat(np.arange(len(count)), count)
+    rank = np.arange(len(box)) - np.repeat(np.cumsum(count) - count, count)
+    return box, _pack(i0[box] + rank // rows[box], j0[box] + rank % rows[box])
+
+
+class TileStore:
+    """
+    Road graph split in square tiles saved on disk and loaded on demand.
+
+    TileStore.build splits a large regional graph once. Each edge is stored
+    in every tile overlapped by the bounding box of its geometry, so the
+    tiles touched by a trajectory are stitched back into a graph without
+    gaps, however long the edges. Only the tiles within the margin of the
+    points are loaded. They are kept in LRU order and the least recently
+    used are dropped when their arrays exceed max_bytes, so the memory stays
+    bounded whatever the extent of the trajectories.
+
+    Parameters
+    ----------
+    path : str
+        The folder of a store built with TileStore.build
+    max_bytes : int, optional
+        Maximum memory used by the loaded tiles, by default 268435456
+    margin : float, optional
+        Distance in degrees around the points within which the tiles are
+        loaded, by default 0.005
+    mmap : bool, optional
+        Whether to map the files of the tiles instead of reading them,
+        by default False
+
+    """
+
+    def __init__(
+        self,
+        path: Text,
+        max_bytes: Optional[int] = 268435456,
+        margin: Optional[float] = 0.005,
+        mmap: Optional[bool] = False
+    ):
+        with open(os.path.join(path, 'tiles.json')) as f:
+            meta = json.load(f)
+        self.path = path
+        self.tile_size = meta['tile_size']
+        self.codes = np.sort(_pack(
+            np.array([t[0] for t in meta['tiles']], dtype=np.int64),
+            np.array([t[1] for t in meta['tiles']], dtype=np.int64)
+        ))
+        self.max_bytes = max_bytes
+        self.margin = margin
+        self.mmap = mmap
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._tiles = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    @classmethod
+    def build(
+        cls,
+        G: Union[MultiDiGraph, CompactGraph],
+        path: Text,
+        tile_size: Optional[float] = 0.05,
+        **kwargs
+    ) -> 'TileStore':
+        """
+        Splits a graph in tiles saved as CompactGraph folders.
+
+        Parameters
+        ----------
+        G : MultiDiGraph or CompactGraph
+            The road graph
+        path : str
+            The folder of the store, created if it does not exist
+        tile_size : float, optional
+            The side of the tiles in degrees, by default 0.05
+        **kwargs
+            Parameters of the TileStore
+
+        Returns
+        -------
+        TileStore
+            The store
+
+        """
+        if not isinstance(G, CompactGraph):
+            G = CompactGraph.from_graph(G)
+
+        start = G.vertex_ptr[:-1]
+        low = np.minimum.reduceat(G.vertices, start) if G.n_edges else G.vertices
+        high = np.maximum.reduceat(G.vertices, start) if G.n_edges else G.vertices
+        low = np.floor(low / tile_size).astype(np.int64)
+        high = np.floor(high / tile_size).astype(np.int64)
+        edges, edge_tiles = _box_tiles(low[:, 0], high[:, 0], low[:, 1], high[:, 1])
+        node_tiles = _pack(
+            np.floor(G.node_x / tile_size).astype(np.int64),
+            np.floor(G.node_y / tile_size).astype(np.int64)
+        )
+
+        edge_order = np.argsort(edge_tiles, kind='stable')
+        edge_tiles = edge_tiles[edge_order]
+        node_order = np.argsort(node_tiles, kind='stable')
+        node_tiles = node_tiles[node_order]
+        codes = np.union1d(edge_tiles, node_tiles)
+        edge_ptr = np.searchsorted(edge_tiles, codes, side='right')
+        node_ptr = np.searchsorted(node_tiles, codes, side='right')
+
+        os.makedirs(path, exist_ok=True)
+        tiles = []
+        for n, code in enumerate(codes.tolist()):
+            i, j = _unpack(code)
+            first_edge = edge_ptr[n - 1] if n else 0
+            first_node = node_ptr[n - 1] if n else 0
+            G.subgraph(
+                edges[edge_order[first_edge:edge_ptr[n]]],
+                node_order[first_node:node_ptr[n]]
+            ).save(os.path.join(path, '%d_%d' % (i, j)))
+            tiles.append([i, j])
+        with open(os.path.join(path, 'tiles.json'), 'w') as f:
+            json.dump({'tile_size': tile_size, 'tiles': tiles}, f)
+        return cls(path, **kwargs)
+
+    def tiles(self, X: np.ndarray, Y: np.ndarray) -> np.ndarray:
+        """
+        Finds the tiles of the store within the margin of some points.
+
+        Parameters
+        ----------
+        X : array
+            The longitudes of the points
+        Y : array
+            The latitudes of the points
+
+        Returns
+        -------
+        array
+            The sorted packed codes of the tiles
+
+        """
+        X = np.asarray(X, dtype=np.float64)
+        Y = np.asarray(Y, dtype=np.float64)
+        boxes = np.unique(np.stack([
+            np.floor((X - self.margin) / self.tile_size),
+            np.floor((X + self.margin) / self.tile_size),
+            np.floor((Y - self.margin) / self.tile_size),
+            np.floor((Y + self.margin) / self.tile_size),
+        ], axis=1).astype(np.int64), axis=0)
+        _, codes = _box_tiles(*boxes.T)
+        codes = np.unique(codes)
+        return codes[np.isin(codes, self.codes)]
+
+    def tile(self, code: int) -> CompactGraph:
+        """
+        Returns the graph of a tile, loading it when it is not in memory.
+
+        Parameters
+        ----------
+        code : int
+            The packed code of the tile
+
+        Returns
+        -------
+        CompactGraph
+            The graph of the tile
+
+        """
+        graph = self._tiles.get(code)
+        if graph is not None:
+            self.hits += 1
+            self._tiles.move_to_end(code)
+            return graph
+
+        self.misses += 1
+        graph = CompactGraph.load(
+            os.path.join(self.path, '%d_%d' % _unpack(code)), mmap=self.mmap
+        )
+        self._tiles[code] = graph
+        self.nbytes += graph.nbytes
+        self._evict()
+        return graph
+
+    def stitch(self, codes: np.ndarray) -> CompactGraph:
+        """
+        Builds the graph of some tiles.
+
+        Parameters
+        ----------
+        codes : array
+            The packed codes of the tiles
+
+        Returns
+        -------
+        CompactGraph
+            The stitched graph
+
+        Raises
+        ------
+        ValueError
+            if there are no tiles
+
+        """
+        if len(codes) == 0:
+            raise ValueError('no tile of the store is near the points')
+        return CompactGraph.concat([self.tile(code) for code in codes.tolist()])
+
+    def graph(self, X: np.ndarray, Y: np.ndarray) -> CompactGraph:
+        """
+        Builds the graph of the tiles within the margin of some points.
+
+        Parameters
+        ----------
+        X : array
+            The longitudes of the points
+        Y : array
+            The latitudes of the points
+
+        Returns
+        -------
+        CompactGraph
+            The stitched graph
+
+        """
+        return self.stitch(self.tiles(X, Y))
+
+    def _evict(self):
+        """Removes least recently used tiles until the budget is met."""
+        while len(self._tiles) > 1 and (
+            self.max_bytes is not None and self.nbytes > self.max_bytes
+        ):
+            _, graph = self._tiles.popitem(last=False)
+            self.nbytes -= graph.nbytes
+
+    def clear(self):
+        """Removes all tiles from memory and resets the counters."""
+        self._tiles.clear()
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
@@ -0,0 +1,68 @@
+import pytest
+from networkx import MultiDiGraph
+
+
+@pytest.fixture
+def default_graph():
+    """Three one way streets leaving node 1, two of them diagonal."""
+    G = MultiDiGraph(crs='epsg:4326')
+    G.add_node(1, x=-38.6800, y=-3.7800)
+    G.add_node(2, x=-38.6790, y=-3.7790)
+    G.add_node(3, x=-38.6780, y=-3.7780)
+    G.add_node(4, x=-38.6790, y=-3.7800)
+    G.add_edge(1, 2, key=0, length=156.9)
+    G.add_edge(2, 3, key=0, length=156.9)
+    G.add_edge(1, 4, key=0, length=111.3)
+    return G
+
+
+@pytest.fixture
+def street_graph():
+    """A two way street from node 1 to 4 and a short disconnected street."""
+    G = MultiDiGraph(crs='epsg:4326')
+    G.add_node(1, x=-38.6800, y=-3.7800)
+    G.add_node(2, x=-38.6790, y=-3.7800)
+    G.add_node(3, x=-38.6780, y=-3.7800)
+    G.add_node(4, x=-38.6770, y=-3.7800)
+    G.add_node(5, x=-38.6785, y=-3.7798)
+    G.add_node(6, x=-38.6780, y=-3.7798)
+    for u, v in [(1, 2), (2, 3), (3, 4)]:
+        G.add_edge(u, v, key=0, length=111.0)
+        G.add_edge(v, u, key=0, length=111.0)
+    G.add_edge(5, 6, key=0, length=55.5)
+    return G
+
+
+@pytest.fixture
+def line_graph():
+    """A one way street from node 1 to 4, with edges of 100 meters."""
+    G = MultiDiGraph(crs='epsg:4326')
+    for n in range(1, 5):
+        G.add_node(n, x=-38.680 + n * 0.001, y=-3.780)
+    G.add_edge(1, 2, key=0, length=100.0)
+    G.add_edge(2, 3, key=0, length=100.0)
+    G.add_edge(3, 4, key=0, length=100.0)
+    return G
+
+
+@pytest.fixture
+def diagonal_graph():
+    """A single two way diagonal street between nodes 1 and 2."""
+    G = MultiDiGraph(crs='epsg:4326')
+    G.add_node(1, x=-38.6800, y=-3.7800)
+    G.add_node(2, x=-38.6780, y=-3.7780)
+    G.add_edge(1, 2, key=0, length=314.5)
+    G.add_edge(2, 1, key=0, length=314.5)
+    return G
+
+
+@pytest.fixture
+def fork_graph():
+    """A diagonal and a horizontal one way street leaving node 1."""
+    G = MultiDiGraph(crs='epsg:4326')
+    G.add_node(1, x=-38.6800, y=-3.7800)
+    G.add_node(2, x=-38.6780, y=-3.7780)
+    G.add_node(3, x=-38.6780, y=-3.7800)
+    G.add_edge(1, 2, key=0, length=314.5)
+    G.add_edge(1, 3, key=0, length=222.4)
+    return G
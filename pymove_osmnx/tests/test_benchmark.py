@@ -0,0 +1,111 @@
+import json
+import os
+
+from pymove_osmnx.benchmark import (
+    ENGINES,
+    compare,
+    grid_graph,
+    main,
+    measure,
+    random_planar_graph,
+    random_trajectories,
+    run_benchmarks,
+)
+from pymove_osmnx.core.map_matcher import MapMatcher
+
+
+def test_grid_graph():
+    G = grid_graph(size=3)
+
+    assert G.number_of_nodes() == 9
+    assert G.number_of_edges() == 24
+    assert round(G[0][1][0]['length'], 2) == 110.95
+    assert round(G[0][3][0]['length'], 2) == 111.2
+
+
+def test_random_planar_graph():
+    G = random_planar_graph(n_nodes=20)
+
+    assert G.number_of_nodes() == 20
+    assert all(G.has_edge(v, u) for u, v in G.edges())
+
+
+def test_random_trajectories():
+    G = grid_graph(size=5)
+
+    move_data = random_trajectories(G, n_trajectories=3, n_points=10, noise=0)
+    again = random_trajectories(G, n_trajectories=3, n_points=10, noise=0)
+
+    assert len(move_data) == 30
+    assert move_data['id'].tolist() == [0] * 10 + [1] * 10 + [2] * 10
+    assert move_data['datetime'].is_monotonic_increasing
+    assert move_data.equals(again)
+    assert move_data['lat'].between(-3.8, -3.796).all()
+
+
+def test_measure():
+    G = grid_graph(size=5)
+    move_data = random_trajectories(G, n_trajectories=2, n_points=10)
+    matcher = MapMatcher(G, precision=0.0001)
+    matcher.build_indexes()
+    cached = []
+
+    def engine(move_data, matcher):
+        cached.append((len(matcher.paths), len(matcher.edge_memo)))
+        return ENGINES['hmm'](move_data, matcher)
+
+    result = measure(engine, move_data, matcher)
+
+    assert result['n_trajectories'] == 2
+    assert cached == [(0, 0)] * 4
+    assert len(matcher.paths) > 0
+
+
+def test_run_benchmarks(tmpdir):
+    path = os.path.join(str(tmpdir), 'results.json')
+
+    results = run_benchmarks(
+        graphs={'grid': grid_graph(size=5)},
+        n_trajectories=2,
+        n_points=10,
+        output_path=path
+    )
+    with open(path) as f:
+        saved = json.load(f)
+
+    assert results['engine'].tolist() == list(ENGINES)
+    assert (results['points_per_second'] > 0).all()
+    assert (results['peak_memory'] > 0).all()
+    assert len(saved['results']) == 3
+    assert 'version' in saved
+
+
+def test_compare(tmpdir):
+    baseline = os.path.join(str(tmpdir), 'baseline.json')
+    current = os.path.join(str(tmpdir), 'current.json')
+    results = [{
+        'graph': 'grid', 'engine': 'node', 'points_per_second': 1000.0,
+        'latency_mean': 0.01, 'latency_p95': 0.02, 'peak_memory': 100
+    }]
+    with open(baseline, 'w') as f:
+        json.dump({'results': results}, f)
+    results[0]['points_per_second'] = 500.0
+    with open(current, 'w') as f:
+        json.dump({'results': results}, f)
+
+    comparison = compare(baseline, current)
+
+    assert comparison['points_per_second'].tolist() == [0.5]
+    assert comparison['regression'].tolist() == [True]
+    assert not compare(baseline, baseline)['regression'].any()
+
+
+def test_main(tmpdir):
+    path = os.path.join(str(tmpdir), 'results.json')
+
+    main([path, '--trajectories', '1', '--points', '5', '--engines', 'node'])
+    main([path, '--baseline', path, '--trajectories', '1', '--points', '5',
+          '--engines', 'node', '--tolerance', '100'])
+
+    with open(path) as f:
+        assert len(json.load(f)['results']) == 2
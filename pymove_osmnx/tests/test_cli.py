@@ -0,0 +1,144 @@
+import os
+
+import osmnx as ox
+import pandas as pd
+from networkx import MultiDiGraph
+from pandas import DataFrame
+from pandas.testing import assert_frame_equal
+
+from pymove_osmnx.cli import main, match_file, read_chunks
+from pymove_osmnx.core import map_matcher
+from pymove_osmnx.core.parallel import match_positions
+
+list_data = [
+    [-3.78001, -38.6795, '2008-10-23 05:53:05', 1],
+    [-3.77999, -38.6788, '2008-10-23 05:53:15', 1],
+    [-3.77988, -38.6783, '2008-10-23 05:53:25', 2],
+    [-3.78002, -38.6775, '2008-10-23 05:53:35', 2],
+    [-3.77999, -38.6788, '2008-10-23 05:53:45', 2],
+    [-3.78001, -38.6795, '2008-10-23 05:53:55', 3],
+]
+
+
+def _default_graph():
+    G = MultiDiGraph(crs='epsg:4326')
+    G.add_node(1, x=-38.6800, y=-3.7800)
+    G.add_node(2, x=-38.6790, y=-3.7800)
+    G.add_node(3, x=-38.6780, y=-3.7800)
+    G.add_node(4, x=-38.6770, y=-3.7800)
+    for u, v in [(1, 2), (2, 3), (3, 4)]:
+        G.add_edge(u, v, key=0, length=111.0)
+        G.add_edge(v, u, key=0, length=111.0)
+    return G
+
+
+def _write_files(tmpdir):
+    input_path = os.path.join(tmpdir, 'input.csv')
+    graph_path = os.path.join(tmpdir, 'graph.graphml')
+    DataFrame(
+        data=list_data, columns=['lat', 'lon', 'datetime', 'id']
+    ).to_csv(input_path, index=False)
+    ox.save_graphml(_default_graph(), graph_path)
+    return input_path, graph_path
+
+
+def test_read_chunks(tmpdir):
+    input_path, _ = _write_files(str(tmpdir))
+
+    chunks = list(read_chunks(input_path, chunksize=2))
+
+    assert [c['id'].tolist() for c in chunks] == [[1, 1], [2, 2, 2], [3]]
+
+
+def test_match_file(tmpdir):
+    input_path, graph_path = _write_files(str(tmpdir))
+    output_path = os.path.join(str(tmpdir), 'output.csv')
+
+    rows = match_file(input_path, output_path, graph_path, chunksize=2)
+    output = pd.read_csv(output_path)
+
+    assert rows == 6
+    assert output['id'].tolist() == [1, 1, 2, 2, 2, 3]
+    edges = [tuple(sorted(e)) for e in zip(output['edge_u'], output['edge_v'])]
+    assert edges == [(1, 2), (2, 3), (2, 3), (3, 4), (2, 3), (1, 2)]
+    assert output['geometry'].str.startswith('LINESTRING').all()
+
+
+def test_match_file_workers(tmpdir):
+    input_path, graph_path = _write_files(str(tmpdir))
+    output_path = os.path.join(str(tmpdir), 'output.csv')
+    parallel_path = os.path.join(str(tmpdir), 'parallel.csv')
+
+    match_file(input_path, output_path, graph_path, method='hmm', chunksize=2)
+    main([
+        input_path, parallel_path, '--graph', graph_path,
+        '--method', 'hmm', '--chunksize', '2', '--workers', '2'
+    ])
+
+    assert_frame_equal(pd.read_csv(parallel_path), pd.read_csv(output_path))
+
+
+def test_match_file_id_column(tmpdir, monkeypatch):
+    input_path, graph_path = _write_files(str(tmpdir))
+    output_path = os.path.join(str(tmpdir), 'output.csv')
+    vehicle_path = os.path.join(str(tmpdir), 'vehicle.csv')
+    match_file(input_path, output_path, graph_path, method='hmm')
+    data = pd.read_csv(input_path)
+    data['vehicle'] = data['id']
+    data['id'] = 0
+    data.to_csv(input_path, index=False)
+
+    calls = []
+
+    def spy(matcher, method, X, Y, traj=None, **kwargs):
+        calls.extend(traj.tolist())
+        return match_positions(matcher, method, X, Y, traj=traj, **kwargs)
+
+    monkeypatch.setattr(map_matcher, 'match_positions', spy)
+    main([
+        input_path, vehicle_path, '--graph', graph_path,
+        '--method', 'hmm', '--id-column', 'vehicle'
+    ])
+    output = pd.read_csv(output_path)
+    vehicle = pd.read_csv(vehicle_path)
+
+    assert calls == [1, 1, 2, 2, 2, 3]
+    assert vehicle['id'].tolist() == [0] * 6
+    assert_frame_equal(
+        vehicle.drop(columns=['id', 'vehicle']), output.drop(columns='id')
+    )
+
+
+def test_main_hmm_parameters(tmpdir):
+    input_path, graph_path = _write_files(str(tmpdir))
+    output_path = os.path.join(str(tmpdir), 'output.csv')
+    narrow_path = os.path.join(str(tmpdir), 'narrow.csv')
+
+    match_file(
+        input_path, output_path, graph_path, method='hmm',
+        kwargs={'k': 1, 'radius': 5.0, 'max_speed': 10.0}
+    )
+    main([
+        input_path, narrow_path, '--graph', graph_path, '--method', 'hmm',
+        '--k', '1', '--radius', '5', '--max-speed', '10'
+    ])
+    narrow = pd.read_csv(narrow_path)
+
+    assert_frame_equal(narrow, pd.read_csv(output_path))
+    assert narrow['edge_u'].isnull().tolist() == [False, False, True, False, False, False]
+
+
+def test_match_file_compact(tmpdir):
+    input_path, graph_path = _write_files(str(tmpdir))
+    output_path = os.path.join(str(tmpdir), 'output.csv')
+    compact_path = os.path.join(str(tmpdir), 'compact.csv')
+
+    match_file(input_path, output_path, graph_path, chunksize=2)
+    main([input_path, compact_path, '--graph', graph_path, '--compact'])
+    output = pd.read_csv(output_path)
+    compact = pd.read_csv(compact_path)
+
+    assert 'geometry' not in compact
+    assert compact['u'].tolist() == output['edge_u'].tolist()
+    assert compact['v'].tolist() == output['edge_v'].tolist()
+    assert compact['key'].tolist() == [0] * 6
@@ -0,0 +1,113 @@
+import numpy as np
+from networkx import MultiDiGraph, single_source_dijkstra_path_length
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+from shapely.geometry import LineString, Point
+
+from pymove_osmnx.core.compact_graph import CompactGraph
+
+
+def _default_graph():
+    G = MultiDiGraph(crs='epsg:4326')
+    G.add_node(10, x=-38.6800, y=-3.7800)
+    G.add_node(30, x=-38.6790, y=-3.7790)
+    G.add_node(20, x=-38.6780, y=-3.7780)
+    G.add_node(40, x=-38.6790, y=-3.7800)
+    G.add_edge(10, 30, key=0, length=156.9)
+    G.add_edge(10, 30, key=1, length=200.0, geometry=LineString(
+        [(-38.6800, -3.7800), (-38.6800, -3.7790), (-38.6790, -3.7790)]
+    ))
+    G.add_edge(30, 20, key=0, length=156.9)
+    G.add_edge(10, 40, key=0, length=111.3)
+    G.add_edge(40, 30, key=0, length=111.3)
+    return G
+
+
+def test_from_graph():
+    graph = CompactGraph.from_graph(_default_graph())
+
+    assert_array_equal(graph.node_ids, [10, 30, 20, 40])
+    assert_array_equal(graph.indptr, [0, 3, 4, 4, 5])
+    assert_array_equal(graph.edge_u, [10, 10, 10, 30, 40])
+    assert_array_equal(graph.edge_v, [30, 30, 40, 20, 30])
+    assert_array_equal(graph.edge_key, [0, 1, 0, 0, 0])
+    assert_array_equal(graph.vertex_ptr, [0, 2, 5, 7, 9, 11])
+    assert_array_almost_equal(graph.vertices[2:5], [
+        [-38.6800, -3.7800], [-38.6800, -3.7790], [-38.6790, -3.7790]
+    ])
+
+
+def test_node_positions():
+    graph = CompactGraph.from_graph(_default_graph())
+
+    assert_array_equal(graph.node_positions([40, 10, 99]), [3, 0, -1])
+
+
+def test_edge_positions():
+    graph = CompactGraph.from_graph(_default_graph())
+
+    assert_array_equal(
+        graph.edge_positions([10, 30, 20, 99], [30, 20, 30, 10]), [0, 3, -1, -1]
+    )
+    assert_array_equal(
+        graph.edge_positions([10, 10, 10, -1], [30, 30, 40, -1], [1, 0, 1, -1]),
+        [1, 0, -1, -1]
+    )
+
+
+def test_subgraph_concat():
+    graph = CompactGraph.from_graph(_default_graph())
+
+    first = graph.subgraph([0, 1, 3])
+    second = graph.subgraph([1, 2, 4], nodes=[2])
+    stitched = CompactGraph.concat([first, second])
+
+    assert_array_equal(first.node_ids, [10, 30, 20])
+    assert_array_equal(first.vertex_ptr, [0, 2, 5, 7])
+    assert_array_equal(second.node_ids, [10, 30, 20, 40])
+    assert_array_equal(stitched.node_ids, [10, 20, 30, 40])
+    assert_array_equal(stitched.edge_u, graph.edge_u)
+    assert_array_equal(stitched.edge_v, graph.edge_v)
+    assert_array_equal(stitched.edge_key, graph.edge_key)
+    assert_array_equal(stitched.vertices, graph.vertices)
+
+
+def test_geometries():
+    graph = CompactGraph.from_graph(_default_graph())
+
+    assert list(graph.node_geometries(np.array([1, 1]))) == [
+        Point(-38.6790, -3.7790), Point(-38.6790, -3.7790)
+    ]
+    assert list(graph.edge_geometries(np.array([3]))) == [
+        LineString([(-38.6790, -3.7790), (-38.6780, -3.7780)])
+    ]
+
+
+def test_shortest_path_lengths():
+    G = _default_graph()
+    graph = CompactGraph.from_graph(G)
+
+    assert graph.shortest_path_lengths(10) == single_source_dijkstra_path_length(
+        G, 10, weight='length'
+    )
+    assert graph.shortest_path_lengths(10, cutoff=150) == {10: 0.0, 40: 111.3}
+
+
+def test_sizes():
+    graph = CompactGraph.from_graph(_default_graph())
+
+    assert graph.n_nodes == 4
+    assert graph.n_edges == 5
+    assert graph.nbytes == 460
+
+
+def test_save_load(tmpdir):
+    graph = CompactGraph.from_graph(_default_graph())
+    path = str(tmpdir.join('graph'))
+
+    graph.save(path)
+    loaded = CompactGraph.load(path)
+
+    assert isinstance(loaded.node_ids, np.memmap)
+    for name in CompactGraph.ARRAYS:
+        assert_array_equal(getattr(loaded, name), getattr(graph, name))
+    assert loaded.shortest_path_lengths(10) == graph.shortest_path_lengths(10)
@@ -0,0 +1,63 @@
+import dask.dataframe as dd
+from pandas import DataFrame
+from pymove.core.dataframe import MoveDataFrame
+from pymove.utils.constants import TYPE_DASK
+
+from pymove_osmnx.core.dask_matching import get_bbox, is_dask, match_dask
+from pymove_osmnx.core.map_matcher import MapMatcher
+
+dict_data = {
+    'id': [1, 1, 1, 2],
+    'lat': [-3.77905, -3.77999, -3.77830, -3.77999],
+    'lon': [-38.67910, -38.67940, -38.67820, -38.67940],
+    'datetime': [
+        '2008-06-12 12:00:50',
+        '2008-06-12 12:00:56',
+        '2008-06-12 12:01:01',
+        '2008-06-12 12:01:01',
+    ]
+}
+
+
+def _dask_move_df():
+    return MoveDataFrame(data=dict_data, type_=TYPE_DASK, n_partitions=2)
+
+
+def test_is_dask():
+    assert is_dask(_dask_move_df())
+    assert is_dask(dd.from_pandas(DataFrame(dict_data), npartitions=2))
+    assert not is_dask(MoveDataFrame(data=dict_data))
+
+
+def test_get_bbox():
+    assert get_bbox(_dask_move_df()) == (-3.77999, -38.6794, -3.7783, -38.6782)
+
+
+def test_match_dask(default_graph):
+    matcher = MapMatcher(default_graph)
+    move_df = _dask_move_df()
+
+    new_move_df = match_dask(matcher, move_df, 'nearest', inplace=False)
+    result = new_move_df.to_data_frame().compute()
+
+    assert list(result['edge']) == [(1, 2), (1, 4), (2, 3), (1, 4)]
+    assert 'edge' not in move_df.columns
+
+    matcher.match_nodes(move_df)
+    result = move_df.to_data_frame().compute()
+
+    assert list(result['lon']) == [-38.6790, -38.6790, -38.6780, -38.6790]
+
+    ddf = dd.from_pandas(DataFrame(dict_data), npartitions=2)
+    result = matcher.match_edges(ddf, method='hmm', radius=30).compute()
+
+    assert list(result['edge']) == [(1, 2), (1, 4), (2, 3), (1, 4)]
+
+
+def test_match_dask_keeps_partitions(default_graph):
+    matcher = MapMatcher(default_graph)
+    ddf = dd.from_pandas(DataFrame(dict_data), npartitions=2)
+
+    matcher.match_nodes(ddf).compute()
+
+    assert list(ddf['lat'].compute()) == dict_data['lat']
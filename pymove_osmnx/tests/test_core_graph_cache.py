@@ -0,0 +1,99 @@
+import os
+
+import osmnx as ox
+from networkx import MultiDiGraph
+from requests.exceptions import RequestException
+
+from pymove_osmnx.core.graph_cache import GraphCache, graph_from_file
+
+bbox = (-3.7780, -38.6780, -3.7800, -38.6800)
+
+
+def _default_graph():
+    G = MultiDiGraph(crs='epsg:4326')
+    G.add_node(1, x=-38.6800, y=-3.7800)
+    G.add_node(2, x=-38.6790, y=-3.7790)
+    G.add_node(3, x=-38.6780, y=-3.7780)
+    G.add_edge(1, 2, key=0, length=156.9)
+    G.add_edge(2, 3, key=0, length=156.9)
+    G.add_edge(2, 1, key=0, length=156.9)
+    return G
+
+
+def _graphml(tmpdir):
+    filepath = os.path.join(str(tmpdir), 'graph.graphml')
+    ox.save_graphml(_default_graph(), filepath)
+    return filepath
+
+
+def test_key(tmpdir):
+    cache = GraphCache(cache_folder=str(tmpdir))
+
+    assert cache.key(bbox) == cache.key(tuple(b + 1e-9 for b in bbox))
+    assert cache.key(bbox) != cache.key(bbox, network_type='drive')
+    assert cache.key(bbox) != cache.key(bbox, source='graph.graphml')
+
+
+def test_graph_from_file(tmpdir):
+    G = graph_from_file(_graphml(tmpdir))
+
+    assert sorted(G.nodes) == [1, 2, 3]
+    assert G.number_of_edges() == 3
+
+
+def test_get(tmpdir):
+    filepath = _graphml(tmpdir)
+    cache = GraphCache(cache_folder=os.path.join(str(tmpdir), 'cache'))
+
+    G = cache.get(bbox, filepath=filepath)
+
+    assert sorted(G.nodes) == [1, 2, 3]
+    assert len(cache.entries()) == 1
+
+    os.remove(filepath)
+    G = cache.get(bbox, filepath=filepath)
+    gdf_nodes, gdf_edges = cache.get_gdfs(bbox, filepath=filepath)
+
+    assert sorted(G.nodes) == [1, 2, 3]
+    assert list(gdf_nodes.index) == [1, 2, 3]
+    assert len(gdf_edges) == 3
+
+
+def test_evict(tmpdir):
+    filepath = _graphml(tmpdir)
+    cache = GraphCache(cache_folder=os.path.join(str(tmpdir), 'cache'))
+
+    cache.get(bbox, filepath=filepath)
+    cache.get(bbox, network_type='drive', filepath=filepath)
+    assert len(cache.entries()) == 2
+
+    cache.max_size = cache.size - 1
+    cache.evict()
+    assert len(cache.entries()) == 1
+
+    cache.clear()
+    assert cache.size == 0
+
+
+def test_get_fallback(tmpdir, monkeypatch):
+    calls = []
+
+    def offline(*args, **kwargs):
+        calls.append(args)
+        raise RequestException('offline')
+
+    monkeypatch.setattr(ox, 'graph_from_bbox', offline)
+    cache = GraphCache(
+        cache_folder=os.path.join(str(tmpdir), 'cache'), filepath=_graphml(tmpdir)
+    )
+
+    G = cache.get(bbox)
+    cache.get(bbox)
+
+    assert sorted(G.nodes) == [1, 2, 3]
+    assert len(calls) == 2
+    assert len(cache.entries()) == 1
+
+    monkeypatch.setattr(ox, 'graph_from_bbox', lambda *args, **kwargs: G)
+    cache.get(bbox)
+    assert len(cache.entries()) == 2
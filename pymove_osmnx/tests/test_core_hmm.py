@@ -0,0 +1,70 @@
+import numpy as np
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+
+from pymove_osmnx.core.hmm import (
+    emission_log_prob,
+    transition_cutoff,
+    transition_log_prob,
+    viterbi,
+)
+from pymove_osmnx.core.map_matcher import MapMatcher
+
+lat = [-3.78001, -3.77999, -3.77988, -3.78002, -3.77999]
+lon = [-38.6795, -38.6788, -38.6783, -38.6775, -38.6788]
+traj = [1, 1, 1, 1, 2]
+
+
+def test_emission_log_prob():
+    expected = [-2.323, -2.353, -5.341]
+
+    assert_array_almost_equal(
+        emission_log_prob(np.array([0, 1, 10]), sigma=4.07), expected, decimal=3
+    )
+
+
+def test_transition_log_prob():
+    expected = [-1.099, -4.432, -np.inf]
+
+    assert_array_almost_equal(
+        transition_log_prob(100, np.array([100, 110, np.inf]), beta=3.0),
+        expected,
+        decimal=3
+    )
+
+
+def test_viterbi(street_graph):
+    matcher = MapMatcher(street_graph)
+
+    edge, chosen = viterbi(matcher, lon, lat, traj, k=4, radius=30)
+    edges = list(zip(matcher.edge_u[edge], matcher.edge_v[edge], matcher.graph.edge_key[edge]))
+
+    assert edges == [(1, 2, 0), (2, 3, 0), (2, 3, 0), (3, 4, 0), (2, 3, 0)]
+    assert np.all(chosen >= 0)
+
+
+def test_viterbi_without_candidates(street_graph):
+    matcher = MapMatcher(street_graph)
+
+    edge, chosen = viterbi(matcher, [-38.6700], [-3.7700], [1], radius=30)
+
+    assert_array_equal(edge, [-1])
+    assert_array_equal(chosen, [-1])
+
+
+def test_viterbi_without_traj(street_graph):
+    matcher = MapMatcher(street_graph)
+
+    edge, _ = viterbi(matcher, lon[:4], lat[:4], k=4, radius=30)
+    expected, _ = viterbi(matcher, lon[:4], lat[:4], traj[:4], k=4, radius=30)
+
+    assert_array_equal(edge, expected)
+
+
+def test_viterbi_unsorted_times(street_graph):
+    matcher = MapMatcher(street_graph)
+
+    edge, _ = viterbi(matcher, lon[:2], lat[:2], k=4, radius=30, times=[10, 5])
+    expected, _ = viterbi(matcher, lon[:2], lat[:2], k=4, radius=30)
+
+    assert_array_equal(edge, expected)
+    assert_array_equal(transition_cutoff([10, 10], 5, [-1, 1], 2), [30, 2])
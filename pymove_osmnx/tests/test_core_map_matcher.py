@@ -0,0 +1,253 @@
+import pickle
+
+import numpy as np
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+from pandas import DataFrame
+from pymove.core.dataframe import MoveDataFrame
+from shapely.geometry import LineString
+from shapely.geometry.point import Point
+
+from pymove_osmnx.core import map_matcher, parallel
+from pymove_osmnx.core.map_matcher import MapMatcher
+
+dict_data = {
+    'id': [1, 1, 1],
+    'lat': [-3.77905, -3.77999, -3.77830],
+    'lon': [-38.67910, -38.67940, -38.67820],
+    'datetime': [
+        '2008-06-12 12:00:50',
+        '2008-06-12 12:00:56',
+        '2008-06-12 12:01:01',
+    ]
+}
+
+
+def test_nearest_nodes(default_graph):
+    matcher = MapMatcher(default_graph)
+
+    idx = matcher.nearest_nodes(dict_data['lon'], dict_data['lat'])
+
+    assert_array_equal(matcher.node_ids[idx], [2, 4, 3])
+
+
+def test_nearest_edges(default_graph):
+    matcher = MapMatcher(default_graph)
+
+    idx = matcher.nearest_edges(dict_data['lon'], dict_data['lat'])
+    edges = zip(matcher.edge_u[idx], matcher.edge_v[idx], matcher.graph.edge_key[idx])
+
+    assert list(edges) == [(1, 2, 0), (1, 4, 0), (2, 3, 0)]
+
+
+def test_match_nodes(default_graph):
+    matcher = MapMatcher(default_graph)
+    move_df = MoveDataFrame(data=dict_data)
+
+    new_move_df = matcher.match_nodes(move_df, inplace=False)
+
+    assert list(new_move_df['lat']) == [-3.7790, -3.7800, -3.7780]
+    assert list(new_move_df['lon']) == [-38.6790, -38.6790, -38.6780]
+    assert list(new_move_df['geometry']) == [
+        Point(-38.6790, -3.7790), Point(-38.6790, -3.7800), Point(-38.6780, -3.7780)
+    ]
+    assert list(move_df['lat']) == dict_data['lat']
+
+
+def test_match_nodes_data_frame(default_graph):
+    matcher = MapMatcher(default_graph)
+    df = DataFrame(dict_data)
+
+    new_df = matcher.match_nodes(df, inplace=False)
+    matcher.match_edges(df, inplace=False)
+
+    assert list(new_df['lat']) == [-3.7790, -3.7800, -3.7780]
+    assert list(df['lat']) == dict_data['lat']
+    assert list(df.columns) == list(dict_data)
+
+
+def test_match_edges(default_graph):
+    matcher = MapMatcher(default_graph)
+    move_df = MoveDataFrame(data=dict_data)
+
+    matcher.match_edges(move_df)
+
+    assert list(move_df['edge']) == [(1, 2), (1, 4), (2, 3)]
+    assert list(move_df['geometry']) == [
+        LineString([(-38.6800, -3.7800), (-38.6790, -3.7790)]),
+        LineString([(-38.6800, -3.7800), (-38.6790, -3.7800)]),
+        LineString([(-38.6790, -3.7790), (-38.6780, -3.7780)]),
+    ]
+    assert move_df.len() == 3
+
+
+def test_match_compact(default_graph):
+    matcher = MapMatcher(default_graph)
+    move_df = MoveDataFrame(data=dict_data)
+
+    nodes = matcher.match_nodes(move_df, inplace=False, compact=True)
+    edges = matcher.match_edges(move_df, inplace=False, compact=True)
+
+    assert 'geometry' not in nodes and 'geometry' not in edges
+    assert list(nodes['node']) == [2, 4, 3]
+    assert list(zip(edges['u'], edges['v'], edges['key'])) == [
+        (1, 2, 0), (1, 4, 0), (2, 3, 0)
+    ]
+    assert edges['u'].dtype == np.int64
+    assert_array_almost_equal(edges['edge_offset'], [0.925, 0.600, 0.750], decimal=3)
+
+
+def test_geometries(default_graph):
+    matcher = MapMatcher(default_graph)
+    move_df = MoveDataFrame(data=dict_data)
+    expected = matcher.match_edges(move_df, inplace=False)['geometry']
+
+    edges = matcher.match_edges(move_df, inplace=False, compact=True)
+    edges.loc[1, 'u'] = -1
+    nodes = matcher.match_nodes(move_df, inplace=False, compact=True)
+
+    assert list(matcher.geometries(edges)) == [expected[0], None, expected[2]]
+    assert list(matcher.geometries(nodes)) == [
+        Point(-38.6790, -3.7790), Point(-38.6790, -3.7800), Point(-38.6780, -3.7780)
+    ]
+    try:
+        matcher.geometries(move_df)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_match_edges_projection(default_graph):
+    matcher = MapMatcher(default_graph)
+    move_df = MoveDataFrame(data=dict_data)
+
+    matcher.match_edges(move_df)
+
+    assert_array_almost_equal(
+        move_df['snapped_lat'], [-3.779075, -3.780000, -3.778250], decimal=6
+    )
+    assert_array_almost_equal(
+        move_df['snapped_lon'], [-38.679075, -38.679400, -38.678250], decimal=6
+    )
+    assert_array_almost_equal(move_df['match_distance'], [3.927, 1.112, 7.854], decimal=3)
+    assert_array_almost_equal(move_df['edge_offset'], [0.925, 0.600, 0.750], decimal=3)
+
+
+def test_project(default_graph):
+    matcher = MapMatcher(default_graph)
+
+    dist, offset, snapped_x, snapped_y = matcher.project(
+        np.array([1, 1]), np.array([1, 0]), dict_data['lon'], dict_data['lat']
+    )
+
+    assert_array_almost_equal(dist, [1.112, 46.339], decimal=3)
+    assert_array_almost_equal(offset, [66.572, 47.809], decimal=3)
+    assert_array_almost_equal(snapped_x, [-38.6794, -38.67970], decimal=5)
+    assert_array_almost_equal(snapped_y, [-3.7800, -3.77970], decimal=5)
+
+
+def test_candidates(default_graph):
+    matcher = MapMatcher(default_graph)
+
+    point_idx, edge_idx, dist, offset = matcher.candidates(
+        dict_data['lon'], dict_data['lat'], k=2, radius=30
+    )
+
+    assert_array_equal(point_idx, [0, 0, 1, 2])
+    assert_array_equal(edge_idx, [0, 2, 1, 2])
+    assert np.all(dist <= 30)
+    assert np.all(np.diff(point_idx) >= 0)
+
+
+def test_candidates_batches(default_graph):
+    matcher = MapMatcher(default_graph)
+
+    expected = matcher.candidates(dict_data['lon'], dict_data['lat'], k=2, radius=30)
+    batched = matcher.candidates(
+        dict_data['lon'], dict_data['lat'], k=2, radius=30, batch_size=2
+    )
+    empty = matcher.candidates([], [])
+
+    for a, b in zip(expected, batched):
+        assert_array_equal(a, b)
+    assert all(len(a) == 0 for a in empty)
+
+
+def test_match_edges_hmm(default_graph):
+    matcher = MapMatcher(default_graph)
+    move_df = MoveDataFrame(data=dict_data)
+
+    matcher.match_edges(move_df, method='hmm', radius=30)
+
+    assert list(move_df['edge']) == [(1, 2), (1, 4), (2, 3)]
+
+    without_id = DataFrame({
+        'lat': dict_data['lat'], 'lon': dict_data['lon'], 'datetime': dict_data['datetime']
+    })
+    matched = matcher.match_edges(without_id, inplace=False, method='hmm', radius=30)
+    assert list(matched['edge']) == [(1, 2), (1, 4), (2, 3)]
+
+    try:
+        matcher.match_edges(move_df, method='viterbi')
+        assert False
+    except ValueError:
+        pass
+
+
+def test_save_load(tmpdir, default_graph):
+    matcher = MapMatcher(default_graph)
+    path = str(tmpdir.join('matcher'))
+
+    matcher.save(path)
+    loaded = MapMatcher.load(path)
+    unpickled = pickle.loads(pickle.dumps(loaded))
+
+    assert len(pickle.dumps(loaded)) < 200
+    in_memory = MapMatcher.load(path, mmap=False)
+    assert in_memory._edge_tree is not None and in_memory.path is None
+    for m in [loaded, unpickled, in_memory]:
+        assert isinstance(m._edge_points, np.memmap) != (m is in_memory)
+        assert_array_equal(
+            m.nearest_edges(dict_data['lon'], dict_data['lat']),
+            matcher.nearest_edges(dict_data['lon'], dict_data['lat'])
+        )
+        assert_array_equal(
+            m.nearest_nodes(dict_data['lon'], dict_data['lat']),
+            matcher.nearest_nodes(dict_data['lon'], dict_data['lat'])
+        )
+
+
+def test_load_saved_trees(tmpdir, monkeypatch, default_graph):
+    matcher = MapMatcher(default_graph)
+    path = str(tmpdir.join('matcher'))
+    matcher.save(path)
+
+    def build(*args, **kwargs):
+        raise AssertionError('the saved KD-trees must be read')
+
+    monkeypatch.setattr(map_matcher, 'cKDTree', build)
+    monkeypatch.setattr(parallel, '_matcher', None)
+    loaded = MapMatcher.load(path)
+    parallel._init_worker(pickle.loads(pickle.dumps(loaded)))
+
+    assert parallel._matcher._node_tree is not None
+    assert parallel._matcher._edge_tree is not None
+    assert_array_equal(
+        parallel._matcher.nearest_edges(dict_data['lon'], dict_data['lat']),
+        matcher.nearest_edges(dict_data['lon'], dict_data['lat'])
+    )
+
+
+def test_nearest_edges_precision(default_graph):
+    matcher = MapMatcher(default_graph, precision=1e-5)
+    lon = dict_data['lon'] + [-38.679101]
+    lat = dict_data['lat'] + [-3.779049]
+
+    idx = matcher.nearest_edges(lon, lat)
+    again = matcher.nearest_edges(lon, lat)
+    nodes = matcher.nearest_nodes(lon, lat)
+
+    assert_array_equal(idx, [0, 1, 2, 0])
+    assert_array_equal(again, idx)
+    assert_array_equal(matcher.node_ids[nodes], [2, 4, 3, 2])
+    assert matcher.edge_memo.misses == 3
+    assert matcher.edge_memo.hits == 5
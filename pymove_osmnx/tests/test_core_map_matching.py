@@ -1,10 +1,17 @@
+import numpy as np
 from pandas import DataFrame, Timestamp
 from pandas.testing import assert_frame_equal
 from pymove.core.dataframe import MoveDataFrame
 from shapely.geometry import LineString
 from shapely.geometry.point import Point
 
-from pymove_osmnx.core.map_matching_osmnx import map_matching_edge, map_matching_node
+from pymove_osmnx.core.map_matcher import MapMatcher
+from pymove_osmnx.core.map_matching_osmnx import (
+    candidate_edges,
+    map_matching_edge,
+    map_matching_node,
+)
+from pymove_osmnx.core.tile_store import TileStore
 
 dict_data = {
     'id':  [1, 1, 1, 1],
@@ -152,3 +159,41 @@ def test_map_matching_edge():
     assert_frame_equal(move_df, expected)
 
     assert move_df.len() == 4
+
+
+def test_map_matching_graph_path(tmpdir, diagonal_graph):
+    path = str(tmpdir.join('matcher'))
+    MapMatcher(diagonal_graph).save(path)
+
+    move_df = map_matching_node(
+        MoveDataFrame(data=dict_data), inplace=False, graph_path=path
+    )
+    move_df_edge = map_matching_edge(
+        MoveDataFrame(data=dict_data), inplace=False, graph_path=path
+    )
+
+    assert list(move_df['lat']) == [-3.7800, -3.7780, -3.7780, -3.7780]
+    assert all(e in [(1, 2), (2, 1)] for e in move_df_edge['edge'])
+
+
+def test_map_matching_tiles(tmpdir, diagonal_graph):
+    G = diagonal_graph
+    G.add_node(3, x=-38.5000, y=-3.5000)
+    G.add_edge(2, 3, key=0, length=28000.0)
+    tiles = TileStore.build(G, str(tmpdir), tile_size=0.01, margin=0.001)
+
+    move_df = map_matching_node(MoveDataFrame(data=dict_data), inplace=False, tiles=tiles)
+
+    assert list(move_df['lat']) == [-3.7800, -3.7780, -3.7780, -3.7780]
+    assert len(tiles) < len(tiles.codes)
+
+
+def test_candidate_edges(fork_graph):
+    point_idx, u, v, key, dist = candidate_edges(
+        MoveDataFrame(data=dict_data), G=fork_graph, k=2, radius=60
+    )
+
+    assert list(point_idx) == [0, 0, 1, 2, 3]
+    assert list(zip(u, v, key)) == [(1, 3, 0), (1, 2, 0), (1, 2, 0), (1, 2, 0), (1, 2, 0)]
+    assert np.all(dist[1:] <= 60)
+    assert dist[0] < dist[1]
@@ -0,0 +1,93 @@
+import pickle
+
+from numpy import array, nan
+from numpy.testing import assert_array_equal
+from pandas.testing import assert_frame_equal
+from pymove.core.dataframe import MoveDataFrame
+
+from pymove_osmnx.core.map_matcher import MapMatcher
+from pymove_osmnx.core.match_cache import MatchCache
+
+dict_data = {
+    'id': [1, 2, 1, 2, 1],
+    'lat': [-3.77905, -3.77905, -3.77999, -3.77999, -3.77830],
+    'lon': [-38.67910, -38.67910, -38.67940, -38.67940, -38.67820],
+    'datetime': [
+        '2008-06-12 12:00:50',
+        '2008-06-12 12:00:50',
+        '2008-06-12 12:00:56',
+        '2008-06-12 12:00:56',
+        '2008-06-12 12:01:01',
+    ]
+}
+
+
+def test_match(default_graph):
+    matcher = MapMatcher(default_graph)
+    cache = MatchCache()
+    X, Y = array(dict_data['lon']), array(dict_data['lat'])
+    traj = array(dict_data['id'])
+
+    idx = cache.match(matcher, 'nearest', X, Y, traj)
+
+    assert_array_equal(idx, matcher.nearest_edges(X, Y))
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert_array_equal(cache.match(matcher, 'nearest', X[::2], Y[::2], traj[::2]), idx[::2])
+    assert (cache.hits, cache.misses) == (1, 2)
+    cache.match(matcher, 'node', X, Y, traj)
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_match_missing_traj(default_graph):
+    matcher = MapMatcher(default_graph)
+    cache = MatchCache()
+    X, Y = array(dict_data['lon']), array(dict_data['lat'])
+    expected = matcher.nearest_edges(X, Y)
+
+    missing = cache.match(matcher, 'nearest', X, Y, array([nan] * 5))
+    mixed = cache.match(matcher, 'nearest', X, Y, array([1, nan, 1, nan, 1]))
+
+    assert_array_equal(missing, expected)
+    assert_array_equal(mixed, expected)
+    assert len(cache) == 3
+
+
+def test_match_edges(default_graph):
+    cache = MatchCache(max_entries=1)
+    matcher = MapMatcher(default_graph, results=cache)
+    move_df = MoveDataFrame(data=dict_data)
+
+    expected = MapMatcher(default_graph).match_edges(move_df, inplace=False)
+    matched = matcher.match_edges(move_df, inplace=False)
+    again = matcher.match_edges(move_df, inplace=False)
+
+    assert_frame_equal(matched, expected)
+    assert_frame_equal(again, expected)
+    assert len(cache) == 1
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert pickle.loads(pickle.dumps(matcher)).results is None
+
+
+def test_cache_folder(tmpdir, default_graph):
+    move_df = MoveDataFrame(data=dict_data)
+    cache = MatchCache(cache_folder=str(tmpdir))
+    MapMatcher(default_graph, results=cache).match_edges(
+        move_df, inplace=False, method='hmm'
+    )
+
+    reloaded = MatchCache(cache_folder=str(tmpdir), max_size=1)
+    matcher = MapMatcher(default_graph, results=reloaded)
+    matched = matcher.match_edges(move_df, inplace=False, method='hmm')
+    expected = MapMatcher(default_graph).match_edges(
+        move_df, inplace=False, method='hmm'
+    )
+
+    assert_frame_equal(matched, expected)
+    assert len(cache.entries()) == 2
+    assert (reloaded.hits, reloaded.misses) == (2, 0)
+    matcher.match_edges(move_df, inplace=False, method='hmm', sigma=10)
+    assert len(reloaded.entries()) == 1
+    reloaded.clear()
+    assert len(reloaded) == 0
+    assert reloaded.size == 0
@@ -0,0 +1,52 @@
+import numpy as np
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+
+from pymove_osmnx.core.memo import QuantizedMemo
+
+
+def _query(calls):
+    def query(X, Y):
+        calls.append((X, Y))
+        return np.rint(X * 1e5).astype(np.int64)
+    return query
+
+
+def test_get():
+    calls = []
+    memo = QuantizedMemo(precision=1e-5)
+
+    first = memo.get([-38.000011, -38.000012, -38.5], [-3.7, -3.7, -3.7], _query(calls))
+    second = memo.get([-38.000009, -38.5], [-3.7, -3.7], _query(calls))
+
+    assert_array_equal(first, [-3800001, -3800001, -3850000])
+    assert_array_equal(second, [-3800001, -3850000])
+    assert len(calls) == 1
+    assert_array_almost_equal(np.sort(calls[0][0]), [-38.5, -38.00001])
+    assert memo.hits == 3
+    assert memo.misses == 2
+    assert len(memo) == 2
+
+
+def test_max_size():
+    calls = []
+    memo = QuantizedMemo(precision=1, max_size=2)
+
+    memo.get([1, 2], [0, 0], _query(calls))
+    memo.get([1], [0], _query(calls))
+    memo.get([3], [0], _query(calls))
+    memo.get([1, 2], [0, 0], _query(calls))
+
+    assert len(memo) == 2
+    assert len(calls) == 3
+    assert_array_equal(calls[2][0], [2])
+
+
+def test_clear():
+    memo = QuantizedMemo(precision=1)
+
+    memo.get([1, 2], [0, 0], _query([]))
+    memo.clear()
+
+    assert len(memo) == 0
+    assert memo.hits == 0
+    assert memo.misses == 0
@@ -0,0 +1,81 @@
+from numpy import nan
+from numpy.testing import assert_array_equal
+from pandas import DataFrame
+from pymove.core.dataframe import MoveDataFrame
+
+from pymove_osmnx.core.map_matcher import MapMatcher
+from pymove_osmnx.core.parallel import match_positions
+
+lat = [-3.78001, -3.77999, -3.77988, -3.78002, -3.77999, -3.78001]
+lon = [-38.6795, -38.6788, -38.6783, -38.6775, -38.6788, -38.6795]
+traj = [1, 1, 1, 1, 2, 2]
+
+
+def test_match_positions(street_graph):
+    matcher = MapMatcher(street_graph)
+
+    for method in ['node', 'nearest', 'hmm']:
+        expected = match_positions(
+            matcher, method, lon, lat, traj=traj, kwargs={'radius': 30}
+        )
+        result = match_positions(
+            matcher, method, lon, lat, traj=traj, n_jobs=2, kwargs={'radius': 30}
+        )
+        assert_array_equal(result, expected)
+
+    result = match_positions(matcher, 'nearest', lon, lat, n_jobs=2)
+    assert_array_equal(result, matcher.nearest_edges(lon, lat))
+
+
+def test_match_edges_n_jobs(street_graph):
+    matcher = MapMatcher(street_graph)
+    move_df = MoveDataFrame(
+        data={
+            'id': traj,
+            'lat': lat,
+            'lon': lon,
+            'datetime': ['2008-06-12 12:00:%02d' % s for s in range(0, 60, 10)]
+        }
+    )
+
+    expected = matcher.match_edges(move_df, inplace=False, method='hmm', radius=30)
+    result = matcher.match_edges(
+        move_df, inplace=False, method='hmm', radius=30, n_jobs=2
+    )
+
+    assert list(result['edge']) == list(expected['edge'])
+    assert list(result['edge'])[:4] == [(1, 2), (2, 3), (2, 3), (3, 4)]
+
+
+def test_match_positions_missing_traj(street_graph):
+    matcher = MapMatcher(street_graph)
+    expected = matcher.nearest_edges(lon, lat)
+
+    missing = match_positions(matcher, 'nearest', lon, lat, traj=[nan] * 6, n_jobs=2)
+    mixed = match_positions(
+        matcher, 'nearest', lon, lat, traj=[1, nan, 1, nan, 2, 2], n_jobs=2
+    )
+
+    assert_array_equal(missing, expected)
+    assert_array_equal(mixed, expected)
+
+
+def test_match_edges_n_jobs_without_traj(street_graph):
+    matcher = MapMatcher(street_graph)
+    data = DataFrame({
+        'lat': lat,
+        'lon': lon,
+        'datetime': ['2008-06-12 12:00:%02d' % s for s in range(0, 60, 10)]
+    })
+
+    expected = matcher.match_edges(data, inplace=False, method='hmm', radius=30)
+    result = matcher.match_edges(
+        data, inplace=False, method='hmm', radius=30, n_jobs=2
+    )
+    serial = match_positions(matcher, 'hmm', lon, lat, kwargs={'radius': 30})
+
+    assert list(result['edge']) == list(expected['edge'])
+    assert_array_equal(
+        match_positions(matcher, 'hmm', lon, lat, n_jobs=2, kwargs={'radius': 30}),
+        serial
+    )
@@ -0,0 +1,91 @@
+import numpy as np
+from networkx import MultiDiGraph
+
+from pymove_osmnx.core.shortest_path import ShortestPathCache
+
+
+def _default_graph():
+    G = MultiDiGraph(crs='epsg:4326')
+    for n in range(1, 6):
+        G.add_node(n, x=-38.680 + n * 0.001, y=-3.780)
+    G.add_edge(1, 2, key=0, length=100.0)
+    G.add_edge(2, 3, key=0, length=100.0)
+    G.add_edge(3, 4, key=0, length=100.0)
+    G.add_edge(4, 5, key=0, length=100.0)
+    G.add_edge(1, 3, key=0, length=250.0)
+    return G
+
+
+def test_max_distance():
+    assert ShortestPathCache.max_distance(10, max_speed=20) == 200
+
+
+def test_lengths():
+    paths = ShortestPathCache(_default_graph())
+
+    assert paths.lengths(1, 250) == {1: 0, 2: 100.0, 3: 200.0}
+    assert paths.hits == 0
+    assert paths.misses == 1
+
+    assert paths.lengths(1, 150) == {1: 0, 2: 100.0, 3: 200.0}
+    assert paths.hits == 1
+
+    assert paths.lengths(1, 1000) == {1: 0, 2: 100.0, 3: 200.0, 4: 300.0, 5: 400.0}
+    assert paths.misses == 2
+    assert len(paths) == 1
+
+
+def test_distance():
+    paths = ShortestPathCache(_default_graph())
+
+    assert paths.distance(1, 4, 300) == 300.0
+    assert paths.distance(1, 4, 299) == np.inf
+    assert paths.distance(4, 1, 1000) == np.inf
+
+
+def test_evict():
+    paths = ShortestPathCache(_default_graph(), max_entries=2)
+
+    paths.lengths(1, 1000)
+    paths.lengths(2, 1000)
+    paths.lengths(1, 1000)
+    paths.lengths(3, 1000)
+
+    assert len(paths) == 2
+    assert paths.hits == 1
+    paths.lengths(1, 1000)
+    assert paths.hits == 2
+    paths.lengths(2, 1000)
+    assert paths.misses == 4
+
+    paths.max_bytes = 1
+    paths.lengths(4, 1000)
+    assert len(paths) == 1
+
+    paths.clear()
+    assert len(paths) == 0
+    assert paths.nbytes == 0
+
+
+def test_distances():
+    paths = ShortestPathCache(_default_graph())
+
+    distances = paths.distances([1, 1, 4, 1, 2], [4, 4, 1, 9, 3], [300, 299, 1000, 1000, 100])
+
+    assert list(distances) == [300.0, np.inf, np.inf, np.inf, 100.0]
+    assert paths.misses == 3
+    assert len(paths.distances([], [], 100)) == 0
+
+
+def test_distances_max_bytes():
+    paths = ShortestPathCache(_default_graph())
+    paths.lengths(1, 1000)
+    paths.lengths(2, 1000)
+    paths.max_bytes = paths.nbytes
+
+    distances = paths.distances([2], [4], 1000)
+
+    assert list(distances) == [200.0]
+    assert paths.nbytes <= paths.max_bytes
+    assert list(paths._entries) == [2]
+    assert list(paths._arrays) == [2]
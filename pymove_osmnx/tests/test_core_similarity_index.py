@@ -0,0 +1,112 @@
+import os
+
+from numpy import array, load
+from numpy.testing import assert_array_equal
+from pandas.testing import assert_frame_equal
+
+from pymove_osmnx.core.similarity_index import SimilarityIndex, edge_keys
+from pymove_osmnx.utils.similarity import MatchedTrajectories
+
+EDGES = array([[1, 2], [2, 3], [3, 4], [4, 5], [5, 6], [6, 7]])
+
+
+def _trajectories(ids, sequences, edges=EDGES):
+    traj = array([i for i, seq in enumerate(sequences) for _ in seq])
+    codes = array([code for seq in sequences for code in seq])
+    return MatchedTrajectories(
+        array(ids), traj, codes, array(range(len(codes))), edges
+    )
+
+
+def _default_index():
+    index = SimilarityIndex()
+    index.insert(_trajectories(
+        [10, 20, 30, 40],
+        [[0, 1, 2, 3, 4, 5], [0, 1, 2, 3, -1], [5, 4, 3], [-1, -1]]
+    ))
+    return index
+
+
+def test_edge_keys():
+    keys = edge_keys(EDGES)
+
+    assert_array_equal(edge_keys(EDGES[::-1]), keys[::-1])
+    assert len(set(keys.tolist())) == len(EDGES)
+    assert (keys >= 0).all()
+
+
+def test_query():
+    index = _default_index()
+    queries = _trajectories([10, 40], [[0, 1, 2, 3, 4, 5], [-1]])
+
+    result = index.query(queries, k=1)
+    with_self = index.query(queries, k=2, exclude_self=False)
+
+    assert len(index) == 4
+    assert result['ida'].tolist() == [10]
+    assert result['idb'].tolist() == [20]
+    assert result['similarity'].tolist() == [0.8]
+    assert with_self['idb'].tolist() == [10, 20]
+    assert with_self['similarity'].tolist() == [1.0, 0.8]
+
+
+def test_insert():
+    index = _default_index()
+    index.insert(_trajectories([50], [[5, 0, 1, 2, 3, 4]], EDGES[[1, 2, 3, 4, 5, 0]]))
+
+    result = index.query(_trajectories([10], [[0, 1, 2, 3, 4, 5]]), k=2)
+
+    assert len(index) == 5
+    assert result['idb'].tolist() == [50, 20]
+    assert result['similarity'].tolist() == [1.0, 0.8]
+
+
+def test_insert_segments():
+    sequences = [[0, 1, 2, 3, 4, 5], [0, 1, 2, 3, -1], [5, 4, 3], [-1, -1], [2, 3]]
+    index = SimilarityIndex()
+    for i, sequence in enumerate(sequences * 3):
+        index.insert(_trajectories([i], [sequence]))
+    expected = SimilarityIndex()
+    expected.insert(_trajectories(list(range(15)), sequences * 3))
+    queries = _trajectories([0, 4], [[0, 1, 2, 3, 4, 5], [2, 3, 4]])
+
+    assert len(index) == 15
+    assert len(index._segments) == 3
+    assert_frame_equal(index.query(queries, k=4), expected.query(queries, k=4))
+    index.flush()
+    assert index._segments == []
+    for name in SimilarityIndex.ARRAYS:
+        assert_array_equal(getattr(index, name), getattr(expected, name))
+
+
+def test_save_load(tmpdir):
+    index = _default_index()
+    queries = _trajectories([10, 20], [[0, 1, 2, 3, 4, 5], [0, 1, 2, 3]])
+    index.save(str(tmpdir))
+
+    loaded = SimilarityIndex.load(str(tmpdir))
+    expected = index.query(queries, k=2)
+
+    assert loaded.n_bands == 32
+    assert_frame_equal(loaded.query(queries, k=2), expected)
+    loaded.insert(_trajectories([50], [[0, 1, 2]]))
+    assert len(loaded) == 5
+    result = loaded.query(queries, k=2)
+    assert result['idb'].tolist()[:2] == [50, 20]
+    assert result['similarity'].tolist()[:2] == [1.0, 0.8]
+
+
+def test_save_load_string_ids(tmpdir):
+    index = SimilarityIndex()
+    index.insert(_trajectories(
+        array(['a', 'b', 'c'], dtype=object), [[0, 1, 2, 3], [0, 1, 2], [5, 4, 3]]
+    ))
+    queries = _trajectories(array(['a'], dtype=object), [[0, 1, 2, 3]])
+    index.save(str(tmpdir))
+
+    loaded = SimilarityIndex.load(str(tmpdir))
+
+    assert load(os.path.join(str(tmpdir), 'ids.npy'), mmap_mode='r').tolist() == [0, 1, 2]
+    assert loaded.ids.tolist() == ['a', 'b', 'c']
+    assert_frame_equal(loaded.query(queries, k=2), index.query(queries, k=2))
+    assert loaded.query(queries, k=1)['idb'].tolist() == ['b']
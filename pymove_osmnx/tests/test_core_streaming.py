@@ -0,0 +1,64 @@
+
+from pymove_osmnx.core.hmm import viterbi
+from pymove_osmnx.core.map_matcher import MapMatcher
+from pymove_osmnx.core.streaming import StreamingMatcher
+
+lat = [-3.78001, -3.77999, -3.77988, -3.78002]
+lon = [-38.6795, -38.6788, -38.6783, -38.6775]
+time = [0, 10, 20, 30]
+
+
+def test_add(street_graph):
+    streaming = StreamingMatcher(MapMatcher(street_graph), k=4, radius=30)
+
+    output = []
+    for i in range(len(lat)):
+        output.extend(streaming.add('car', lat[i], lon[i], time[i]))
+    output.extend(streaming.flush())
+
+    assert [o[1] for o in output] == [0, 1, 2, 3]
+    assert [o[3] for o in output] == [(1, 2), (2, 3), (2, 3), (3, 4)]
+    assert len(streaming) == 0
+
+
+def test_add_batch_matches_viterbi(street_graph):
+    matcher = MapMatcher(street_graph)
+    streaming = StreamingMatcher(matcher, k=4, radius=30)
+
+    output = streaming.add_batch(['a'] * 4 + ['b'] * 4, lat * 2, lon * 2, time * 2)
+    output.extend(streaming.flush())
+    edge, _ = viterbi(matcher, lon, lat, [1] * 4, k=4, radius=30, times=time)
+    expected = [(matcher.edge_u[e], matcher.edge_v[e]) for e in edge]
+
+    assert [o[3] for o in output if o[0] == 'a'] == expected
+    assert [o[3] for o in output if o[0] == 'b'] == expected
+
+
+def test_window(street_graph):
+    streaming = StreamingMatcher(MapMatcher(street_graph), window=2, k=4, radius=30)
+
+    for i in range(len(lat)):
+        streaming.add('car', lat[i], lon[i], time[i])
+        assert streaming.pending()['car'] <= 2
+
+
+def test_add_without_candidates(street_graph):
+    streaming = StreamingMatcher(MapMatcher(street_graph), radius=30)
+
+    output = streaming.add('car', -3.7700, -38.6700, 0)
+
+    assert output == [('car', 0, 0.0, None)]
+    assert streaming.pending() == {'car': 0}
+
+
+def test_add_without_candidates_after_pending(street_graph):
+    streaming = StreamingMatcher(MapMatcher(street_graph), k=4, radius=30)
+
+    output = streaming.add_batch(['car'] * 3, lat[:3], lon[:3], time[:3])
+    assert streaming.pending()['car'] > 0
+    output.extend(streaming.add('car', -3.7700, -38.6700, 30))
+    output.extend(streaming.add('car', lat[3], lon[3], 40))
+    output.extend(streaming.flush())
+
+    assert [o[1] for o in output] == [0, 1, 2, 3, 4]
+    assert [o[3] for o in output] == [(1, 2), (2, 3), (2, 3), None, (3, 4)]
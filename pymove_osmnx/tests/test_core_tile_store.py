@@ -0,0 +1,75 @@
+from networkx import MultiDiGraph
+from numpy.testing import assert_array_equal
+from shapely.geometry import LineString
+
+from pymove_osmnx.core.tile_store import TileStore
+
+
+def _default_graph():
+    G = MultiDiGraph(crs='epsg:4326')
+    for n in range(5):
+        G.add_node(n + 1, x=-38.675 + n * 0.01, y=-3.785)
+    for n in range(1, 5):
+        G.add_edge(n, n + 1, key=0, length=1112.0)
+        G.add_edge(n + 1, n, key=0, length=1112.0)
+    G.add_node(6, x=-38.675, y=-3.745)
+    G.add_edge(1, 6, key=0, length=4500.0, geometry=LineString(
+        [(-38.675, -3.785), (-38.665, -3.765), (-38.675, -3.745)]
+    ))
+    return G
+
+
+def test_build(tmpdir):
+    store = TileStore.build(_default_graph(), str(tmpdir), tile_size=0.02)
+
+    assert len(store.codes) == 5
+    assert len(store) == 0
+
+
+def test_graph(tmpdir):
+    store = TileStore.build(
+        _default_graph(), str(tmpdir), tile_size=0.02, margin=0.001
+    )
+
+    graph = store.graph([-38.6745], [-3.7845])
+    far = store.graph([-38.669], [-3.765])
+
+    assert_array_equal(graph.node_ids, [1, 2, 3, 6])
+    assert sorted(zip(graph.edge_u, graph.edge_v)) == [
+        (1, 2), (1, 6), (2, 1), (2, 3), (3, 2)
+    ]
+    assert_array_equal(far.node_ids, [1, 6])
+    assert list(zip(far.edge_u, far.edge_v)) == [(1, 6)]
+    try:
+        store.graph([0.0], [0.0])
+        assert False
+    except ValueError:
+        pass
+
+
+def test_stitch_all(tmpdir):
+    G = _default_graph()
+    store = TileStore.build(G, str(tmpdir), tile_size=0.02)
+
+    graph = store.stitch(store.codes)
+
+    assert sorted(zip(graph.edge_u, graph.edge_v)) == sorted(
+        (u, v) for u, v in G.edges()
+    )
+    assert graph.shortest_path_lengths(1) == {
+        1: 0.0, 2: 1112.0, 3: 2224.0, 4: 3336.0, 5: 4448.0, 6: 4500.0
+    }
+
+
+def test_evict(tmpdir):
+    store = TileStore.build(
+        _default_graph(), str(tmpdir), tile_size=0.02, margin=0.001, max_bytes=1
+    )
+
+    store.graph([-38.6745, -38.669], [-3.7845, -3.765])
+    store.tile(store.codes[0])
+
+    assert len(store) == 1
+    assert store.misses == 3
+    assert store.nbytes == store.tile(store.codes[0]).nbytes
+    assert store.hits == 1
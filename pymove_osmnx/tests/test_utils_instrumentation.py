@@ -0,0 +1,79 @@
+import numpy as np
+from pymove.core.dataframe import MoveDataFrame
+
+from pymove_osmnx.core.map_matching_osmnx import map_matching_edge
+from pymove_osmnx.utils.instrumentation import (
+    Recorder,
+    add_callback,
+    instrument,
+    remove_callback,
+    stage,
+)
+
+dict_data = {
+    'id': [1, 1, 1],
+    'lat': [-3.77905, -3.77999, -3.77830],
+    'lon': [-38.67910, -38.67940, -38.67820],
+    'datetime': [
+        '2008-06-12 12:00:50',
+        '2008-06-12 12:00:56',
+        '2008-06-12 12:01:01',
+    ]
+}
+
+
+def test_stage():
+    records = []
+
+    with stage('ignored'):
+        pass
+    add_callback(records.append)
+    try:
+        with stage('outer', 10) as outer:
+            with stage('inner'):
+                pass
+            outer['rows'] = 20
+    finally:
+        remove_callback(records.append)
+    with stage('ignored'):
+        pass
+
+    assert [r['stage'] for r in records] == ['outer.inner', 'outer']
+    assert [r['rows'] for r in records] == [None, 20]
+    assert records[1]['seconds'] >= records[0]['seconds'] >= 0
+    assert records[1]['peak_memory'] is None
+
+
+def test_instrument():
+    @instrument('double')
+    def double(values):
+        return values * 2
+
+    with Recorder(memory=True) as recorder:
+        double(np.zeros(1000))
+    records = recorder.to_data_frame()
+
+    assert records['stage'].tolist() == ['double']
+    assert records['rows'].tolist() == [1000]
+    assert records['peak_memory'][0] >= 8000
+    assert double(np.ones(1))[0] == 2
+
+
+def test_recorder_map_matching(default_graph):
+    move_df = MoveDataFrame(data=dict_data)
+
+    with Recorder() as recorder:
+        map_matching_edge(move_df, inplace=False, G=default_graph)
+    records = recorder.to_data_frame()
+
+    assert records['stage'].tolist() == [
+        'map_matching_edge.graph',
+        'map_matching_edge.compact_graph',
+        'map_matching_edge.match_edges.query.edge_index',
+        'map_matching_edge.match_edges.query',
+        'map_matching_edge.match_edges.project',
+        'map_matching_edge.match_edges.assign',
+        'map_matching_edge.match_edges',
+        'map_matching_edge',
+    ]
+    assert records['rows'].tolist()[-3:] == [3, 3, 3]
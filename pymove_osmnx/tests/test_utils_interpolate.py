@@ -3,6 +3,8 @@ from pandas import DataFrame, Timestamp
 from pandas.testing import assert_frame_equal
 from pymove.core.dataframe import MoveDataFrame
 
+from pymove_osmnx.core.compact_graph import CompactGraph
+from pymove_osmnx.core.shortest_path import ShortestPathCache
 from pymove_osmnx.utils.interpolate import (
     check_time_dist,
     feature_values_using_filter,
@@ -102,11 +104,54 @@ def test_generate_distances():
     assert len(move_distances) == 5
 
 def test_check_time_dist():
-    try:
-        print(generate_distances(move_df))
-        check_time_dist(generate_distances(move_df), index_name = 'id')
-    except ValueError:
-        assert False
+    move_distances = move_df.copy()
+    move_distances['distFromTrajStartToCurrPoint'] = [
+        0.0, 0.0, 70.121, 139.261, 393.27
+    ]
+
+    report = check_time_dist(move_distances, index_name='id')
+    expected = DataFrame(
+        data=[['1', 'distance_order', 1, 1]],
+        columns=['id', 'rule', 'count', 'first']
+    )
+
+    assert_frame_equal(report, expected)
+    assert check_time_dist(move_distances.iloc[1:], index_name='id').empty
+
+def test_check_time_dist_report():
+    move_data = DataFrame(
+        data={
+            'tid': ['a', 'a', 'a', 'b', 'b', 'b', 'c', 'c'],
+            'datetime': [
+                Timestamp('2008-06-04 09:04:59'),
+                Timestamp('2008-06-04 09:05:09'),
+                Timestamp('2008-06-04 09:05:04'),
+                Timestamp('2008-06-04 09:04:59'),
+                Timestamp('2008-06-04 09:24:59'),
+                None,
+                Timestamp('2008-06-04 09:04:59'),
+                Timestamp('2008-06-04 09:05:09'),
+            ],
+            'distFromTrajStartToCurrPoint': [0, 100, 100, 0, 6000, 7000, 0, 500],
+        },
+        index=range(10, 18)
+    )
+
+    report = check_time_dist(move_data)
+    expected = DataFrame(
+        data=[
+            ['a', 'distance_order', 1, 12],
+            ['a', 'time_order', 1, 12],
+            ['b', 'distance_gap', 1, 14],
+            ['b', 'time_gap', 1, 14],
+            ['c', 'speed', 1, 17],
+        ],
+        columns=['tid', 'rule', 'count', 'first']
+    )
+
+    assert_frame_equal(report, expected)
+    assert len(check_time_dist(move_data, tids=['a'], max_speed=100)) == 2
+    assert len(check_time_dist(move_data.set_index('tid'), tids=['c'])) == 1
 
 def test_fix_time_not_in_ascending_order_id():
     time_ascending = generate_distances(move_df)
@@ -125,3 +170,57 @@ def test_fix_time_not_in_ascending_order_all():
     )
     times = time_ascending['datetime'].values
     assert np.all(times[1:] > times[:-1])
+
+def test_generate_distances_with_paths(line_graph):
+    move_df_nodes = MoveDataFrame(
+        data=[
+            [-3.780, -38.679, '2008-06-04 09:04:59', '1'],
+            [-3.780, -38.678, '2008-06-04 09:05:59', '1'],
+            [-3.780, -38.676, '2008-06-04 09:06:59', '1'],
+        ]
+    )
+
+    move_distances = generate_distances(
+        move_df_nodes, paths=ShortestPathCache(line_graph)
+    )
+
+    assert list(move_distances['edgeDistance']) == [0.0, 100.0, 200.0]
+    assert list(move_distances['distFromTrajStartToCurrPoint']) == [0.0, 100.0, 300.0]
+
+
+def test_generate_distances_with_offsets(line_graph):
+    move_df = MoveDataFrame(
+        data=[
+            [-3.780, -38.67875, '2008-06-04 09:04:59', '1'],
+            [-3.780, -38.67825, '2008-06-04 09:05:59', '1'],
+            [-3.780, -38.67750, '2008-06-04 09:06:59', '1'],
+            [-3.780, -38.67850, '2008-06-04 09:07:59', '1'],
+            [-3.780, -38.67650, '2008-06-04 09:08:59', '1'],
+        ]
+    )
+    move_df['edge'] = [(1, 2), (1, 2), (2, 3), (1, 2), (3, 4)]
+    move_df['edge_offset'] = [0.25, 0.75, 0.5, 0.5, 0.5]
+
+    move_distances = generate_distances(move_df, paths=ShortestPathCache(line_graph))
+
+    assert list(move_distances['edgeDistance']) == [0.0, 50.0, 75.0, 0.0, 200.0]
+    assert list(move_distances['distFromTrajStartToCurrPoint']) == [
+        0.0, 50.0, 125.0, 125.0, 325.0
+    ]
+
+
+def test_generate_distances_with_graph(line_graph):
+    move_df_nodes = MoveDataFrame(
+        data=[
+            [-3.780, -38.679, '2008-06-04 09:04:59', '1'],
+            [-3.780, -38.678, '2008-06-04 09:05:59', '1'],
+            [-3.780, -38.676, '2008-06-04 09:06:59', '1'],
+        ]
+    )
+
+    move_distances = generate_distances(
+        move_df_nodes, G=CompactGraph.from_graph(line_graph)
+    )
+
+    assert list(move_distances['edgeDistance']) == [0.0, 100.0, 100.0]
+    assert list(move_distances['distFromTrajStartToCurrPoint']) == [0.0, 100.0, 100.0]
@@ -1,9 +1,25 @@
+from networkx import MultiDiGraph
+from numpy import array, inf
+from numpy.testing import assert_array_almost_equal, assert_array_equal
 from pandas import DataFrame, Timestamp
 from pandas.testing import assert_frame_equal
 from pymove.core.dataframe import MoveDataFrame
 from pymove.utils.constants import DATETIME, LATITUDE, LONGITUDE, TRAJ_ID
 
-from pymove_osmnx.utils.similarity import generate_lcss
+from pymove_osmnx.core.map_matcher import MapMatcher
+from pymove_osmnx.utils.similarity import (
+    MatchedTrajectories,
+    band_windows,
+    dtw,
+    edge_distances,
+    edr,
+    frechet,
+    generate_lcss,
+    lcss,
+    lcss_length,
+    similarity_matrix,
+    trajectory_distance,
+)
 
 list_data = [
     [-3.83613, -38.49421, '2019-06-05 06:57:42', 1],
@@ -104,3 +120,166 @@ def test_lcss():
 
     assert_frame_equal(move_lcss, expected)
     assert len(move_lcss) == 4
+
+
+def _default_graph():
+    G = MultiDiGraph(crs='epsg:4326')
+    for n in range(4):
+        G.add_node(n + 1, x=-38.680 + n * 0.001, y=-3.780)
+    for n in range(1, 4):
+        G.add_edge(n, n + 1, key=0, length=111.0)
+    return G
+
+
+def test_band_windows():
+    first, last = band_windows(4, 8, band=1)
+
+    assert_array_equal(first, [0, 0, 1, 3, 5])
+    assert_array_equal(last, [1, 3, 5, 7, 8])
+    assert_array_equal(band_windows(2, 3)[1], [3, 3, 3])
+
+
+def test_lcss_function():
+    idx1, idx2 = lcss([1, 2, 3, 4, -1], [1, 3, 4, 2, -1])
+    times, _ = lcss([1, 3, 4], [1, 3, 4], [0, 10, 20], [0, 100, 20], tolerance=30)
+    banded, _ = lcss([1, 2, 3, 4, 5, 6], [6, 1, 2, 3, 4, 5], band=1)
+    skewed = lcss([5, 5, 5, 5, 5, 5, 1, 5], [1, 2], band=1)
+
+    assert_array_equal(idx1, [0, 2, 3])
+    assert_array_equal(idx2, [0, 1, 2])
+    assert_array_equal(times, [0, 2])
+    assert_array_equal(banded, [0, 1, 2, 3, 4])
+    assert_array_equal(skewed, [[6], [0]])
+    assert len(lcss([], [1])[0]) == 0
+
+
+def test_lcss_length():
+    assert lcss_length([1, 2, 3, 4, -1], [1, 3, 4, 2, -1]) == 3
+    assert lcss_length([1, 3, 4], [1, 3, 4], [0, 10, 20], [0, 100, 20], 30) == 2
+    assert lcss_length([5, 5, 5, 5, 5, 5, 1, 5], [1, 2], band=1) == 1
+    assert lcss_length([1, 2, 3, 4, 5, 6], [6, 1, 2, 3, 4, 5], band=1) == 5
+    assert lcss_length(list(range(40)), list(range(4, 44)), band=2) == 0
+    assert lcss_length(list(range(40)), list(range(3, 43)), band=2) == 37
+    assert lcss_length([], [1]) == 0
+    assert lcss_length([1, 2, 3], [1, 2, 3], minimum=3) == 3
+    assert lcss_length([1, 2, 3], [3, 2, 1], minimum=2) < 2
+
+
+def test_generate_lcss_graph():
+    data_1 = [
+        [-3.7801, -38.6795, '2019-06-05 07:00:00', 1],
+        [-3.7801, -38.6785, '2019-06-05 07:00:10', 1],
+        [-3.7801, -38.6775, '2019-06-05 07:00:20', 1],
+    ]
+    data_2 = [
+        [-3.7799, -38.6795, '2019-06-05 07:00:05', 2],
+        [-3.7799, -38.6775, '2019-06-05 07:02:00', 2],
+    ]
+    move_df = MoveDataFrame(data=data_1)
+    move_df_2 = MoveDataFrame(data=data_2)
+
+    move_lcss = generate_lcss(move_df, move_df_2, 60, G=_default_graph())
+
+    assert move_lcss['ida'].tolist() == [1]
+    assert move_lcss['idb'].tolist() == [2]
+    assert move_lcss['difference'].tolist() == [5]
+    assert move_lcss['edge'].tolist() == [[1, 2]]
+    assert generate_lcss(move_df, move_df_2, 1, G=_default_graph()) is None
+
+
+matrix_data = [
+    [-3.7801, -38.6795, '2019-06-05 07:00:00', 1],
+    [-3.7801, -38.6785, '2019-06-05 07:00:10', 1],
+    [-3.7801, -38.6775, '2019-06-05 07:00:20', 1],
+    [-3.7799, -38.6795, '2019-06-05 07:00:05', 2],
+    [-3.7799, -38.6775, '2019-06-05 07:02:00', 2],
+    [-3.7801, -38.6775, '2019-06-05 07:00:00', 3],
+    [-3.7801, -38.6785, '2019-06-05 07:00:10', 3],
+]
+
+
+def test_similarity_matrix():
+    move_df = MoveDataFrame(data=matrix_data)
+
+    matrix = similarity_matrix(move_df, G=_default_graph())
+    timed = similarity_matrix(move_df, 60, G=_default_graph(), n_jobs=2)
+    top = similarity_matrix(move_df, G=_default_graph(), top_k=1)
+    pruned = similarity_matrix(move_df, G=_default_graph(), threshold=0.6)
+
+    expected = DataFrame(
+        [[1.0, 1.0, 0.5], [1.0, 1.0, 0.5], [0.5, 0.5, 1.0]],
+        index=[1, 2, 3],
+        columns=[1, 2, 3],
+    )
+    assert_frame_equal(matrix, expected)
+    assert timed.values.tolist() == [[1.0, 0.5, 0.5], [0.5, 1.0, 0.0], [0.5, 0.0, 1.0]]
+    assert top['ida'].tolist() == [1, 2, 3]
+    assert top['idb'].tolist() == [2, 1, 1]
+    assert top['similarity'].tolist() == [1.0, 1.0, 0.5]
+    assert pruned.values.tolist() == [[1.0, 1.0, 0.0], [1.0, 1.0, 0.0], [0.0, 0.0, 1.0]]
+    top = similarity_matrix(
+        move_df, G=_default_graph(), top_k=2, n_jobs=2, threshold=0.6
+    )
+    assert top['idb'].tolist() == [2, 3, 1, 3, 1, 2]
+    assert top['similarity'].tolist() == [1.0, 0.0, 1.0, 0.0, 0.0, 0.0]
+
+    trajectories = MatchedTrajectories.from_move_data(move_df, G=_default_graph())
+    assert_frame_equal(similarity_matrix(trajectories), expected)
+
+    sparse = MatchedTrajectories(
+        array([1, 2]),
+        array([0, 0, 1]),
+        array([5, 0, 5]),
+        array([0, 1, 2]),
+        array([[1, 2], [2, 3]] * 3)
+    )
+    assert similarity_matrix(sparse).values.tolist() == [[1.0, 1.0], [1.0, 1.0]]
+
+
+def test_measures():
+    cost = [[0, 1, 5], [1, 0, 2], [5, 2, 0]]
+
+    assert dtw([0, 1, 2], [0, 2], cost) == 1
+    assert dtw([0, 1, 2], [0, 2], cost, maximum=0.5) == inf
+    assert dtw([0, 1, 2, 2, 2, 2], [0, 0, 0, 0, 1, 2], cost) == 0
+    assert dtw([0, 1, 2, 2, 2, 2], [0, 0, 0, 0, 1, 2], cost, band=1) == 8
+    assert frechet([0, 1, 2, 2, 2, 2], [0, 0, 0, 0, 1, 2], cost, band=1) == 5
+    assert dtw([], [0], cost) == inf
+    assert frechet([0, 1, 2], [0, 2], cost) == 1
+    assert frechet([0, 0, 0], [2, 2], cost) == 5
+    assert frechet([0, 0, 0], [2, 2], cost, maximum=4) == inf
+    assert edr([0, 1, 2], [0, 2], cost, 0.5) == 1
+    assert edr([0, 1, 2], [2, 1, 0], cost, 1) == 2
+    assert edr([0, 1, 2], [2, 1, 0], cost, 1, maximum=1) == inf
+    assert edr([], [0, 1], cost, 1) == 2
+
+
+def test_edge_distances():
+    matcher = MapMatcher(_default_graph())
+
+    assert_array_almost_equal(
+        edge_distances(matcher, [[1, 2]], [[1, 2], [2, 3], [3, 4]]),
+        [[0, 0, 111]]
+    )
+    assert_array_almost_equal(edge_distances(matcher, [[3, 4]], [[1, 2]], 100), [[100]])
+
+
+def test_trajectory_distance():
+    move_df = MoveDataFrame(data=matrix_data)
+    trajectories = MatchedTrajectories.from_move_data(move_df, G=_default_graph())
+
+    assert trajectory_distance(trajectories, 1, 3) == 111
+    assert trajectory_distance(trajectories, 1, 3, 'frechet') == 111
+    assert trajectory_distance(trajectories, 1, 3, 'edr') == 1
+    assert trajectory_distance(trajectories, 1, 2, 'edr', epsilon=0, band=0) == 1
+    assert trajectory_distance(trajectories, 1, 3, maximum=100) == inf
+    try:
+        trajectory_distance(trajectories, 1, 3, 'lcss')
+        assert False
+    except ValueError:
+        pass
+    try:
+        trajectory_distance(trajectories, 1, 4)
+        assert False
+    except KeyError:
+        pass
@@ -0,0 +1,205 @@
+"""
+Timing and memory instrumentation of the processing stages.
+
+The functions of the library run their stages inside stage blocks. When a
+callback is registered, each stage sends it a record with its name, wall
+time, rows processed and, if requested, peak memory. The names of nested
+stages are joined with dots, as in 'map_matching_edge.match_edges.query'.
+Without callbacks a stage only costs a function call. Stages run in worker
+processes are not reported.
+"""
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, Optional, Text
+
+import numpy as np
+from pandas.core.frame import DataFrame
+
+_callbacks = []
+_stack = []
+_tracing = {'memory': 0, 'started': False}
+
+
+def add_callback(
+    callback: Callable[[Dict], None],
+    memory: Optional[bool] = False
+):
+    """
+    Registers a function receiving the record of every stage.
+
+    Parameters
+    ----------
+    callback : callable
+        Receives a dict with the stage name, the seconds it took, the rows
+        processed or None and the peak memory in bytes or None
+    memory : bool, optional
+        Whether to trace the peak memory of the stages with tracemalloc,
+        which slows down the processing, by default False
+
+    """
+    _callbacks.append((callback, memory))
+    if memory:
+        _tracing['memory'] += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing['started'] = True
+
+
+def remove_callback(callback: Callable[[Dict], None]):
+    """
+    Unregisters a callback added with add_callback.
+
+    Parameters
+    ----------
+    callback : callable
+        The callback
+
+    """
+    for i, (registered, memory) in enumerate(_callbacks):
+        if registered == callback:
+            del _callbacks[i]
+            if memory:
+                _tracing['memory'] -= 1
+                if _tracing['memory'] == 0 and _tracing['started']:
+                    tracemalloc.stop()
+                    _tracing['started'] = False
+            return
+
+
+def count_rows(data) -> Optional[int]:
+    """Returns the number of rows of in memory data, None for other objects."""
+    if isinstance(data, (DataFrame, np.ndarray, list)):
+        return len(data)
+    return None
+
+
+@contextmanager
+def stage(name: Text, rows: Optional[int] = None) -> Iterator[Dict]:
+    """
+    Measures a block of code as a stage.
+
+    Parameters
+    ----------
+    name : str
+        The name of the stage
+    rows : int, optional
+        Number of rows processed, may be set later in the yielded record,
+        by default None
+
+    Returns
+    -------
+    iterator
+        Yields the record of the stage
+
+    """
+    record = {'stage': name, 'seconds': None, 'rows': rows, 'peak_memory': None}
+    if not _callbacks:
+        yield record
+        return
+
+    memory = _tracing['memory'] > 0 and tracemalloc.is_tracing()
+    if _stack:
+        record['stage'] = _stack[-1]['stage'] + '.' + name
+    frame = {'stage': record['stage'], 'peak': 0, 'start': 0}
+    if memory:
+        frame['start'], peak = tracemalloc.get_traced_memory()
+        if _stack:
+            _stack[-1]['peak'] = max(_stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+    _stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        _stack.pop()
+        if memory:
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            record['peak_memory'] = peak - frame['start']
+            if _stack:
+                _stack[-1]['peak'] = max(_stack[-1]['peak'], peak)
+        for callback, _ in list(_callbacks):
+            callback(record)
+
+
+def instrument(name: Optional[Text] = None) -> Callable:
+    """
+    Decorates a function to run it as a stage.
+
+    The rows processed are those of the first DataFrame, array or list
+    argument.
+
+    Parameters
+    ----------
+    name : str, optional
+        The name of the stage, by default None, the name of the function
+
+    Returns
+    -------
+    callable
+        The decorator
+
+    """
+    def decorator(func: Callable) -> Callable:
+        stage_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _callbacks:
+                return func(*args, **kwargs)
+            rows = next(
+                (n for n in map(count_rows, args) if n is not None), None
+            )
+            with stage(stage_name, rows):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Recorder:
+    """
+    Context manager collecting the records of the stages run inside it.
+
+    Parameters
+    ----------
+    memory : bool, optional
+        Whether to trace the peak memory of the stages, by default False
+
+    Examples
+    --------
+    >>> with Recorder() as recorder:
+    ...     map_matching_edge(move_df, G=G)
+    >>> recorder.to_data_frame()
+
+    """
+
+    def __init__(self, memory: Optional[bool] = False):
+        self.memory = memory
+        self.records = []
+
+    def __call__(self, record: Dict):
+        self.records.append(record)
+
+    def __enter__(self) -> 'Recorder':
+        add_callback(self, memory=self.memory)
+        return self
+
+    def __exit__(self, *args):
+        remove_callback(self)
+
+    def to_data_frame(self) -> DataFrame:
+        """
+        Returns the records in the order the stages ended.
+
+        Returns
+        -------
+        DataFrame
+            A row per stage, with the stage, seconds, rows and peak_memory
+            columns
+
+        """
+        return DataFrame(
+            self.records, columns=['stage', 'seconds', 'rows', 'peak_memory']
+        )
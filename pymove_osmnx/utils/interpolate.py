@@ -1,20 +1,27 @@
 import time
-from typing import Optional, Text
+from typing import Optional, Text, Tuple, Union
 
 import numpy as np
 import osmnx as ox
-from pandas import DataFrame, Timestamp
+from networkx import MultiDiGraph
+from pandas import DataFrame, Timestamp, factorize
 from pymove.utils.constants import TID
 from pymove.utils.log import progress_bar
 from pymove.utils.trajectories import shift
 from scipy.interpolate import interp1d
+from scipy.spatial import cKDTree
 
+from pymove_osmnx.core.compact_graph import CompactGraph
+from pymove_osmnx.core.shortest_path import ShortestPathCache
+from pymove_osmnx.core.tile_store import TileStore
+from pymove_osmnx.utils.instrumentation import instrument, stage
 from pymove_osmnx.utils.transformation import (
     feature_values_using_filter,
     feature_values_using_filter_and_indexes,
 )
 
 
+@instrument()
 def check_time_dist(
     move_data: DataFrame,
     index_name: Optional[Text] = TID,
@@ -22,102 +29,93 @@ def check_time_dist(
     max_dist_between_adj_points: Optional[float] = 5000,
     max_time_between_adj_points: Optional[float] = 900,
     max_speed: Optional[float] = 30
-):
+) -> DataFrame:
     """
     Used to verify that the trajectories points are in the correct order after
     map matching, considering time and distance.
 
+    The points with a datetime are checked against the next point of the same
+    trajectory, in the order of the rows, all trajectories at once. Every
+    violation is reported instead of stopping at the first one.
+
     Parameters
     ----------
     move_data : dataframe
      The input trajectories data
     index_name: str, optional
-     The name of the column to set as the new index during function execution,
-     by default TID
+     The name of the column identifying the trajectories, which may also be
+     the index, by default TID
     tids: array, optional
-     The list of the unique keys of the index_name column, by default None
+     The list of the unique keys of the index_name column to check,
+     by default None, all trajectories
     max_dist_between_adj_points: float, optional
      The maximum distance between two adjacent points, by default 5000
     max_time_between_adj_points: float, optional
-     The maximum time interval between two adjacent points, by default 900
+     The maximum time interval in seconds between two adjacent points,
+     by default 900
     max_speed: float, optional
      The maximum speed between two adjacent points, by default 30
 
-    Raises
-    ------
-    ValueError
-        if the data is not in order
-    """
-    if move_data.index.name is not None:
-        print('reseting index...')
-        move_data.reset_index(inplace=True)
-
-    if tids is None:
-        tids = move_data[index_name].unique()
-
-    if move_data.index.name is None:
-        print('creating index...')
-        move_data.set_index(index_name, inplace=True)
-
-    move_data['isNone'] = move_data['datetime'].isnull()
-
-    for tid in progress_bar(
-        tids, desc='checking ascending distance and time'
-    ):
-        filter_ = move_data.at[tid, 'isNone']
-
-        # be sure that distances are in ascending order
-        dists = move_data.at[tid, 'distFromTrajStartToCurrPoint'][filter_]
-        if not np.all(dists[:-1] < dists[1:]):
-            raise ValueError('distance feature is not in ascending order')
-
-        # be sure that times are in ascending order
-        times = move_data.at[tid, 'datetime'][filter_].astype(int)
-        if not np.all(times[:-1] < times[1:]):
-            raise ValueError('time feature is not in ascending order')
-
-    count = 0
-
-    for tid in progress_bar(
-        tids, desc='checking delta_times, delta_dists and speeds'
-    ):
-        filter_ = move_data.at[tid, 'isNone']
-
-        dists = move_data.at[tid, 'distFromTrajStartToCurrPoint'][filter_]
-        delta_dists = (shift(dists, -1) - dists)[
-            :-1
-        ]
-
-        if not np.all(delta_dists <= max_dist_between_adj_points):
-            raise ValueError(
-                'delta_dists must be <= {}'.format(
-                    max_dist_between_adj_points
-                )
-            )
-
-        times = move_data.at[tid, 'datetime'][filter_].astype(int)
-        delta_times = ((shift(times, -1) - times) / 1000.0)[
-            :-1
-        ]
+    Returns
+    -------
+    DataFrame
+        A row per trajectory and violated rule, with the index_name column,
+        the rule, one of 'distance_order', 'time_order', 'distance_gap',
+        'time_gap' and 'speed', the count of adjacent pairs violating it and
+        the first, the index label of the second point of the first pair.
+        Empty when the data is in order
 
-        if not np.all(delta_times <= max_time_between_adj_points):
-            raise ValueError(
-                'delta_times must be <= {}'.format(
-                    max_time_between_adj_points
-                )
+    """
+    if index_name in move_data:
+        tid = move_data[index_name].values
+    else:
+        tid = move_data.index.get_level_values(index_name).values
+    valid = move_data['datetime'].notnull().values
+    if tids is not None:
+        valid &= np.isin(tid, tids)
+
+    with stage('deltas', int(valid.sum())):
+        rows = np.flatnonzero(valid)
+        codes, uniques = factorize(tid[rows])
+        order = np.argsort(codes, kind='stable')
+        rows, codes = rows[order], codes[order]
+
+        dists = move_data['distFromTrajStartToCurrPoint'].values[rows]
+        times = move_data['datetime'].values[rows].astype('datetime64[ns]')
+        same = codes[1:] == codes[:-1]
+        delta_dists = np.diff(dists.astype(np.float64))[same]
+        delta_times = np.diff(times.astype(np.int64))[same] / 1e9
+        pair_codes = codes[1:][same]
+        pair_rows = rows[1:][same]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speeds = delta_dists / delta_times
+
+    rules = {
+        'distance_order': ~(delta_dists > 0),
+        'time_order': ~(delta_times > 0),
+        'distance_gap': delta_dists > max_dist_between_adj_points,
+        'time_gap': delta_times > max_time_between_adj_points,
+        'speed': (delta_times > 0) & (speeds > max_speed),
+    }
+    with stage('report', len(pair_codes)):
+        found, rule, count, first = [], [], [], []
+        for rank, violated in enumerate(rules.values()):
+            unique, position, counts = np.unique(
+                pair_codes[violated], return_index=True, return_counts=True
             )
+            found.append(unique)
+            rule.append(np.full(len(unique), rank))
+            count.append(counts)
+            first.append(pair_rows[np.flatnonzero(violated)[position]])
+        found, rule, count, first = map(np.concatenate, (found, rule, count, first))
+        order = np.lexsort((rule, found))
 
-        if not np.all(delta_times > 0):
-            raise ValueError('delta_times must be > 0')
-
-        speeds = delta_dists / delta_times
-        if not np.all(speeds <= max_speed):
-            raise ValueError('speeds > {}'.format(max_speed))
-
-        size_id = 1 if filter_.shape == () else filter_.shape[0]
-        count += size_id
-
-    move_data.reset_index(inplace=True)
+        return DataFrame({
+            index_name: uniques.take(found[order]),
+            'rule': np.array(list(rules), dtype=object)[rule[order]],
+            'count': count[order],
+            'first': move_data.index.values[first[order]],
+        })
 
 
 def fix_time_not_in_ascending_order_id(
@@ -192,6 +190,7 @@ def fix_time_not_in_ascending_order_id(
         return move_data
 
 
+@instrument()
 def fix_time_not_in_ascending_order_all(
     move_data: DataFrame,
     index_name: Optional[Text] = TID,
@@ -251,9 +250,9 @@ def fix_time_not_in_ascending_order_all(
     move_data['deleted'] = False
 
     print('starting fix...')
-    time.time()
-    for tid in progress_bar(tids):
-        fix_time_not_in_ascending_order_id(move_data, tid, index_name)
+    with stage('fix', len(move_data)):
+        for tid in progress_bar(tids):
+            fix_time_not_in_ascending_order_id(move_data, tid, index_name)
 
     move_data.reset_index(inplace=True)
     idxs = move_data[move_data['deleted']].index
@@ -270,6 +269,7 @@ def fix_time_not_in_ascending_order_all(
         return move_data
 
 
+@instrument()
 def interpolate_add_deltatime_speed_features(
     move_data: DataFrame,
     label_tid: Optional[Text] = TID,
@@ -459,11 +459,127 @@ def interpolate_add_deltatime_speed_features(
         return move_data
 
 
+def _node_distances(
+    move_data: DataFrame,
+    graph: CompactGraph,
+    paths: Optional[ShortestPathCache] = None,
+    max_dist_between_adj_points: Optional[float] = 5000
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Distances along the network between the nearest nodes of consecutive points.
+
+    Parameters
+    ----------
+    move_data : dataframe
+        The input trajectories data
+    graph : CompactGraph
+        The road graph
+    paths: ShortestPathCache, optional
+        Used to link nodes that are not linked by an edge, by default None
+    max_dist_between_adj_points: float, optional
+        The maximum shortest path length used to link the nodes, by default 5000
+
+    Returns
+    -------
+    tuple
+        The edgeDistance and distFromTrajStartToCurrPoint of each point
+
+    """
+    tree = cKDTree(np.column_stack([graph.node_x, graph.node_y]))
+    _, idx = tree.query(np.column_stack([move_data['lon'], move_data['lat']]), k=1)
+    nodes = graph.node_ids[idx]
+
+    edge = graph.edge_positions(nodes[:-1], nodes[1:])
+    steps = np.zeros(len(nodes))
+    linked = edge >= 0
+    steps[1:][linked] = graph.edge_length[edge[linked]]
+    unlinked = np.zeros(len(nodes), dtype=bool)
+    unlinked[1:] = ~linked
+
+    if paths is not None:
+        for i in np.nonzero(~linked & (nodes[:-1] != nodes[1:]))[0]:
+            gap = paths.distance(nodes[i], nodes[i + 1], max_dist_between_adj_points)
+            if not np.isinf(gap):
+                steps[i + 1] = gap
+                unlinked[i + 1] = False
+
+    distances = np.cumsum(steps)
+    # points without a route keep the distance travelled so far
+    edgeDistance = np.where(unlinked, distances, steps)
+    return edgeDistance, distances
+
+
+def _offset_distances(
+    move_data: DataFrame,
+    graph: CompactGraph,
+    paths: Optional[ShortestPathCache] = None,
+    max_dist_between_adj_points: Optional[float] = 5000
+) -> np.ndarray:
+    """
+    Distances along the network between consecutive matched points.
+
+    Parameters
+    ----------
+    move_data : dataframe
+        The input trajectories data, with the edge and edge_offset columns
+    graph : CompactGraph
+        The road graph the points were matched to
+    paths: ShortestPathCache, optional
+        Used to link points on edges that do not follow each other,
+        by default None
+    max_dist_between_adj_points: float, optional
+        The maximum shortest path length used to link the edges, by default 5000
+
+    Returns
+    -------
+    array
+        The distance from the previous point to each point, 0 for the first
+        point and when there is no known route between them
+
+    """
+    edges = move_data['edge'].values
+    matched = np.array([e is not None for e in edges], dtype=bool)
+    u = np.array([e[0] if m else -1 for e, m in zip(edges, matched)], dtype=np.int64)
+    v = np.array([e[1] if m else -1 for e, m in zip(edges, matched)], dtype=np.int64)
+    position = graph.edge_positions(u, v)
+    length = np.where(position >= 0, graph.edge_length[position], np.nan)
+    offset = move_data['edge_offset'].values * length
+
+    prev, curr = slice(None, -1), slice(1, None)
+    both = matched[prev] & matched[curr]
+    same = both & (u[prev] == u[curr]) & (v[prev] == v[curr])
+    forward = same & (offset[curr] >= offset[prev])
+    gap = np.where(both & ~forward & (v[prev] == u[curr]), 0.0, np.inf)
+
+    if paths is not None:
+        for i in np.nonzero(both & ~forward & np.isinf(gap))[0]:
+            gap[i] = paths.distance(v[i], u[i + 1], max_dist_between_adj_points)
+
+    distances = np.zeros(len(edges))
+    routed = length[prev] - offset[prev] + gap + offset[curr]
+    distances[1:] = np.where(
+        forward,
+        offset[curr] - offset[prev],
+        np.where(np.isinf(gap), 0.0, routed)
+    )
+    return distances
+
+
+@instrument()
 def generate_distances(
     move_data: DataFrame,
-    inplace: Optional[bool] = False
+    inplace: Optional[bool] = False,
+    paths: Optional[ShortestPathCache] = None,
+    max_dist_between_adj_points: Optional[float] = 5000,
+    G: Optional[Union[MultiDiGraph, CompactGraph]] = None,
+    tiles: Optional[TileStore] = None
 ) -> Optional[DataFrame]:
     """Use generate columns distFromTrajStartToCurrPoint and edgeDistance.
+
+    When the data has the edge and edge_offset columns of map_matching_edge,
+    the distances are measured along the network between the projections of
+    the points onto their edges, otherwise between their nearest nodes.
+
      Parameters
     ----------
     move_data : dataframe
@@ -472,6 +588,19 @@ def generate_distances(
         if set to true the original dataframe will be altered,
         otherwise the alteration will be made in a copy, that will be returned,
         by default True
+    paths: ShortestPathCache, optional
+        When given, its graph is used and the distance between consecutive
+        nodes not linked by an edge is the shortest path length between them,
+        by default None
+    max_dist_between_adj_points: float, optional
+        The maximum shortest path length used to fill gaps between
+        consecutive nodes, by default 5000
+    G : MultiDiGraph or CompactGraph, optional
+        The road graph, by default None, the graph of paths or a graph
+        downloaded for the bounding box of the data
+    tiles : TileStore, optional
+        The store whose tiles near the points are stitched when G and paths
+        are None, by default None
 
     Returns
     -------
@@ -480,34 +609,27 @@ def generate_distances(
     """
     if not inplace:
         move_data = move_data.copy()
-    bbox = move_data.get_bbox()
-
-    G = ox.graph_from_bbox(bbox[0], bbox[2], bbox[1], bbox[3])
-    nodes = ox.get_nearest_nodes(
-        G, X=move_data['lon'], Y=move_data['lat'], method='kdtree'
-    )
-
-    distances = []
-    edgeDistance = []
-    dist = 0.0
-    node_ant = nodes[0]
-    distances.append(dist)
-    edgeDistance.append(dist)
-
-    gdf_edges = ox.graph_to_gdfs(G, nodes=False)
-
-    for node in nodes[1:]:
-        df_u = gdf_edges[gdf_edges.index.get_level_values('u') == node_ant]
-        df_edge = df_u[df_u.index.get_level_values('v') == node]
-
-        if(len(df_edge) == 0):
-            dist += 0
-            edgeDistance.append(dist)
+    with stage('graph'):
+        if G is None and paths is None and tiles is not None:
+            G = tiles.graph(move_data['lon'], move_data['lat'])
+        elif G is None and paths is None:
+            bbox = move_data.get_bbox()
+            G = ox.graph_from_bbox(bbox[0], bbox[2], bbox[1], bbox[3])
+        elif G is None:
+            G = paths.G
+        if not isinstance(G, CompactGraph):
+            G = CompactGraph.from_graph(G)
+
+    with stage('distances', len(move_data)):
+        if 'edge' in move_data and 'edge_offset' in move_data:
+            edgeDistance = _offset_distances(
+                move_data, G, paths, max_dist_between_adj_points
+            )
+            distances = np.cumsum(edgeDistance)
         else:
-            dist += df_edge['length'].values[0]
-            edgeDistance.append(df_edge['length'].values[0])
-        distances.append(dist)
-        node_ant = node
+            edgeDistance, distances = _node_distances(
+                move_data, G, paths, max_dist_between_adj_points
+            )
 
     move_data['edgeDistance'] = edgeDistance
     move_data['distFromTrajStartToCurrPoint'] = distances
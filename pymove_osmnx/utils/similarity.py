@@ -1,20 +1,569 @@
-from difflib import SequenceMatcher
-from typing import Optional
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Text, Tuple, Union
 
+import numpy as np
 import pandas as pd
+from networkx import MultiDiGraph
 from pandas.core.frame import DataFrame
+from pymove.utils.constants import DATETIME, TRAJ_ID
+from scipy.sparse import csr_matrix
 
-from pymove_osmnx.core.map_matching_osmnx import map_matching_edge
+from pymove_osmnx.core.compact_graph import CompactGraph
+from pymove_osmnx.core.map_matcher import MapMatcher
+from pymove_osmnx.core.map_matching_osmnx import _get_graph, map_matching_edge
+from pymove_osmnx.utils.instrumentation import instrument, stage
 
+_trajectories = None
 
+
+def band_windows(
+    n: int, m: int, band: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the columns of each row of a dynamic programming table in a band.
+
+    The band follows the diagonal from (0, 0) to (n, m), so sequences of
+    different lengths are aligned proportionally, and the windows of
+    consecutive rows always overlap.
+
+    Parameters
+    ----------
+    n : int
+        Length of the first sequence, the rows are 0 to n
+    m : int
+        Length of the second sequence, the columns are 0 to m
+    band : int, optional
+        Maximum distance in columns from the diagonal, by default None,
+        all columns
+
+    Returns
+    -------
+    tuple
+        The first and last column of each row
+
+    """
+    rows = np.arange(n + 1)
+    if band is None:
+        return np.zeros(n + 1, dtype=np.int64), np.full(n + 1, m, dtype=np.int64)
+    band = max(band, 1)
+    ratio = m / n if n else 0.0
+    first = np.clip(np.ceil((rows - 1) * ratio - band), 0, m).astype(np.int64)
+    last = np.clip(np.floor(rows * ratio + band), 0, m).astype(np.int64)
+    first[0] = 0
+    return first, last
+
+
+def _band_matches(
+    seq1: np.ndarray,
+    seq2: np.ndarray,
+    times1: Optional[np.ndarray],
+    times2: Optional[np.ndarray],
+    tolerance: Optional[float],
+    first: np.ndarray,
+    last: np.ndarray
+) -> np.ndarray:
+    """Returns whether the elements match, for the columns of each row window."""
+    width = int((last - first).max()) + 1
+    cols = first[1:, None] + np.arange(width)
+    inside = (cols >= 1) & (cols <= last[1:, None])
+    cols = np.clip(cols, 1, len(seq2)) - 1
+    match = inside & (seq1[:, None] == seq2[cols]) & (seq1[:, None] >= 0)
+    if tolerance is not None and times1 is not None and times2 is not None:
+        times1 = np.asarray(times1, dtype=np.float64)
+        times2 = np.asarray(times2, dtype=np.float64)
+        match &= np.abs(times1[:, None] - times2[cols]) <= tolerance
+    return match
+
+
+def lcss(
+    seq1: np.ndarray,
+    seq2: np.ndarray,
+    times1: Optional[np.ndarray] = None,
+    times2: Optional[np.ndarray] = None,
+    tolerance: Optional[float] = None,
+    band: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Longest common subsequence of two integer sequences.
+
+    Two elements match when they are equal and not negative and, with
+    times, when their times differ by at most the tolerance. The table is
+    filled row by row with array operations, and with a band only the
+    cells near the diagonal are computed and stored, in O(n * band).
+
+    Parameters
+    ----------
+    seq1 : array
+        The first sequence, negative values never match
+    seq2 : array
+        The second sequence, negative values never match
+    times1 : array, optional
+        The times of the first sequence, by default None
+    times2 : array, optional
+        The times of the second sequence, by default None
+    tolerance : float, optional
+        Maximum time difference of matching elements, by default None,
+        times are ignored
+    band : int, optional
+        Maximum distance of matching elements from the diagonal, in
+        elements of seq2, by default None, no limit
+
+    Returns
+    -------
+    tuple
+        The positions in seq1 and in seq2 of the matched elements
+
+    """
+    seq1 = np.asarray(seq1, dtype=np.int64)
+    seq2 = np.asarray(seq2, dtype=np.int64)
+    n, m = len(seq1), len(seq2)
+    if n == 0 or m == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    first, last = band_windows(n, m, band)
+    match = _band_matches(seq1, seq2, times1, times2, tolerance, first, last)
+
+    table = np.zeros((n + 1, match.shape[1]), dtype=np.int32)
+    column = np.zeros(m + 1, dtype=np.int32)
+    for i in range(1, n + 1):
+        size = last[i] - first[i] + 1
+        previous = column[np.clip(np.arange(first[i] - 1, last[i] + 1), 0, last[i - 1])]
+        best = np.where(match[i - 1, :size], previous[:-1] + 1, previous[1:])
+        table[i, :size] = np.maximum.accumulate(best)
+        column[first[i]:last[i] + 1] = table[i, :size]
+
+    def value(i, j):
+        j = min(j, last[i])
+        if j < first[i]:
+            i = np.searchsorted(first, j, side='right') - 1
+        return table[i, j - first[i]]
+
+    idx1, idx2 = [], []
+    i, j = n, m
+    while i > 0 and j > 0:
+        current = value(i, j)
+        if current == 0:
+            break
+        if (
+            first[i] <= j <= last[i]
+            and match[i - 1, j - first[i]]
+            and value(i - 1, j - 1) + 1 == current
+        ):
+            idx1.append(i - 1)
+            idx2.append(j - 1)
+            i, j = i - 1, j - 1
+        elif value(i - 1, j) == current:
+            i -= 1
+        else:
+            j -= 1
+    return np.array(idx1[::-1], dtype=np.int64), np.array(idx2[::-1], dtype=np.int64)
+
+
+def lcss_length(
+    seq1: np.ndarray,
+    seq2: np.ndarray,
+    times1: Optional[np.ndarray] = None,
+    times2: Optional[np.ndarray] = None,
+    tolerance: Optional[float] = None,
+    band: Optional[int] = None,
+    minimum: Optional[int] = None
+) -> int:
+    """
+    Length of the longest common subsequence of two integer sequences.
+
+    Elements match as in lcss, but only the length is computed, with the
+    bit parallel algorithm of Hyyrö: each row of the table is kept as the
+    bits of an integer and updated with a few integer operations, which is
+    much faster than filling the table when the positions are not needed.
+    With a band, only the elements in the window of each row are compared.
+    With a minimum, the computation stops as soon as the rows left cannot
+    reach it.
+
+    Parameters
+    ----------
+    seq1 : array
+        The first sequence, negative values never match
+    seq2 : array
+        The second sequence, negative values never match
+    times1 : array, optional
+        The times of the first sequence, by default None
+    times2 : array, optional
+        The times of the second sequence, by default None
+    tolerance : float, optional
+        Maximum time difference of matching elements, by default None,
+        times are ignored
+    band : int, optional
+        Maximum distance of matching elements from the diagonal, in
+        elements of seq2, by default None, no limit
+    minimum : int, optional
+        The length below which the computation can be abandoned,
+        by default None
+
+    Returns
+    -------
+    int
+        The number of matched elements, or a number below the minimum when
+        abandoned
+
+    """
+    seq1 = np.asarray(seq1, dtype=np.int64)
+    seq2 = np.asarray(seq2, dtype=np.int64)
+    n, m = len(seq1), len(seq2)
+    if n == 0 or m == 0:
+        return 0
+
+    first, last = band_windows(n, m, band)
+    match = _band_matches(seq1, seq2, times1, times2, tolerance, first, last)
+    found = match.any(axis=1)
+    match, shifts = match[found], first[1:][found]
+    if minimum is not None and len(match) < minimum:
+        return 0
+    # bit k of a window is column first + k, the column 0 bit is never set
+    rows = np.packbits(match, axis=1, bitorder='little')
+    mask = (1 << m) - 1
+    bits = mask
+    left = len(rows)
+    for row, shift in zip(rows, shifts.tolist()):
+        common = bits & ((int.from_bytes(row.tobytes(), 'little') << shift) >> 1)
+        bits = (bits + common) | (bits - common)
+        left -= 1
+        if minimum is not None:
+            length = m - bin(bits & mask).count('1')
+            if length + left < minimum:
+                return length
+    return m - bin(bits & mask).count('1')
+
+
+def _window_costs(
+    seq1: np.ndarray,
+    seq2: np.ndarray,
+    cost: np.ndarray,
+    i: int,
+    first: np.ndarray,
+    last: np.ndarray
+) -> np.ndarray:
+    """Returns the costs of the columns of row i in its window, inf in column 0."""
+    cols = np.arange(first[i], last[i] + 1) - 1
+    row = cost[seq1[i - 1], seq2[np.maximum(cols, 0)]]
+    row[cols < 0] = np.inf
+    return row
+
+
+def _previous(column: np.ndarray, i: int, first: np.ndarray, last: np.ndarray):
+    """Returns the diagonal and upper neighbours of the columns of row i."""
+    previous = np.full(last[i] - first[i] + 2, np.inf)
+    start = max(first[i] - 1, 0)
+    previous[start - first[i] + 1:] = column[start:last[i] + 1]
+    return previous[:-1], previous[1:]
+
+
+def _banded(
+    seq1: np.ndarray,
+    seq2: np.ndarray,
+    cost: np.ndarray,
+    band: Optional[int],
+    maximum: Optional[float],
+    start: Callable[[np.ndarray], np.ndarray],
+    step: Callable[[np.ndarray, np.ndarray, np.ndarray], np.ndarray]
+) -> float:
+    """
+    Fills a dynamic programming table row by row within a band.
+
+    Only the last value of each column is kept, cells outside the band are
+    infinite, and the computation is abandoned when every cell of a row
+    exceeds the maximum, since the distances only grow along the paths.
+
+    Parameters
+    ----------
+    seq1 : array
+        The first sequence, positions in the rows of cost
+    seq2 : array
+        The second sequence, positions in the columns of cost
+    cost : array
+        The distance between the elements of the sequences
+    band : int, optional
+        Maximum distance of the cells from the diagonal, by default None
+    maximum : float, optional
+        The distance above which the computation is abandoned
+    start : callable
+        Returns the values of row 0 from its columns
+    step : callable
+        Returns the values of a row from the costs, diagonal and upper
+        neighbours of its cells
+
+    Returns
+    -------
+    float
+        The value of the last cell, np.inf when above the maximum
+
+    """
+    seq1 = np.asarray(seq1, dtype=np.int64)
+    seq2 = np.asarray(seq2, dtype=np.int64)
+    cost = np.asarray(cost, dtype=np.float64)
+    n, m = len(seq1), len(seq2)
+    first, last = band_windows(n, m, band)
+    column = np.full(m + 1, np.inf)
+    column[:last[0] + 1] = start(np.arange(last[0] + 1))
+    for i in range(1, n + 1):
+        diagonal, up = _previous(column, i, first, last)
+        row = step(_window_costs(seq1, seq2, cost, i, first, last), diagonal, up)
+        column[first[i - 1]:first[i]] = np.inf
+        column[first[i]:last[i] + 1] = row
+        if maximum is not None and row.min() > maximum:
+            return np.inf
+    if maximum is not None and column[m] > maximum:
+        return np.inf
+    return float(column[m])
+
+
+def dtw(
+    seq1: np.ndarray,
+    seq2: np.ndarray,
+    cost: np.ndarray,
+    band: Optional[int] = None,
+    maximum: Optional[float] = None
+) -> float:
+    """
+    Dynamic time warping distance of two sequences.
+
+    Each row is computed with array operations: entering the row at a
+    column and moving right adds the costs of the cells crossed, so the
+    row is a cumulative sum plus a running minimum.
+
+    Parameters
+    ----------
+    seq1 : array
+        The first sequence, positions in the rows of cost
+    seq2 : array
+        The second sequence, positions in the columns of cost
+    cost : array
+        The finite distances between the elements of the sequences
+    band : int, optional
+        Maximum distance of aligned elements from the diagonal, the
+        Sakoe-Chiba band, in elements of seq2, by default None, no limit
+    maximum : float, optional
+        The distance above which the computation is abandoned,
+        by default None
+
+    Returns
+    -------
+    float
+        The sum of the distances of the aligned elements, np.inf when
+        above the maximum or when a sequence is empty
+
+    """
+    if len(seq1) == 0 or len(seq2) == 0:
+        return np.inf
+
+    def start(cols):
+        return np.where(cols == 0, 0.0, np.inf)
+
+    def step(costs, diagonal, up):
+        row = np.full(len(costs), np.inf)
+        skip = int(np.isinf(costs[0]))
+        total = np.cumsum(costs[skip:])
+        enter = np.minimum(diagonal, up)[skip:] - (total - costs[skip:])
+        row[skip:] = total + np.minimum.accumulate(enter)
+        return row
+
+    return _banded(seq1, seq2, cost, band, maximum, start, step)
+
+
+def edr(
+    seq1: np.ndarray,
+    seq2: np.ndarray,
+    cost: np.ndarray,
+    epsilon: float,
+    band: Optional[int] = None,
+    maximum: Optional[float] = None
+) -> float:
+    """
+    Edit distance on real sequences.
+
+    Two elements are equal when their distance is at most epsilon, and the
+    distance is the number of insertions, deletions and substitutions
+    turning one sequence into the other.
+
+    Parameters
+    ----------
+    seq1 : array
+        The first sequence, positions in the rows of cost
+    seq2 : array
+        The second sequence, positions in the columns of cost
+    cost : array
+        The distance between the elements of the sequences
+    epsilon : float
+        The maximum distance of equal elements
+    band : int, optional
+        Maximum distance of aligned elements from the diagonal, in elements
+        of seq2, by default None, no limit
+    maximum : float, optional
+        The distance above which the computation is abandoned,
+        by default None
+
+    Returns
+    -------
+    float
+        The number of edits, np.inf when above the maximum
+
+    """
+    if len(seq1) == 0 or len(seq2) == 0:
+        return float(max(len(seq1), len(seq2)))
+
+    def start(cols):
+        return cols.astype(np.float64)
+
+    def step(costs, diagonal, up):
+        enter = np.minimum(diagonal + (costs > epsilon), up + 1)
+        cols = np.arange(len(costs))
+        return cols + np.minimum.accumulate(enter - cols)
+
+    return _banded(seq1, seq2, cost, band, maximum, start, step)
+
+
+def frechet(
+    seq1: np.ndarray,
+    seq2: np.ndarray,
+    cost: np.ndarray,
+    band: Optional[int] = None,
+    maximum: Optional[float] = None
+) -> float:
+    """
+    Discrete Fréchet distance of two sequences.
+
+    Each cell of a row clamps the value of the cell on its left between its
+    cost and the best of its upper neighbours. Clamps compose into clamps,
+    so the row is a prefix composition computed in log(width) steps.
+
+    Parameters
+    ----------
+    seq1 : array
+        The first sequence, positions in the rows of cost
+    seq2 : array
+        The second sequence, positions in the columns of cost
+    cost : array
+        The distance between the elements of the sequences
+    band : int, optional
+        Maximum distance of aligned elements from the diagonal, in elements
+        of seq2, by default None, no limit
+    maximum : float, optional
+        The distance above which the computation is abandoned,
+        by default None
+
+    Returns
+    -------
+    float
+        The largest distance of the aligned elements, np.inf when above the
+        maximum or when a sequence is empty
+
+    """
+    if len(seq1) == 0 or len(seq2) == 0:
+        return np.inf
+
+    def start(cols):
+        return np.where(cols == 0, 0.0, np.inf)
+
+    def step(costs, diagonal, up):
+        low = costs.copy()
+        high = np.maximum(np.minimum(diagonal, up), costs)
+        shift = 1
+        while shift < len(costs):
+            inner_low, inner_high = low[:-shift], high[:-shift]
+            outer_low, outer_high = low[shift:], high[shift:]
+            low[shift:] = np.clip(inner_low, outer_low, outer_high)
+            high[shift:] = np.clip(inner_high, outer_low, outer_high)
+            shift *= 2
+        return high
+
+    return _banded(seq1, seq2, cost, band, maximum, start, step)
+
+
+def edge_distances(
+    matcher: MapMatcher,
+    edges1: np.ndarray,
+    edges2: np.ndarray,
+    cutoff: Optional[float] = 1000.0
+) -> np.ndarray:
+    """
+    Network distances between two sets of edges.
+
+    The distance between two edges is 0 when they are the same, otherwise
+    the length of the shortest route from the end of one to the start of
+    the other, in whichever direction is shorter, capped at the cutoff. The
+    paths are computed with the shortest path cache of the matcher.
+
+    Parameters
+    ----------
+    matcher : MapMatcher
+        The matcher holding the road graph
+    edges1 : array
+        The u and v node identifiers of the first edges
+    edges2 : array
+        The u and v node identifiers of the second edges
+    cutoff : float, optional
+        The maximum distance in meters, by default 1000.0
+
+    Returns
+    -------
+    array
+        The (len(edges1), len(edges2)) matrix of distances in meters
+
+    """
+    edges1 = np.asarray(edges1).reshape(-1, 2)
+    edges2 = np.asarray(edges2).reshape(-1, 2)
+    forward = np.array([
+        [lengths.get(u, np.inf) for u in edges2[:, 0].tolist()]
+        for lengths in (matcher.paths.lengths(v, cutoff) for v in edges1[:, 1].tolist())
+    ]).reshape(len(edges1), len(edges2))
+    backward = np.array([
+        [lengths.get(u, np.inf) for u in edges1[:, 0].tolist()]
+        for lengths in (matcher.paths.lengths(v, cutoff) for v in edges2[:, 1].tolist())
+    ]).reshape(len(edges2), len(edges1))
+    distances = np.minimum(np.minimum(forward, backward.T), cutoff)
+    same = (edges1[:, None, :] == edges2[None, :, :]).all(axis=2)
+    distances[same] = 0
+    return distances
+
+
+def _encode_edges(*move_data: DataFrame) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """
+    Interns the u and v of the matched edges as int32 ids, -1 if unmatched.
+
+    Returns the u and v of each id, and the ids of the points of each frame.
+    """
+    edges = np.concatenate([
+        np.column_stack([df['u'].values, df['v'].values]) for df in move_data
+    ])
+    unique, codes = np.unique(edges, axis=0, return_inverse=True)
+    codes = np.where(edges[:, 0] >= 0, codes.ravel(), -1)
+    if len(unique) and unique[0, 0] < 0:
+        unique, codes = unique[1:], np.where(codes >= 0, codes - 1, -1)
+    codes = codes.astype(np.int32)
+    return unique, np.split(codes, np.cumsum([len(df) for df in move_data])[:-1])
+
+
+def _seconds(move_data: DataFrame) -> np.ndarray:
+    """Returns the datetimes as whole seconds."""
+    return move_data[DATETIME].values.astype('datetime64[s]').astype(np.int64)
+
+
+@instrument()
 def generate_lcss(
     move_data_id1: DataFrame,
     move_data_id2: DataFrame,
-    tolerance: float
+    tolerance: float,
+    band: Optional[int] = None,
+    G: Optional[Union[MultiDiGraph, CompactGraph]] = None,
+    matcher: Optional[MapMatcher] = None
 ) -> Optional[DataFrame]:
     """
     Generate Longest Commum Sub-Sequence between two trajectories.
 
+    The trajectories are matched to the edges of the road graph and two
+    points are part of a common subsequence when they are on the same edge
+    and their times differ by at most the tolerance.
+
      Parameters
     ----------
     move_data_id1 : DataFrame
@@ -24,6 +573,15 @@ def generate_lcss(
     tolerance : float
         Time in seconds regarding the tolerance of the time difference
         between a move_data_id1 and move_data_id2 point
+    band : int, optional
+        Maximum distance in points from the diagonal of the matched points,
+        limits the work to O(n * band) for long trajectories, by default None
+    G : MultiDiGraph or CompactGraph, optional
+        The road graph, by default None, downloaded for each trajectory
+    matcher : MapMatcher, optional
+        A matcher built beforehand, reused for both trajectories,
+        by default None. With a MatchCache as its results, comparing a
+        trajectory against many others matches it only once
 
     Returns
     -------
@@ -32,41 +590,514 @@ def generate_lcss(
         move_data_id1 and move_data_id1, or None
     """
 
-    move_data_id1 = map_matching_edge(move_data_id1, inplace=False)
-    move_data_id2 = map_matching_edge(move_data_id2, inplace=False)
+    if matcher is None and G is not None:
+        matcher = MapMatcher(G)
+    move_data_id1 = map_matching_edge(
+        move_data_id1, inplace=False, matcher=matcher, compact=True
+    )
+    move_data_id2 = map_matching_edge(
+        move_data_id2, inplace=False, matcher=matcher, compact=True
+    )
+
+    with stage('lcss', len(move_data_id1) + len(move_data_id2)):
+        _, (seq1, seq2) = _encode_edges(move_data_id1, move_data_id2)
+        times1, times2 = _seconds(move_data_id1), _seconds(move_data_id2)
+        idx1, idx2 = lcss(seq1, seq2, times1, times2, tolerance, band)
+    if len(idx1) == 0:
+        return None
+
+    return pd.DataFrame({
+        'ida': move_data_id1[TRAJ_ID].values[idx1],
+        'idb': move_data_id2[TRAJ_ID].values[idx2],
+        'datetime_ida': move_data_id1[DATETIME].values[idx1],
+        'datetime_idb': move_data_id2[DATETIME].values[idx2],
+        'difference': np.abs(times1[idx1] - times2[idx2]),
+        'equals': True,
+        'edge': [
+            [u, v] for u, v in zip(
+                move_data_id1['u'].values[idx1], move_data_id1['v'].values[idx1]
+            )
+        ],
+    })
+
+
+class MatchedTrajectories:
+    """
+    Trajectories matched once to the road edges, compared many ways.
+
+    The edges of the points are interned as int32 ids, and the trajectories
+    are kept as sequences of ids with the summaries bounding their LCSS
+    lengths. Build it with MatchedTrajectories.from_move_data and pass it to
+    similarity_matrix and trajectory_distance. The matcher is kept for the
+    network distances, but is not pickled with the trajectories.
+
+    Parameters
+    ----------
+    ids : array
+        The sorted identifiers of the trajectories
+    traj : array
+        The position in ids of the trajectory of each point
+    codes : array
+        The interned edge of each point, -1 if unmatched
+    times : array
+        The time of each point in seconds
+    edges : array
+        The u and v node identifiers of each interned edge
+    matcher : MapMatcher, optional
+        The matcher of the road graph, by default None
+
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        traj: np.ndarray,
+        codes: np.ndarray,
+        times: np.ndarray,
+        edges: np.ndarray,
+        matcher: Optional[MapMatcher] = None
+    ):
+        self.ids = ids
+        self.edges = edges
+        self.matcher = matcher
+        self.n = len(ids)
+        order = np.argsort(traj, kind='stable')
+        self.lengths = np.bincount(traj, minlength=self.n)
+        bounds = np.cumsum(self.lengths)[:-1]
+        self.codes = np.split(codes[order], bounds)
+        self.times = np.split(times[order], bounds)
+        matched = codes >= 0
+        self.matched = np.bincount(traj[matched], minlength=self.n)
+
+        self.start = np.full(self.n, np.iinfo(np.int64).max)
+        self.end = np.full(self.n, np.iinfo(np.int64).min)
+        np.minimum.at(self.start, traj, times)
+        np.maximum.at(self.end, traj, times)
+        self.origin = times.min() if len(times) else 0
+        self.keys = np.sort((traj.astype(np.int64) << 33) + (times - self.origin))
+
+        pairs, counts = np.unique(
+            np.column_stack([traj[matched], codes[matched]]),
+            axis=0,
+            return_counts=True
+        )
+        self.counts = csr_matrix(
+            (counts, (pairs[:, 0], pairs[:, 1])),
+            shape=(self.n, max(len(edges), 1))
+        )
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        state['matcher'] = None
+        return state
+
+    @classmethod
+    def from_move_data(
+        cls,
+        move_data: DataFrame,
+        G: Optional[Union[MultiDiGraph, CompactGraph]] = None,
+        matcher: Optional[MapMatcher] = None,
+        n_jobs: Optional[int] = 1
+    ) -> 'MatchedTrajectories':
+        """
+        Matches the trajectories to the edges of the road graph.
+
+        Parameters
+        ----------
+        move_data : DataFrame
+           The input trajectories data, identified by the id column
+        G : MultiDiGraph or CompactGraph, optional
+            The road graph, by default None, downloaded once for all
+            trajectories
+        matcher : MapMatcher, optional
+            A matcher built beforehand, by default None
+        n_jobs : int, optional
+            Number of processes matching the trajectories, by default 1
+
+        Returns
+        -------
+        MatchedTrajectories
+            The matched trajectories
+
+        """
+        if matcher is None:
+            matcher = MapMatcher(_get_graph(move_data, None, None, G, None))
+        move_data = map_matching_edge(
+            move_data, inplace=False, matcher=matcher, n_jobs=n_jobs, compact=True
+        )
+        with stage('sequences', len(move_data)):
+            ids, traj = np.unique(move_data[TRAJ_ID].values, return_inverse=True)
+            edges, (codes,) = _encode_edges(move_data)
+            return cls(ids, traj, codes, _seconds(move_data), edges, matcher)
+
+    def position(self, id_: int) -> int:
+        """Returns the position of a trajectory from its identifier."""
+        i = int(np.searchsorted(self.ids, id_))
+        if i == self.n or self.ids[i] != id_:
+            raise KeyError(id_)
+        return i
+
+    def _inside(self, rows: np.ndarray, low: float, high: float) -> np.ndarray:
+        """Counts the points of some trajectories with times from low to high."""
+        low = np.clip(np.ceil(low) - self.origin, 0, 2 ** 33 - 1).astype(np.int64)
+        high = np.clip(np.floor(high) - self.origin, -1, 2 ** 33 - 1).astype(np.int64)
+        return (
+            np.searchsorted(self.keys, (rows << 33) + high, side='right')
+            - np.searchsorted(self.keys, (rows << 33) + low)
+        ) * (high >= low)
+
+    def upper_bounds(self, i: int, tolerance: Optional[float] = None) -> np.ndarray:
+        """
+        Bounds the LCSS lengths between a trajectory and the following ones.
+
+        Only matched points can match, with a tolerance only the points
+        within the time window of the other trajectory, and at most as many
+        points as the other trajectory has on each edge.
+
+        Parameters
+        ----------
+        i : int
+            The position of the trajectory
+        tolerance : float, optional
+            Maximum time difference of matching points, by default None
+
+        Returns
+        -------
+        array
+            The upper bounds for the trajectories i + 1 to n - 1
+
+        """
+        bounds = np.minimum(self.matched[i], self.matched[i + 1:])
+        if tolerance is not None:
+            rows = np.arange(i + 1, self.n, dtype=np.int64)
+            bounds = np.minimum(bounds, self._inside(
+                rows, self.start[i] - tolerance, self.end[i] + tolerance
+            ))
+            times = np.sort(self.times[i])
+            bounds = np.minimum(bounds, (
+                np.searchsorted(times, self.end[i + 1:] + tolerance, side='right')
+                - np.searchsorted(times, self.start[i + 1:] - tolerance)
+            ))
+
+        row = self.counts[i]
+        shared = self.counts[i + 1:][:, row.indices]
+        shared.data = np.minimum(shared.data, row.data[shared.indices])
+        return np.minimum(bounds, np.asarray(shared.sum(axis=1)).ravel())
+
+
+def _init_worker(trajectories: MatchedTrajectories):
+    """Stores the trajectories received once by each worker process."""
+    global _trajectories
+    _trajectories = trajectories
+
+
+def _similarity_rows(
+    trajectories: MatchedTrajectories,
+    rows: np.ndarray,
+    tolerance: Optional[float] = None,
+    band: Optional[int] = None,
+    threshold: Optional[float] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Computes the similarities of some trajectories to the following ones.
+
+    The pairs whose upper bound is below the length needed to reach the
+    threshold, or zero, are not compared, and the comparisons are abandoned
+    as soon as they cannot reach it.
+
+    Parameters
+    ----------
+    trajectories : MatchedTrajectories
+        The matched trajectories
+    rows : array
+        The positions of the trajectories
+    tolerance : float, optional
+        Maximum time difference of matching points, by default None
+    band : int, optional
+        Maximum distance in points from the diagonal, by default None
+    threshold : float, optional
+        The similarity below which pairs get 0, by default None
+
+    Returns
+    -------
+    tuple
+        The positions of the first and second trajectory and the similarity
+        of the pairs with a similarity above 0, the second after the first
+
+    """
+    first, second, values = [], [], []
+    for i in rows:
+        shorter = np.minimum(trajectories.lengths[i], trajectories.lengths[i + 1:])
+        needed = np.ones(len(shorter), dtype=np.int64)
+        if threshold is not None:
+            needed = np.maximum(np.ceil(threshold * shorter - 1e-9), 1).astype(np.int64)
+        similarity = np.zeros(len(shorter))
+        candidates = np.flatnonzero(trajectories.upper_bounds(i, tolerance) >= needed)
+        for k in candidates.tolist():
+            j = i + 1 + k
+            length = lcss_length(
+                trajectories.codes[i],
+                trajectories.codes[j],
+                trajectories.times[i],
+                trajectories.times[j],
+                tolerance,
+                band,
+                needed[k]
+            )
+            if length >= needed[k]:
+                similarity[k] = length / shorter[k]
+        found = np.flatnonzero(similarity)
+        first.append(np.full(len(found), i, dtype=np.int64))
+        second.append(i + 1 + found)
+        values.append(similarity[found])
+    if not values:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    return np.concatenate(first), np.concatenate(second), np.concatenate(values)
+
+
+def _top_k(
+    n: int, k: int, first: np.ndarray, second: np.ndarray, values: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Selects the k most similar trajectories of each one from sparse pairs.
+
+    Ties are broken by position, and rows with fewer than k pairs are
+    completed with the first other trajectories, at similarity 0.
+
+    Parameters
+    ----------
+    n : int
+        The number of trajectories
+    k : int
+        The number of trajectories selected per row, at most n - 1
+    first : array
+        The position of the first trajectory of each pair
+    second : array
+        The position of the second trajectory of each pair
+    values : array
+        The similarity of each pair, above 0
+
+    Returns
+    -------
+    tuple
+        The n x k positions and similarities of the selected trajectories
+
+    """
+    rows = np.concatenate([first, second])
+    cols = np.concatenate([second, first])
+    values = np.concatenate([values, values])
+    order = np.argsort(rows, kind='stable')
+    rows, cols, values = rows[order], cols[order], values[order]
+    bounds = np.searchsorted(rows, np.arange(n + 1))
+
+    best = np.empty((n, k), dtype=np.int64)
+    similarity = np.zeros((n, k))
+    for i in range(n if k else 0):
+        row_cols = cols[bounds[i]:bounds[i + 1]]
+        row_values = values[bounds[i]:bounds[i + 1]]
+        if len(row_cols) > k:
+            keep = np.argpartition(-row_values, k - 1)[:k]
+            # pairs tied with the k-th value are selected by position
+            kth = row_values[keep].min()
+            keep = np.flatnonzero(row_values > kth)
+            tied = np.flatnonzero(row_values == kth)
+            keep = np.concatenate([keep, tied[np.argsort(row_cols[tied])]])[:k]
+            row_cols, row_values = row_cols[keep], row_values[keep]
+        ranked = np.lexsort((row_cols, -row_values))
+        size = len(ranked)
+        best[i, :size] = row_cols[ranked]
+        similarity[i, :size] = row_values[ranked]
+        if size < k:
+            others = np.arange(min(n, k + size + 1))
+            others = others[(others != i) & ~np.isin(others, row_cols)]
+            best[i, size:] = others[:k - size]
+    return best, similarity
+
+
+def _similarity_partition(args) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Computes the similarities of one partition in a worker process."""
+    return _similarity_rows(_trajectories, *args)
+
+
+@instrument()
+def similarity_matrix(
+    move_data: Union[DataFrame, MatchedTrajectories],
+    tolerance: Optional[float] = None,
+    band: Optional[int] = None,
+    G: Optional[Union[MultiDiGraph, CompactGraph]] = None,
+    matcher: Optional[MapMatcher] = None,
+    top_k: Optional[int] = None,
+    n_jobs: Optional[int] = 1,
+    threshold: Optional[float] = None
+) -> DataFrame:
+    """
+    Computes the LCSS similarity between every pair of trajectories.
+
+    The trajectories are matched to the edges of the road graph once, and
+    the similarity of two trajectories is the length of their longest
+    common subsequence, as in generate_lcss, divided by the number of
+    points of the shorter one. The pairs are split by rows across worker
+    processes, each receiving the trajectories once, with their edges
+    interned as int32 ids.
+
+    Pairs are compared only when cheap upper bounds of their LCSS, from
+    the matched points, the overlap of their time windows and of their
+    edges, can reach the threshold, and comparisons stop once they cannot.
+    Pairs sharing no edge are never compared.
+
+    Parameters
+    ----------
+    move_data : DataFrame or MatchedTrajectories
+       The input trajectories data, identified by the id column, or the
+       trajectories already matched
+    tolerance : float, optional
+        Time in seconds regarding the tolerance of the time difference
+        between the points of two trajectories, by default None, times are
+        ignored, as when comparing the routes of different days
+    band : int, optional
+        Maximum distance in points from the diagonal of the matched points,
+        by default None
+    G : MultiDiGraph or CompactGraph, optional
+        The road graph, by default None, downloaded once for all trajectories
+    matcher : MapMatcher, optional
+        A matcher built beforehand, by default None
+    top_k : int, optional
+        If set, only the k most similar trajectories of each trajectory are
+        returned, as rows of a long DataFrame, without building the N x N
+        matrix, by default None
+    n_jobs : int, optional
+        Number of processes, -1 uses all cpus, by default 1
+    threshold : float, optional
+        The similarity below which pairs get 0, allowing dissimilar pairs
+        to be skipped, by default None
+
+    Returns
+    -------
+    DataFrame
+        The N x N similarities, with the sorted ids as index and columns,
+        or with top_k the ida, idb and similarity columns, sorted by ida
+        and decreasing similarity
+
+    """
+    if n_jobs is not None and n_jobs < 0:
+        n_jobs = os.cpu_count()
+    trajectories = move_data
+    if not isinstance(trajectories, MatchedTrajectories):
+        trajectories = MatchedTrajectories.from_move_data(move_data, G, matcher, n_jobs)
+
+    ids = trajectories.ids
+    n = len(ids)
+    args = (tolerance, band, threshold)
+    with stage('similarity', n * (n - 1) // 2):
+        if n_jobs is None or n_jobs <= 1 or n < 3:
+            partitions = [np.arange(n)]
+            results = [_similarity_rows(trajectories, partitions[0], *args)]
+        else:
+            n_partitions = min(4 * n_jobs, n)
+            partitions = [np.arange(p, n, n_partitions) for p in range(n_partitions)]
+            with ProcessPoolExecutor(
+                max_workers=n_jobs, initializer=_init_worker, initargs=(trajectories,)
+            ) as executor:
+                results = list(executor.map(
+                    _similarity_partition, [(rows,) + args for rows in partitions]
+                ))
+        first, second, values = (np.concatenate(r) for r in zip(*results))
+
+    if top_k is None:
+        result = np.eye(n)
+        result[first, second] = values
+        result[second, first] = values
+        return pd.DataFrame(result, index=ids, columns=ids)
+
+    k = min(top_k, n - 1)
+    with stage('top_k', len(values)):
+        best, similarity = _top_k(n, k, first, second, values)
+    return pd.DataFrame({
+        'ida': np.repeat(ids, k),
+        'idb': ids[best.ravel()],
+        'similarity': similarity.ravel(),
+    })
+
+
+@instrument()
+def trajectory_distance(
+    trajectories: MatchedTrajectories,
+    id1: int,
+    id2: int,
+    measure: Optional[Text] = 'dtw',
+    cutoff: Optional[float] = 1000.0,
+    epsilon: Optional[float] = 100.0,
+    band: Optional[int] = None,
+    maximum: Optional[float] = None
+) -> float:
+    """
+    Network distance between two matched trajectories.
+
+    The points are compared through the network distances between their
+    edges, see edge_distances, so the trajectories matched once can be
+    compared with every measure. Unmatched points are at the cutoff of
+    every point.
+
+    Parameters
+    ----------
+    trajectories : MatchedTrajectories
+        The matched trajectories
+    id1 : int
+        The identifier of the first trajectory
+    id2 : int
+        The identifier of the second trajectory
+    measure : str, optional
+        'dtw' for dynamic time warping, 'edr' for the edit distance on real
+        sequences or 'frechet' for the discrete Fréchet distance,
+        by default 'dtw'
+    cutoff : float, optional
+        The maximum distance in meters between two points, by default 1000.0
+    epsilon : float, optional
+        The maximum distance in meters of equal points for 'edr',
+        by default 100.0
+    band : int, optional
+        Maximum distance in points from the diagonal of the aligned points,
+        limits the work to O(n * band) for long trajectories, by default None
+    maximum : float, optional
+        The distance above which the comparison is abandoned,
+        by default None
+
+    Returns
+    -------
+    float
+        The distance, in meters for 'dtw' and 'frechet', in edits for 'edr',
+        np.inf when above the maximum
+
+    Raises
+    ------
+    ValueError
+        if the measure is not valid or the trajectories have no matcher
+
+    """
+    if measure not in ('dtw', 'edr', 'frechet'):
+        raise ValueError('measure must be one of dtw, edr, frechet')
+    if trajectories.matcher is None:
+        raise ValueError('trajectories must have the matcher of the road graph')
 
-    seqMatch = SequenceMatcher(
-        None, list(move_data_id1['edge']), list(move_data_id2['edge'])
+    seq1 = trajectories.codes[trajectories.position(id1)]
+    seq2 = trajectories.codes[trajectories.position(id2)]
+    edges1 = np.unique(seq1[seq1 >= 0])
+    edges2 = np.unique(seq2[seq2 >= 0])
+    cost = np.full((len(edges1) + 1, len(edges2) + 1), float(cutoff))
+    cost[:-1, :-1] = edge_distances(
+        trajectories.matcher,
+        trajectories.edges[edges1],
+        trajectories.edges[edges2],
+        cutoff
     )
+    local1 = np.where(seq1 >= 0, np.searchsorted(edges1, seq1), len(edges1))
+    local2 = np.where(seq2 >= 0, np.searchsorted(edges2, seq2), len(edges2))
 
-    matchs = seqMatch.get_matching_blocks()
-    df_mat = pd.DataFrame(matchs)
-    df_mat.sort_values(['size'], ascending=False, inplace=True)
-
-    for m in df_mat.values:
-        equals = []
-        differences = []
-        teste = True
-        for i in range(0, m[2]):
-            m0 = list(move_data_id1['datetime'])[m[0] + i]
-            m1 = list(move_data_id2['datetime'])[m[1] + i]
-            dif = m0 - m1
-            differences.append(dif.seconds)
-            if(dif.seconds > tolerance):
-                v = False
-                teste = False
-            else:
-                v = True
-            equals.append(v)
-        if(teste):
-            data = {
-                'ida': list(move_data_id1['id'])[m[0]: m[0] + m[2]],
-                'idb': list(move_data_id2['id'])[m[1]: m[1] + m[2]],
-                'datetime_ida': list(move_data_id1['datetime'])[m[0]: m[0] + m[2]],
-                'datetime_idb': list(move_data_id2['datetime'])[m[1]: m[1] + m[2]],
-                'difference': differences,
-                'equals': equals,
-                'edge': list(move_data_id1['edge'].apply(list))[m[0]: m[0] + m[2]]
-            }
-            return pd.DataFrame(data)
-    return None
+    if measure == 'dtw':
+        return dtw(local1, local2, cost, band, maximum)
+    if measure == 'edr':
+        return edr(local1, local2, cost, epsilon, band, maximum)
+    return frechet(local1, local2, cost, band, maximum)
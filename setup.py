@@ -37,5 +37,12 @@ setup(
         'Operating System :: OS Independent',
     ],
     install_requires=DEPENDENCIES,
+    extras_require={'parquet': ['pyarrow']},
+    entry_points={
+        'console_scripts': [
+            'pymove-osmnx-match=pymove_osmnx.cli:main',
+            'pymove-osmnx-benchmark=pymove_osmnx.benchmark:main',
+        ],
+    },
     include_package_data=True
 )